@@ -0,0 +1,80 @@
+"""
+JWT authentication that does not query the database on every request.
+
+``CachedJWTAuthentication`` resolves the token's user as simplejwt's
+``JWTAuthentication`` does, with ``user.profile`` loaded too, and keeps both
+in the ``users`` cache (local memory, per process) for
+``AUTH_USER_CACHE_SECONDS``. Entries are keyed by user id (the token's
+``user_id`` claim, the primary key) and record the token version they were
+loaded for: the password hash claim, which ``SIMPLE_JWT['CHECK_REVOKE_TOKEN']``
+adds to every token. A token minted after a password change therefore
+misses the entry, and the reload rejects tokens minted before it. Without
+that setting every version is ``None`` and entries match on user id alone.
+
+Saving or deleting a user or profile drops the entry in this process;
+other processes keep theirs until it expires, so deactivating a user or
+revoking tokens with a new password takes up to the TTL to apply everywhere.
+
+Each hit unpickles a fresh copy, so a request can modify and save its
+``request.user`` without affecting others.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Profile
+
+CACHE_ALIAS = 'users'
+
+
+def _key(user_id):
+    return f'user:{user_id}'
+
+
+def token_version(validated_token):
+    if not api_settings.CHECK_REVOKE_TOKEN:
+        return None
+    return validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+
+
+def forget_user(user_id):
+    caches[CACHE_ALIAS].delete(_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)  # raises InvalidToken
+        cache = caches[CACHE_ALIAS]
+        version = token_version(validated_token)
+        cached = cache.get(_key(user_id))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        user = super().get_user(validated_token)
+        profile = Profile.objects.filter(user=user).first()
+        if profile is not None:
+            user.profile = profile  # links both ways
+        else:
+            # Cached as missing: reading it raises Profile.DoesNotExist as usual.
+            type(user).profile.related.set_cached_value(user, None)
+        cache.set(_key(user_id), (version, user), settings.AUTH_USER_CACHE_SECONDS)
+        return user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_saved_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_saved_profile(sender, instance, **kwargs):
+    forget_user(instance.user_id)
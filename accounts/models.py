@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class Profile(models.Model):
@@ -41,6 +42,11 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+def save_user_profile(sender, instance, created, **kwargs):
+    """
+    Profile responses embed the user, so a user change is a profile change:
+    advance ``updated_at``, the profile's ``ETag`` / ``Last-Modified`` source.
+    Only the stamp is written, never a (possibly stale) loaded profile.
+    """
+    if not created:
+        Profile.objects.filter(user=instance).update(updated_at=timezone.now())
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from spacetravel.serializers import DynamicFieldsMixin
 from .models import Profile
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     avatar_url = serializers.ReadOnlyField()
 
     class Meta:
@@ -16,13 +17,13 @@ class ProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['credits_balance', 'created_at', 'updated_at']
 
 
-class UserSerializer(serializers.ModelSerializer):
-    profile = ProfileSerializer(read_only=True)
-
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile']
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'profile']
+        expandable_fields = {'profile': (ProfileSerializer, {})}
+        default_expand = ['profile']
 
 
 class RegisterSerializer(serializers.ModelSerializer):
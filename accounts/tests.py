@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from .authentication import CACHE_ALIAS
+from .models import Profile
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches[CACHE_ALIAS].clear()  # survives the per-test rollback
+        self.user = User.objects.create_user('cached', password='pw-cached-1')
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_user_and_profile_come_from_the_cache(self):
+        with CaptureQueriesContext(connection) as cold:
+            first = self.client.get('/api/v1/profiles/me/')
+        with CaptureQueriesContext(connection) as warm:
+            again = self.client.get('/api/v1/profiles/me/')
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(first.json()['user']['username'], 'cached')
+        self.assertEqual(len(cold), 2)  # the user, then their profile
+        self.assertEqual(len(warm), 0)
+
+    def test_saving_user_or_profile_invalidates(self):
+        self.client.get('/api/v1/profiles/me/')
+        profile = Profile.objects.get(user=self.user)
+        profile.bio = 'Off to Titan'
+        profile.save()
+        self.assertEqual(self.client.get('/api/v1/profiles/me/').json()['bio'], 'Off to Titan')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/profiles/me/').status_code, 401)
+
+    def test_password_change_revokes_cached_tokens(self):
+        old_token = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.client.get('/api/v1/profiles/me/')
+        # As if changed in another worker: no signal reaches this cache.
+        User.objects.filter(pk=self.user.pk).update(password=make_password('pw-cached-2'))
+        self.user.refresh_from_db()
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get('/api/v1/profiles/me/').status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=old_token)
+        self.assertEqual(self.client.get('/api/v1/profiles/me/').status_code, 401)
+
+    def test_entry_must_match_the_token_version(self):
+        impostor = User(pk=self.user.pk, username='impostor')
+        caches[CACHE_ALIAS].set(f'user:{self.user.pk}', ('minted-before-a-password-change', impostor))
+        self.assertEqual(self.client.get('/api/v1/profiles/me/').json()['user']['username'], 'cached')
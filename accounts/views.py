@@ -3,11 +3,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.contrib.auth.models import User
+from spacetravel.profiling import ProfiledViewMixin
 from .models import Profile
 from .serializers import RegisterSerializer, UserSerializer, ProfileUpdateSerializer
 
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(ProfiledViewMixin, generics.CreateAPIView):
     """POST /api/v1/accounts/register/ — public"""
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
@@ -23,7 +24,7 @@ class RegisterView(generics.CreateAPIView):
         )
 
 
-class MeView(generics.RetrieveUpdateAPIView):
+class MeView(ProfiledViewMixin, generics.RetrieveUpdateAPIView):
     """GET/PATCH /api/v1/accounts/me/ — current user info + update name/email"""
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -32,7 +33,7 @@ class MeView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class ProfileUpdateView(APIView):
+class ProfileUpdateView(ProfiledViewMixin, APIView):
     """PATCH /api/v1/accounts/profile/ — update extended profile (avatar, bio, etc.)"""
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
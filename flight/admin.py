@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Planet, Flight, Pod, Booking, PlanetBase, FlightSchedule, BaseImage
+from .models import Planet, Flight, Pod, Booking, FareCalendarDay, PlanetBase, FlightSchedule, BaseImage
 
 
 @admin.register(Planet)
@@ -33,6 +33,13 @@ class BookingAdmin(admin.ModelAdmin):
     readonly_fields = ['booked_at', 'updated_at']
 
 
+@admin.register(FareCalendarDay)
+class FareCalendarDayAdmin(admin.ModelAdmin):
+    list_display = ['origin_planet', 'destination_planet', 'day', 'min_price', 'flight_count']
+    list_filter = ['origin_planet', 'destination_planet']
+    readonly_fields = ['updated_at']
+
+
 # Deprecated models
 @admin.register(PlanetBase)
 class PlanetBaseAdmin(admin.ModelAdmin):
@@ -1,21 +1,52 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .viewsets import (
     UserViewSet, ProfileViewSet, PlanetViewSet, 
-    FlightViewSet, PodViewSet, BookingViewSet
+    FlightViewSet, PodViewSet, BookingViewSet, ItineraryViewSet, RequestProfileViewSet,
 )
+from .async_views import PlanetListView, FlightListView, FlightDetailView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'profiles', ProfileViewSet)
 router.register(r'planets', PlanetViewSet, basename='planet')
 router.register(r'flights', FlightViewSet, basename='flight')
+router.register(r'itineraries', ItineraryViewSet, basename='itinerary')
 router.register(r'pods', PodViewSet, basename='pod')
 router.register(r'bookings', BookingViewSet, basename='booking')
+router.register(r'request-profiles', RequestProfileViewSet, basename='request-profile')
 
 app_name = 'api'
 
+# Native async read endpoints (flight/async_views.py)
+async_urlpatterns = [
+    path('planets/', PlanetListView.as_view(), name='async-planet-list'),
+    path('flights/', FlightListView.as_view(), name='async-flight-list'),
+    path('flights/<int:pk>/', FlightDetailView.as_view(), name='async-flight-detail'),
+]
+
+# With ASYNC_READ_VIEWS the async views also serve reads on the regular URLs;
+# other methods go to the viewsets.
+async_takeover_urlpatterns = [
+    path('planets/', PlanetListView.as_view(
+        fallback=PlanetViewSet.as_view({'get': 'list'}, basename='planet'),
+    )),
+    path('flights/', FlightListView.as_view(
+        fallback=FlightViewSet.as_view({'get': 'list', 'post': 'create'}, basename='flight'),
+    )),
+    path('flights/<int:pk>/', FlightDetailView.as_view(
+        fallback=FlightViewSet.as_view({
+            'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+        }, basename='flight'),
+    )),
+]
+
 urlpatterns = [
+    path('v1/async/', include(async_urlpatterns)),
     path('v1/', include(router.urls)),
     path('auth/', include('rest_framework.urls')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns.insert(0, path('v1/', include(async_takeover_urlpatterns)))
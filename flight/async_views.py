@@ -0,0 +1,216 @@
+"""
+Native async (ASGI) versions of the hot public read endpoints.
+
+    GET /api/v1/async/planets/
+    GET /api/v1/async/flights/?origin=earth&destination=mars&sort=price
+    GET /api/v1/async/flights/<id>/
+
+Responses match the viewsets': same serializers, ``?fields=`` /
+``?expand=``, search filters, keyset cursors and ``ETag`` /
+``Last-Modified`` validators. Rows are read with the async ORM, so under an
+ASGI server (see "Deployment" in the README) a worker keeps serving other
+requests while these wait on the database, and slow clients cost a socket
+rather than a thread. With ``ASYNC_READ_VIEWS=True`` they also answer
+``GET`` / ``HEAD`` on the regular ``/api/v1/planets/`` and
+``/api/v1/flights/`` URLs and hand every other method to the viewsets.
+
+Lists are served from the response cache (``flight.response_cache``), and
+reads go to a replica when there is one (``spacetravel.db.replicas``). Being
+public reads, the views only authenticate when replicas are configured, to
+keep users who wrote recently on the primary. They are not covered by
+request profiling, whose sampler follows a thread.
+"""
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from spacetravel.db import replicas
+
+from . import singleflight
+from .conditional import alist_validators, instance_last_modified, set_validators, validator_headers, weak_etag
+from .models import Flight, Planet
+from .pagination import KeysetPagination
+from .response_cache import (
+    bypasses_cache, generations, get_cache, is_fresh, make_entry, replay, response_cache_key, storable,
+)
+from .serializers import FlightSearchSerializer, FlightSerializer, PlanetSerializer
+from .viewsets import FlightViewSet, ShapedQuerysetMixin
+
+
+class AsyncReadView(ShapedQuerysetMixin, View):
+    """JSON rendering, DRF-style errors and conditional GET for async views."""
+    http_method_names = ['get', 'head', 'options', 'post', 'put', 'patch', 'delete']
+    serializer_class = None
+    validator_field = 'updated_at'
+    validator_related = ()
+    renderer = JSONRenderer()
+    # Sync view that handles the methods other than GET and HEAD.
+    fallback = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like DRF views: session-authenticated writes are CSRF-checked by DRF.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            if self.fallback is None:
+                return await self.http_method_not_allowed(request, *args, **kwargs)
+            return await sync_to_async(self.fallback)(request, *args, **kwargs)
+        self.request = Request(
+            request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        self.request.accepted_media_type = self.renderer.media_type
+        handler = self.options if request.method == 'OPTIONS' else self.get
+        try:
+            pinned = await self.pinned_to_primary()
+        except APIException as exc:
+            return self.handle_exception(exc)
+        # Queries run in threads that share this context.
+        token = replicas.begin(use_replicas=True, pinned=pinned)
+        try:
+            return await handler(self.request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+        finally:
+            replicas.end(token)
+
+    async def pinned_to_primary(self):
+        """Like ``ReplicaReadMixin``: users who wrote recently read from the primary."""
+        if not replicas.options()['ALIASES']:
+            return False  # no need to authenticate
+        return await sync_to_async(lambda: replicas.pinned_to_primary(self.request.user))()
+
+    def handle_exception(self, exc):
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return self.render(detail, status=exc.status_code)
+
+    def get_serializer(self, *args, **kwargs):
+        return self.serializer_class(*args, context={'request': self.request}, **kwargs)
+
+    def render(self, data, status=200):
+        return HttpResponse(self.renderer.render(data), status=status, content_type=self.renderer.media_type)
+
+    async def conditional_response(self, request, last_modified, token, render):
+        """304 when the client's validators match, else ``await render()``; validators are set on both."""
+        etag = weak_etag(self.serializer_class.Meta.model, request, last_modified, token)
+        response = get_conditional_response(
+            request._request, etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = await render()
+        return set_validators(response, etag, last_modified)
+
+
+class AsyncListView(AsyncReadView):
+    """
+    A keyset-paginated list with validators, served from the response cache
+    like ``CachedListMixin`` lists; on the regular URLs it shares their
+    entries. Misses go through ``flight.singleflight`` as theirs do: the
+    lookup runs in Django's thread for sync code, and the leader builds the
+    page back on the event loop.
+    """
+    pagination_class = KeysetPagination
+    basename = None
+    cache_dependencies = ()
+
+    async def get(self, request, *args, **kwargs):
+        if bypasses_cache():
+            entry = await self.build_entry(request, None, 0)
+        else:
+            entry = await sync_to_async(self.fetch_entry)(request)
+        return replay(request, entry, self.render)
+
+    def fetch_entry(self, request):
+        cache = get_cache()
+        fresh_seconds = cache.default_timeout
+        versions = generations(self.cache_dependencies)
+        started = time.time()
+        built = []
+
+        def compute():
+            built.append(async_to_sync(self.build_entry)(request, versions, fresh_seconds))
+            return built[-1] if storable(self.cache_dependencies, started) else None
+
+        entry = singleflight.fetch(
+            cache, response_cache_key(self.basename, request), compute,
+            lambda entry: is_fresh(entry, versions),
+            timeout=fresh_seconds + settings.RESPONSE_CACHE_STALE_SECONDS,
+            lock_timeout=settings.RESPONSE_CACHE_LOCK_SECONDS,
+            wait=settings.RESPONSE_CACHE_LOCK_SECONDS,
+        )
+        if entry is None:
+            # Not storable; answer with our own page.
+            return built[-1] if built else async_to_sync(self.build_entry)(request, versions, fresh_seconds)
+        return entry
+
+    async def build_entry(self, request, versions, fresh_seconds):
+        queryset = self.get_queryset()
+        paginator = self.pagination_class()
+        window = paginator.window_queryset(queryset, request, view=self)
+        last_modified, token = await alist_validators(window, self.validator_field, self.validator_related)
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        data = paginator.get_paginated_response(self.get_serializer(page, many=True).data).data
+        etag = weak_etag(self.serializer_class.Meta.model, request, last_modified, token)
+        return make_entry(versions, data, validator_headers(etag, last_modified), fresh_seconds)
+
+
+class PlanetListView(AsyncListView):
+    serializer_class = PlanetSerializer
+    basename = 'planet'
+    cache_dependencies = (Planet,)
+
+    def get_queryset(self):
+        return self.shape_queryset(Planet.objects.all())
+
+
+class FlightListView(AsyncListView):
+    """Flight search; the filters and orderings are ``FlightViewSet``'s."""
+    serializer_class = FlightSerializer
+    basename = 'flight'
+    cache_dependencies = FlightViewSet.cache_dependencies
+    validator_related = FlightViewSet.validator_related
+
+    def get_search_params(self):
+        if not hasattr(self, '_search_params'):
+            serializer = FlightSearchSerializer(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._search_params = serializer.validated_data
+        return self._search_params
+
+    @property
+    def keyset_ordering(self):
+        return FlightViewSet.SORT_ORDERINGS[self.get_search_params().get('sort', '-departure')]
+
+    def get_queryset(self):
+        return FlightViewSet.filter_search(self.shape_queryset(Flight.objects.all()), self.get_search_params())
+
+
+class FlightDetailView(AsyncReadView):
+    serializer_class = FlightSerializer
+    validator_related = FlightViewSet.validator_related
+
+    def get_queryset(self):
+        return self.shape_queryset(Flight.objects.all())
+
+    async def get(self, request, pk):
+        try:
+            flight = await self.get_queryset().aget(pk=pk)
+        except Flight.DoesNotExist:
+            raise NotFound('No Flight matches the given query.')
+
+        async def render():
+            return self.render(self.get_serializer(flight).data)
+
+        last_modified = instance_last_modified(flight, self.validator_field, self.validator_related)
+        return await self.conditional_response(request, last_modified, f'pk{flight.pk}', render)
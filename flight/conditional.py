@@ -0,0 +1,135 @@
+"""
+Conditional GET (``ETag`` / ``Last-Modified``) for read endpoints.
+
+Validators are derived from ``updated_at`` with at most one cheap query:
+
+* a detail response uses the object's ``updated_at``;
+* a list page reads the ids and ``updated_at`` of the rows behind that page
+  (the keyset window, so at most ``page_size + 1`` rows) and uses the
+  latest ``updated_at`` plus a hash of the ids in order, so edits,
+  additions and deletions that shift rows into the page all change the
+  ETag.
+
+Related objects embedded in the representation (``validator_related``,
+e.g. a flight's planets) fold their ``updated_at`` into both: renaming a
+planet changes the flight list and detail validators. On a detail they
+count when the view loaded them, which it does whenever they are rendered.
+
+Both are weak validators: they also cover the request path, query string
+and negotiated media type, and the representation is not byte-stable.
+A matching ``If-None-Match`` / ``If-Modified-Since`` returns ``304 Not
+Modified`` before the page is fetched or any serializer runs.
+
+Inventory changes made with ``QuerySet.update()`` touch ``Flight.updated_at``
+themselves (see ``flight.inventory``), so seat and pod availability changes
+invalidate flight validators too.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+CONDITIONAL_METHODS = ('GET', 'HEAD')
+
+
+class ConditionalGetMixin:
+    """Adds ``ETag`` / ``Last-Modified`` and 304 handling to ``list`` and ``retrieve``."""
+    validator_field = 'updated_at'
+    # Embedded relations whose own ``validator_field`` counts too.
+    validator_related = ()
+    # Set to False to always render (validators are still sent).
+    evaluate_preconditions = True
+
+    def list(self, request, *args, **kwargs):
+        if request.method not in CONDITIONAL_METHODS:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        window = getattr(self.paginator, 'window_queryset', None)
+        if window is not None:
+            queryset = window(queryset, request, view=self)
+        last_modified, token = list_validators(queryset, self.validator_field, self.validator_related)
+        return self.conditional_response(
+            request, last_modified, token,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.method not in CONDITIONAL_METHODS:
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        return self.conditional_response(
+            request, instance_last_modified(instance, self.validator_field, self.validator_related),
+            f'pk{instance.pk}',
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
+    def get_etag(self, request, last_modified, token):
+        return weak_etag(self.queryset.model, request, last_modified, token)
+
+    def conditional_response(self, request, last_modified, token, render):
+        """Return 304 when the client's validators match, else ``render()`` with validators set."""
+        etag = self.get_etag(request, last_modified, token)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = None
+        if self.evaluate_preconditions:
+            response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        return set_validators(response, etag, last_modified)
+
+
+def _validator_columns(validator_field, related):
+    return ['pk', validator_field, *(f'{name}__{validator_field}' for name in related)]
+
+
+def _rows_validators(rows):
+    stamps = [stamp for row in rows for stamp in row[1:] if stamp is not None]
+    ids = ','.join(str(row[0]) for row in rows)
+    digest = hashlib.md5(ids.encode('ascii'), usedforsecurity=False).hexdigest()
+    return max(stamps, default=None), f'n{len(rows)}:{digest}'
+
+
+def list_validators(queryset, validator_field, related=()):
+    """``(last_modified, token)`` of the (window) ``queryset`` in one query; see the module docstring."""
+    return _rows_validators(list(queryset.values_list(*_validator_columns(validator_field, related))))
+
+
+async def alist_validators(queryset, validator_field, related=()):
+    rows = [row async for row in queryset.values_list(*_validator_columns(validator_field, related))]
+    return _rows_validators(rows)
+
+
+def instance_last_modified(instance, validator_field, related=()):
+    """The latest ``validator_field`` of ``instance`` and its loaded ``related`` objects."""
+    stamps = [getattr(instance, validator_field)]
+    for name in related:
+        if instance._meta.get_field(name).is_cached(instance):
+            stamps.append(getattr(getattr(instance, name), validator_field, None))
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+
+def weak_etag(model, request, last_modified, token):
+    """The weak ETag of a ``model`` representation, see the module docstring."""
+    parts = [
+        model._meta.label_lower,
+        last_modified.isoformat() if last_modified else '-',
+        token,
+        request.get_full_path(),
+        request.accepted_media_type or '',
+    ]
+    digest = hashlib.md5('|'.join(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def validator_headers(etag, last_modified):
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(int(last_modified.timestamp()))
+    return headers
+
+
+def set_validators(response, etag, last_modified):
+    for name, value in validator_headers(etag, last_modified).items():
+        response[name] = value
+    return response
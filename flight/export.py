@@ -0,0 +1,123 @@
+"""
+Streaming exports of flights and bookings as NDJSON or CSV.
+
+Rows are read with ``values_list().iterator(chunk_size=...)``, so no model
+instances or serializers are built and memory stays flat however large the
+table is (on PostgreSQL the iterator uses a server-side cursor). Output is
+produced by generators for ``StreamingHttpResponse`` or a file.
+
+Under ASGI, Django buffers a streaming response whose iterator is
+synchronous, so ``astream`` wraps the same chunks in an async iterator that
+reads each one in Django's thread for sync code.
+"""
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Flight, Booking
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# (column name, ORM lookup) per export
+FLIGHT_COLUMNS = [
+    ('id', 'id'),
+    ('flight_number', 'flight_number'),
+    ('origin', 'origin_planet__slug'),
+    ('destination', 'destination_planet__slug'),
+    ('departure_datetime', 'departure_datetime'),
+    ('arrival_datetime', 'arrival_datetime'),
+    ('seats_total', 'seats_total'),
+    ('seats_available', 'seats_available'),
+    ('price_credits', 'price_credits'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+BOOKING_COLUMNS = [
+    ('id', 'id'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('flight_id', 'flight_id'),
+    ('flight_number', 'flight__flight_number'),
+    ('pod_id', 'pod_id'),
+    ('pod_number', 'pod__pod_number'),
+    ('status', 'status'),
+    ('total_price', 'total_price'),
+    ('booked_at', 'booked_at'),
+    ('updated_at', 'updated_at'),
+]
+
+EXPORTS = {
+    'flights': (Flight, FLIGHT_COLUMNS),
+    'bookings': (Booking, BOOKING_COLUMNS),
+}
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the line, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def rows(name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the export's rows as tuples, in primary key order."""
+    model, columns = EXPORTS[name]
+    queryset = model.objects.order_by('pk').values_list(*[lookup for _, lookup in columns])
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def ndjson_lines(name, chunk_size=DEFAULT_CHUNK_SIZE):
+    headers = [header for header, _ in EXPORTS[name][1]]
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    return _batched(
+        (encoder.encode(dict(zip(headers, row))) + '\n' for row in rows(name, chunk_size)),
+        chunk_size,
+    )
+
+
+def csv_lines(name, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow([header for header, _ in EXPORTS[name][1]])
+        for row in rows(name, chunk_size):
+            yield writer.writerow(row)
+
+    return _batched(lines(), chunk_size)
+
+
+def stream(name, output_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Chunks of text for ``name`` in ``output_format`` (``ndjson`` or ``csv``)."""
+    writer = ndjson_lines if output_format == 'ndjson' else csv_lines
+    return writer(name, chunk_size)
+
+
+async def astream(name, output_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """``stream`` as an async iterator, for ASGI responses."""
+    chunks = stream(name, output_format, chunk_size)
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def _batched(lines, size):
+    # One write per chunk of rows instead of one per row.
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
@@ -0,0 +1,226 @@
+"""
+Seat and pod inventory for bookings.
+
+Every claim is a conditional single-statement UPDATE (``... WHERE
+is_available`` / ``... WHERE seats_available > 0``). The database applies it
+atomically, so two requests can never take the same pod or push a flight
+below zero seats. Nothing is read-modify-written and no row is locked with
+``SELECT ... FOR UPDATE``. The hot ``Flight`` row is touched last, so its
+row lock is held only until the short transaction commits. Seat updates
+also bump ``Flight.updated_at``, which the flight ETags are built from.
+
+Pending bookings hold their inventory for ``BOOKING_HOLD_TTL_SECONDS``
+through a ``PodHold`` row; ``expire_holds`` gives it back in batches.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from . import response_cache, seatmap
+from .models import Flight, Pod, Booking, PodHold
+
+
+class InventoryConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The requested seat is no longer available.'
+    default_code = 'inventory_conflict'
+
+
+class _PodsTaken(Exception):
+    """Rolls back a group claim when some pods were already taken."""
+
+
+def reserve_booking(user, flight_id, pod_id=None, booking_status='pending'):
+    """Claim a seat (and optionally a pod) on a flight and create the booking."""
+    flight_price = Flight.objects.filter(pk=flight_id).values_list('price_credits', flat=True).first()
+    if flight_price is None:
+        raise NotFound('Flight not found.')
+    pod_price = 0
+    if pod_id is not None:
+        pod_price = Pod.objects.filter(pk=pod_id, flight_id=flight_id).values_list('price_credits', flat=True).first()
+        if pod_price is None:
+            raise NotFound('Pod not found on this flight.')
+
+    try:
+        with transaction.atomic():
+            if pod_id is not None:
+                claimed = Pod.objects.filter(pk=pod_id, is_available=True).update(is_available=False)
+                if not claimed:
+                    raise InventoryConflict('This pod has already been booked.')
+            booking = Booking.objects.create(
+                user=user,
+                flight_id=flight_id,
+                pod_id=pod_id,
+                status=booking_status,
+                total_price=flight_price + pod_price,
+            )
+            seats = Flight.objects.filter(
+                pk=flight_id, status='scheduled', seats_available__gt=0,
+            ).update(seats_available=F('seats_available') - 1, updated_at=timezone.now())
+            if not seats:
+                # Raising rolls back the pod claim and the booking row.
+                raise InventoryConflict('This flight is sold out or no longer bookable.')
+            if booking_status == 'pending':
+                PodHold.objects.create(
+                    booking=booking, flight_id=flight_id, pod_id=pod_id, expires_at=hold_expiry(),
+                )
+            _inventory_changed(flight_id)
+    except IntegrityError:
+        raise InventoryConflict('You already have a booking for this pod.')
+    return booking
+
+
+def reserve_group(user, flight_id, pod_ids):
+    """
+    Book several pods on one flight for ``user``, all or nothing.
+
+    Uses the same conditional claims as ``reserve_booking``, but set-based:
+    one UPDATE claims every pod, one INSERT writes the bookings, and one
+    UPDATE takes the seats. The query count does not grow with group size.
+    Returns ``(bookings, hold_expires_at)``.
+    """
+    flight_price = Flight.objects.filter(pk=flight_id).values_list('price_credits', flat=True).first()
+    if flight_price is None:
+        raise NotFound('Flight not found.')
+    pod_prices = dict(Pod.objects.filter(pk__in=pod_ids, flight_id=flight_id).values_list('id', 'price_credits'))
+    missing = sorted(set(pod_ids) - set(pod_prices))
+    if missing:
+        raise NotFound(f'Pods not found on this flight: {missing}')
+
+    expires_at = hold_expiry()
+    try:
+        with transaction.atomic():
+            claimed = Pod.objects.filter(pk__in=pod_ids, is_available=True).update(is_available=False)
+            if claimed != len(pod_ids):
+                raise _PodsTaken()
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    user=user,
+                    flight_id=flight_id,
+                    pod_id=pod_id,
+                    status='pending',
+                    total_price=flight_price + pod_prices[pod_id],
+                )
+                for pod_id in pod_ids
+            ])
+            seats = Flight.objects.filter(
+                pk=flight_id, status='scheduled', seats_available__gte=len(pod_ids),
+            ).update(seats_available=F('seats_available') - len(pod_ids), updated_at=timezone.now())
+            if not seats:
+                raise InventoryConflict(f'This flight does not have {len(pod_ids)} seats left.')
+            PodHold.objects.bulk_create([
+                PodHold(booking_id=booking.pk, flight_id=flight_id, pod_id=booking.pod_id, expires_at=expires_at)
+                for booking in bookings
+            ])
+            _inventory_changed(flight_id)
+    except _PodsTaken:
+        taken = sorted(Pod.objects.filter(pk__in=pod_ids, is_available=False).values_list('id', flat=True))
+        raise InventoryConflict(f'These pods are no longer available: {taken}')
+    except IntegrityError:
+        raise InventoryConflict('You already have a booking for one of these pods.')
+    return bookings, expires_at
+
+
+def _inventory_changed(flight_id):
+    # Queryset updates send no signals; drop what was derived from the old rows.
+    seatmap.invalidate(flight_id)
+    response_cache.bump(Flight)
+
+
+def hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.BOOKING_HOLD_TTL_SECONDS)
+
+
+def confirm_booking(booking):
+    """
+    Confirm a pending booking; returns ``False`` if it was not pending or its
+    hold has expired (the sweep will cancel it).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Hold before booking, the same lock order as expire_holds.
+        held, _ = PodHold.objects.filter(booking_id=booking.pk, expires_at__gt=now).delete()
+        confirmed = held and Booking.objects.filter(pk=booking.pk, status='pending').update(
+            status='confirmed', updated_at=now,
+        )
+        if not confirmed:
+            transaction.set_rollback(True)
+    if confirmed:
+        booking.status = 'confirmed'
+    return bool(confirmed)
+
+
+def release_booking(booking, new_status='cancelled'):
+    """
+    Move an active booking to ``new_status`` and return its seat and pod.
+
+    Returns ``False`` when the booking was already inactive, so concurrent
+    cancellations release inventory exactly once.
+    """
+    with transaction.atomic():
+        PodHold.objects.filter(booking_id=booking.pk).delete()
+        released = Booking.objects.filter(
+            pk=booking.pk, status__in=['pending', 'confirmed'],
+        ).update(status=new_status, updated_at=timezone.now())
+        if not released:
+            return False
+        if booking.pod_id is not None:
+            Pod.objects.filter(pk=booking.pod_id).update(is_available=True)
+        Flight.objects.filter(
+            pk=booking.flight_id, seats_available__lt=F('seats_total'),
+        ).update(seats_available=F('seats_available') + 1, updated_at=timezone.now())
+        _inventory_changed(booking.flight_id)
+    booking.status = new_status
+    return True
+
+
+def expire_holds(batch_size=1000, now=None):
+    """
+    Cancel one batch of pending bookings whose hold has expired and release
+    their pods and seats. Every step is a single set-based statement:
+    cancel the bookings, free the pods, give seats back per flight, and
+    drop the holds. Returns the number of bookings expired.
+
+    On PostgreSQL the batch is claimed with ``SKIP LOCKED``, so several
+    sweepers can run at once without waiting on each other.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = PodHold.objects.filter(expires_at__lte=now).order_by('expires_at')
+        if connection.features.has_select_for_update_skip_locked:
+            expired = expired.select_for_update(skip_locked=True)
+        holds = list(expired.values_list('booking_id', 'flight_id', 'pod_id')[:batch_size])
+        if not holds:
+            return 0
+        booking_ids = [booking_id for booking_id, _, _ in holds]
+
+        Booking.objects.filter(pk__in=booking_ids, status='pending').update(
+            status='cancelled', updated_at=now,
+        )
+        pod_ids = [pod_id for _, _, pod_id in holds if pod_id is not None]
+        if pod_ids:
+            Pod.objects.filter(pk__in=pod_ids).update(is_available=True)
+        seats = Counter(flight_id for _, flight_id, _ in holds)
+        Flight.objects.filter(pk__in=seats).update(
+            seats_available=Least(
+                F('seats_total'),
+                F('seats_available') + Case(
+                    *[When(pk=flight_id, then=Value(count)) for flight_id, count in seats.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+            ),
+            updated_at=now,
+        )
+        PodHold.objects.filter(booking_id__in=booking_ids).delete()
+        for flight_id in seats:
+            seatmap.invalidate(flight_id)
+        response_cache.bump(Flight)
+    return len(holds)
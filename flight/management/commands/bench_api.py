@@ -0,0 +1,288 @@
+"""
+End-to-end API benchmark.
+
+    python manage.py bench_api --scale 20 --iterations 200
+    python manage.py bench_api --transport live --concurrency 8
+    python manage.py bench_api --save-baseline benchmarks/api_baseline.json
+    python manage.py bench_api --baseline benchmarks/api_baseline.json
+
+Seeds the configured database with ``seed_db`` and drives the real
+``/api/v1/`` endpoints, either in-process through the Django test client or
+over HTTP against a live threaded WSGI server on a free local port. For
+every endpoint it reports p50/p95/p99 latency, throughput and SQL queries
+per request. With ``--baseline`` the results are compared against a stored
+run, and the command fails if any endpoint's p50 or p95 latency grows beyond
+the tolerance, or it issues more queries or errors than before. Latency
+baselines are machine-specific: record one per machine (or CI runner).
+"""
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from flight.inventory import release_booking
+from flight.models import Booking, Flight, Planet
+
+BENCH_USERNAME = 'bench-api'
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts queries across threads."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class TestClientTransport:
+    name = 'test client'
+
+    def __init__(self, token):
+        self.client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.counter = QueryCounter()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def request(self, method, path, body=None):
+        with connection.execute_wrapper(self.counter):
+            if method == 'POST':
+                response = self.client.post(path, body, content_type='application/json')
+            else:
+                response = self.client.get(path)
+        return response.status_code
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class LiveServerTransport:
+    name = 'live server'
+
+    def __init__(self, token):
+        self.token = token
+        self.counter = QueryCounter()
+        self.server = None
+
+    def start(self):
+        application = get_wsgi_application()
+        counter = self.counter
+
+        def counted(environ, start_response):
+            # Responses are fully built inside the handler, so every query of
+            # the request runs within the wrapper.
+            try:
+                with connection.execute_wrapper(counter):
+                    return application(environ, start_response)
+            finally:
+                connections.close_all()
+
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+        self.server.set_app(counted)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json',
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the /api/v1/ endpoints: latency percentiles, throughput and SQL count per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=5, help='seed_db scale (1.0 = 1,000 flights)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--transport', choices=['client', 'live'], default='client')
+        parser.add_argument('--iterations', type=int, default=100, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests (live transport)')
+        parser.add_argument('--baseline', help='Compare against this baseline JSON')
+        parser.add_argument('--save-baseline', help='Write the results to this JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed p50/p95 slowdown against the baseline (default 0.5 = 50%%)')
+        parser.add_argument('--min-delta-ms', type=float, default=5,
+                            help='Ignore slowdowns smaller than this, which are mostly noise (default 5)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        if options['transport'] == 'client' and options['concurrency'] > 1:
+            raise CommandError('--concurrency needs --transport live.')
+        if options['scale'] > 0:
+            call_command('seed_db', scale=options['scale'], seed=options['seed'], stdout=self.stdout)
+
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        token = str(RefreshToken.for_user(user).access_token)
+        transport = (LiveServerTransport if options['transport'] == 'live' else TestClientTransport)(token)
+        endpoints = self.endpoints()
+
+        transport.start()
+        try:
+            results = {
+                name: self.measure(transport, requests, options)
+                for name, requests in endpoints.items()
+            }
+        finally:
+            transport.stop()
+            self.cleanup(user)
+
+        self.report(transport, results)
+        report = {
+            'vendor': connection.vendor,
+            'transport': options['transport'],
+            'scale': options['scale'],
+            'endpoints': results,
+        }
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'], options['min_delta_ms'])
+
+    def endpoints(self):
+        """Request generators per endpoint; each call returns ``(method, path, body)``."""
+        flight = (
+            Flight.objects.filter(status='scheduled', seats_available__gt=0)
+            .order_by('departure_datetime', 'pk').select_related('origin_planet', 'destination_planet').first()
+        )
+        if flight is None or not Planet.objects.exists():
+            raise CommandError('No bookable flights; run with --scale > 0 or seed the database first.')
+        bookable = list(
+            Flight.objects.filter(status='scheduled', seats_available__gt=10)
+            .order_by('pk').values_list('pk', flat=True)[:1000]
+        )
+        search = f'/api/v1/flights/?origin={flight.origin_planet.slug}&destination={flight.destination_planet.slug}'
+        counter = iter(range(10 ** 9))
+        return {
+            'planet list': lambda: ('GET', '/api/v1/planets/', None),
+            'flight search': lambda: ('GET', search, None),
+            'flight detail': lambda: ('GET', f'/api/v1/flights/{flight.pk}/', None),
+            'booking create': lambda: ('POST', '/api/v1/bookings/', {
+                'flight_id': bookable[next(counter) % len(bookable)],
+            }),
+            'booking list': lambda: ('GET', '/api/v1/bookings/', None),
+        }
+
+    def measure(self, transport, make_request, options):
+        for _ in range(options['warmup']):
+            transport.request(*make_request())
+
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def timed(_):
+            nonlocal errors
+            request = make_request()
+            started = time.perf_counter()
+            status = transport.request(*request)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+
+        queries_before = transport.counter.count
+        started = time.perf_counter()
+        if options['concurrency'] > 1:
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                list(pool.map(timed, range(options['iterations'])))
+        else:
+            for i in range(options['iterations']):
+                timed(i)
+        wall = time.perf_counter() - started
+        queries = transport.counter.count - queries_before
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'throughput_rps': round(len(latencies) / wall, 1),
+            'queries_per_request': round(queries / len(latencies), 2),
+        }
+
+    def cleanup(self, user):
+        # Give back the seats the booking benchmark took.
+        for booking in Booking.objects.filter(user=user):
+            release_booking(booking)
+        Booking.objects.filter(user=user).delete()
+
+    def report(self, transport, results):
+        self.stdout.write(f'\n{transport.name} on {connection.vendor}')
+        self.stdout.write(
+            f"{'endpoint':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'SQL/req':>9}{'errors':>8}"
+        )
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<16}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                f"{stats['throughput_rps']:>10.1f}{stats['queries_per_request']:>9.2f}{stats['errors']:>8}"
+            )
+
+    def compare(self, results, path, tolerance, min_delta_ms):
+        with open(path) as handle:
+            baseline = json.load(handle)['endpoints']
+        regressions = []
+        for name, stats in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                now, then = stats[key], before[key]
+                if now > then * (1 + tolerance) and now - then > min_delta_ms:
+                    regressions.append(f'{name}: {key[:3]} {now:.2f}ms vs {then:.2f}ms')
+            if stats['queries_per_request'] > before['queries_per_request']:
+                regressions.append(
+                    f"{name}: {stats['queries_per_request']} SQL/request vs {before['queries_per_request']}"
+                )
+            if stats['errors'] > before.get('errors', 0):
+                regressions.append(f"{name}: {stats['errors']} errors vs {before.get('errors', 0)}")
+        if regressions:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'✓ No regressions against {path}'))
@@ -0,0 +1,274 @@
+"""
+WSGI vs ASGI under many concurrent slow clients.
+
+    python manage.py bench_asgi
+    python manage.py bench_asgi --slow-clients 500 --slow-ms 3000 --duration 20
+    python manage.py bench_asgi --workers 2 --wsgi-threads 8 --save benchmarks/asgi_vs_wsgi.json
+
+Starts the app twice on free local ports against the configured database:
+
+* ``wsgi`` -- ``gunicorn spacetravel.wsgi`` (the ``Procfile`` default: sync
+  workers, or ``gthread`` with ``--wsgi-threads``);
+* ``asgi`` -- ``gunicorn spacetravel.asgi -k uvicorn_worker.UvicornWorker``
+  with ``ASYNC_READ_VIEWS=True``, so the reads are served by the native
+  async views.
+
+Both get the same number of workers and the same load for ``--duration``
+seconds: slow clients, which each open a connection per request and
+trickle the request head out over ``--slow-ms`` (a poor mobile uplink), and
+fast clients sending requests back to back. Requests rotate over the planet
+list, flight search and flight detail. Latency percentiles, throughput and
+failed or timed-out requests are reported per server and client group; the
+fast group shows whether normal traffic still gets through.
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from flight.models import Flight
+from .bench_api import percentile
+
+SERVERS = ('wsgi', 'asgi')
+SLOW_PIECES = 4
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    def __init__(self, kind, workers, threads):
+        self.kind = kind
+        self.port = free_port()
+        command = [
+            sys.executable, '-m', 'gunicorn', f'spacetravel.{kind}',
+            '--bind', f'127.0.0.1:{self.port}', '--workers', str(workers),
+            '--timeout', '120', '--backlog', '2048',
+        ]
+        env = {**os.environ, 'DEBUG': 'False'}
+        if kind == 'asgi':
+            command += ['--worker-class', 'uvicorn_worker.UvicornWorker']
+            env['ASYNC_READ_VIEWS'] = 'True'
+        elif threads:
+            command += ['--worker-class', 'gthread', '--threads', str(threads)]
+        self.command = command
+        self.env = env
+        self.process = None
+        self.log = None
+
+    def start(self):
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            self.command, env=self.env, cwd=settings.BASE_DIR, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                status = asyncio.run(fetch(self.port, '/api/v1/planets/', timeout=5))
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        self.log.seek(0)
+        raise CommandError(f'{self.kind} server did not start:\n{self.log.read().decode(errors="replace")[-2000:]}')
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log is not None:
+            self.log.close()
+
+
+async def fetch(port, path, slow=0, timeout=30):
+    """One request over a fresh connection; a slow client spreads the request head over ``slow`` seconds."""
+    async def exchange():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            head = (
+                f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n'
+                # As if behind the TLS-terminating proxy, so DEBUG=False does not redirect.
+                f'X-Forwarded-Proto: https\r\nUser-Agent: bench_asgi\r\nConnection: close\r\n\r\n'
+            ).encode('ascii')
+            pieces = SLOW_PIECES if slow else 1
+            step = -(-len(head) // pieces)
+            for index, offset in enumerate(range(0, len(head), step)):
+                if index:
+                    await asyncio.sleep(slow / (pieces - 1))
+                writer.write(head[offset:offset + step])
+                await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        status_line = response.split(b'\r\n', 1)[0].split()
+        return int(status_line[1]) if len(status_line) > 1 else 0
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+class Group:
+    """Clients of one kind and what they measured."""
+
+    def __init__(self, name, clients, slow):
+        self.name = name
+        self.clients = clients
+        self.slow = slow
+        self.latencies = []
+        self.errors = 0
+        self.timeouts = 0
+
+    async def client(self, index, port, paths, until, timeout):
+        if self.slow:
+            # Slow clients arrive spread over one upload time.
+            await asyncio.sleep(self.slow * index / self.clients)
+        n = index
+        while time.monotonic() < until:
+            path = paths[n % len(paths)]
+            n += 1
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, path, self.slow, timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                continue
+            except OSError:
+                self.errors += 1
+                await asyncio.sleep(0.05)
+                continue
+            if status != 200:
+                self.errors += 1
+                continue
+            self.latencies.append((time.perf_counter() - started) * 1000)
+
+    def stats(self, wall):
+        latencies = sorted(self.latencies)
+
+        def pct(value):
+            return round(percentile(latencies, value), 1) if latencies else None
+
+        return {
+            'clients': self.clients,
+            'ok': len(latencies),
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'p50_ms': pct(50),
+            'p95_ms': pct(95),
+            'p99_ms': pct(99),
+            'throughput_rps': round(len(latencies) / wall, 1),
+        }
+
+
+async def run_load(port, paths, groups, duration, timeout):
+    until = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        group.client(index, port, paths, until, timeout)
+        for group in groups for index in range(group.clients)
+    ))
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Compare the WSGI and ASGI deployments under many concurrent slow clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help='seed_db scale (0 skips seeding)')
+        parser.add_argument('--servers', default='wsgi,asgi', help='Comma-separated subset of wsgi,asgi')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes per server')
+        parser.add_argument('--wsgi-threads', type=int, default=0,
+                            help='Run WSGI with gthread workers and this many threads (default: sync workers)')
+        parser.add_argument('--slow-clients', type=int, default=200, help='Concurrent slow clients')
+        parser.add_argument('--slow-ms', type=float, default=2000, help='Time a slow client takes to send a request')
+        parser.add_argument('--fast-clients', type=int, default=10, help='Concurrent clients on a fast link')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--save', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        kinds = [kind.strip() for kind in options['servers'].split(',') if kind.strip()]
+        if not kinds or set(kinds) - set(SERVERS):
+            raise CommandError(f'--servers takes a subset of {", ".join(SERVERS)}.')
+        if options['scale'] > 0:
+            call_command('seed_db', scale=options['scale'], stdout=self.stdout)
+        paths = self.paths()
+
+        results = {}
+        for kind in kinds:
+            server = Server(kind, options['workers'], options['wsgi_threads'])
+            self.stdout.write(f"Starting {kind}: {' '.join(server.command[2:])}")
+            server.start()
+            groups = [
+                Group('fast', options['fast_clients'], 0),
+                Group('slow', options['slow_clients'], options['slow_ms'] / 1000),
+            ]
+            groups = [group for group in groups if group.clients]
+            try:
+                wall = asyncio.run(run_load(server.port, paths, groups, options['duration'], options['timeout']))
+            finally:
+                server.stop()
+            results[kind] = {group.name: group.stats(wall) for group in groups}
+
+        self.report(results, options)
+        if options['save']:
+            with open(options['save'], 'w') as handle:
+                json.dump({
+                    'options': {name: options[name] for name in (
+                        'workers', 'wsgi_threads', 'slow_clients', 'slow_ms', 'fast_clients', 'duration',
+                    )},
+                    'vendor': connection.vendor,
+                    'results': results,
+                }, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f"Results written to {options['save']}")
+
+    def paths(self):
+        flight = (
+            Flight.objects.select_related('origin_planet', 'destination_planet')
+            .order_by('departure_datetime', 'pk').first()
+        )
+        if flight is None:
+            raise CommandError('No flights; run with --scale > 0 or seed the database first.')
+        return [
+            '/api/v1/planets/',
+            f'/api/v1/flights/?origin={flight.origin_planet.slug}&destination={flight.destination_planet.slug}',
+            f'/api/v1/flights/{flight.pk}/',
+        ]
+
+    def report(self, results, options):
+        self.stdout.write(
+            f"\n{options['slow_clients']} slow clients ({options['slow_ms']:g} ms per request) and "
+            f"{options['fast_clients']} fast clients for {options['duration']:g}s, {options['workers']} worker(s)"
+        )
+        self.stdout.write(
+            f"{'server':<8}{'clients':<8}{'ok':>7}{'errors':>8}{'timeouts':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+        )
+
+        def ms(value):
+            return f'{value:>10.1f}' if value is not None else f"{'-':>10}"
+
+        for kind, groups in results.items():
+            for name, stats in groups.items():
+                self.stdout.write(
+                    f"{kind:<8}{name:<8}{stats['ok']:>7}{stats['errors']:>8}{stats['timeouts']:>10}"
+                    f"{ms(stats['p50_ms'])}{ms(stats['p95_ms'])}{ms(stats['p99_ms'])}{stats['throughput_rps']:>9.1f}"
+                )
@@ -0,0 +1,167 @@
+"""
+Per-request database connection overhead, with and without pooling.
+
+    DB_ENGINE=postgresql PGHOST=127.0.0.1 python manage.py bench_db_pool
+    python manage.py bench_db_pool --requests 2000 --threads 8
+    python manage.py bench_db_pool --save benchmarks/db_pool.json
+
+Needs the configured database to be PostgreSQL. Each simulated request
+does what Django does around a view -- ``close_if_unusable_or_obsolete()``
+on ``request_started`` and ``request_finished`` -- with ``--queries`` cheap
+queries in between, on a connection made from the ``default`` settings in
+each of three modes:
+
+* ``none`` -- ``CONN_MAX_AGE=0``: a new server connection per request;
+* ``persistent`` -- ``CONN_MAX_AGE=600`` with health checks: one
+  connection per thread, reused across its requests;
+* ``pooled`` -- ``spacetravel.db.backends.postgresql`` with the ``POOL``
+  options of the settings (or their defaults): connections are borrowed
+  from, and returned to, a per-process pool.
+
+``--threads`` workers share the requests. Reported per mode: request
+latency percentiles, throughput, and the server connections opened
+(after the warm-up).
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+
+from spacetravel.db.backends.postgresql.base import POOL_DEFAULTS, close_pools
+from .bench_api import percentile
+
+MODES = ('none', 'persistent', 'pooled')
+POOLED_ENGINE = 'spacetravel.db.backends.postgresql'
+
+
+def mode_settings(settings_dict, mode):
+    settings_dict = {**settings_dict, 'ENGINE': 'django.db.backends.postgresql', 'CONN_HEALTH_CHECKS': False}
+    if mode != 'pooled':
+        settings_dict.pop('POOL', None)
+    if mode == 'none':
+        settings_dict['CONN_MAX_AGE'] = 0
+    elif mode == 'persistent':
+        settings_dict.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+    else:
+        settings_dict.update(ENGINE=POOLED_ENGINE, CONN_MAX_AGE=0)
+    return settings_dict
+
+
+class Run:
+    """Simulated requests in one mode; every thread gets its own connection, as in Django."""
+
+    def __init__(self, mode, settings_dict, queries):
+        self.mode = mode
+        self.settings_dict = mode_settings(settings_dict, mode)
+        self.alias = f'bench-db-pool-{mode}'
+        self.queries = queries
+        self.local = threading.local()
+        self.wrappers = []
+        self.lock = threading.Lock()
+        self.backends = set()
+
+    def wrapper(self):
+        if not hasattr(self.local, 'wrapper'):
+            backend = load_backend(self.settings_dict['ENGINE'])
+            self.local.wrapper = backend.DatabaseWrapper(self.settings_dict, self.alias)
+            with self.lock:
+                self.wrappers.append(self.local.wrapper)
+        return self.local.wrapper
+
+    def count_connection(self, sender, connection, **kwargs):
+        # Fired for pooled connections too, so count server processes.
+        if connection.alias == self.alias:
+            with self.lock:
+                self.backends.add(connection.connection.info.backend_pid)
+
+    def request(self, _):
+        wrapper = self.wrapper()
+        started = time.perf_counter()
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            for _ in range(self.queries):
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        wrapper.close_if_unusable_or_obsolete()
+        return (time.perf_counter() - started) * 1000
+
+    def execute(self, requests, threads, warmup):
+        connection_created.connect(self.count_connection)
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(self.request, range(warmup)))
+                warm = set(self.backends)
+                started = time.perf_counter()
+                latencies = sorted(executor.map(self.request, range(requests)))
+                wall = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(self.count_connection)
+            for wrapper in self.wrappers:
+                wrapper.inc_thread_sharing()
+                wrapper.close()
+            close_pools(self.alias)
+        return {
+            'requests': requests,
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'throughput_rps': round(requests / wall, 1),
+            'connections_opened': len(self.backends - warm),
+        }
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request PostgreSQL connection overhead without persistence, persistent and pooled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Simulated requests per mode')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads')
+        parser.add_argument('--queries', type=int, default=1, help='Queries per request')
+        parser.add_argument('--warmup', type=int, default=100, help='Untimed requests per mode')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'Comma-separated subset of {",".join(MODES)}')
+        parser.add_argument('--save', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        settings_dict = connections['default'].settings_dict
+        if connections['default'].vendor != 'postgresql':
+            raise CommandError('bench_db_pool needs PostgreSQL: set DATABASE_URL or DB_ENGINE=postgresql.')
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        if not modes or set(modes) - set(MODES):
+            raise CommandError(f'--modes takes a subset of {", ".join(MODES)}.')
+
+        results = {}
+        for mode in modes:
+            run = Run(mode, settings_dict, options['queries'])
+            results[mode] = run.execute(options['requests'], options['threads'], options['warmup'])
+
+        self.report(results, options)
+        if options['save']:
+            with open(options['save'], 'w') as handle:
+                json.dump({
+                    'options': {name: options[name] for name in ('requests', 'threads', 'queries')},
+                    'pool': {**POOL_DEFAULTS, **settings_dict.get('POOL', {})},
+                    'host': settings_dict['HOST'] or 'local socket',
+                    'results': results,
+                }, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f"Results written to {options['save']}")
+
+    def report(self, results, options):
+        self.stdout.write(
+            f"{options['requests']} requests per mode, {options['threads']} thread(s), "
+            f"{options['queries']} quer{'y' if options['queries'] == 1 else 'ies'} per request"
+        )
+        self.stdout.write(
+            f"{'mode':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'connects':>10}"
+        )
+        for mode, stats in results.items():
+            self.stdout.write(
+                f"{mode:<12}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                f"{stats['p99_ms']:>10.3f}{stats['throughput_rps']:>10.1f}{stats['connections_opened']:>10}"
+            )
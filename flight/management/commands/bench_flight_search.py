@@ -0,0 +1,150 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from flight.models import Planet, Flight
+from flight.serializers import FlightSearchSerializer
+from flight.viewsets import FlightViewSet
+
+BENCH_PREFIX = 'BENCH-'
+
+# Search shapes the Flights page issues, one per composite index on Flight.
+SCENARIOS = [
+    ('route + date window', {
+        'origin': 'bench-0', 'destination': 'bench-1', 'status': 'scheduled',
+        'departure_after': '+30', 'departure_before': '+60',
+    }),
+    ('route + price sort', {
+        'origin': 'bench-0', 'destination': 'bench-1', 'status': 'scheduled',
+        'max_price': '60000', 'min_seats': '10', 'sort': 'price',
+    }),
+    ('status + date window', {
+        'status': 'scheduled', 'departure_after': '+10', 'departure_before': '+12',
+    }),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark indexed flight search: seed a large Flight table, print query plans and timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flights', type=int, default=1_000_000,
+                            help='Number of benchmark flights to ensure exist (default: 1,000,000)')
+        parser.add_argument('--planets', type=int, default=12, help='Number of benchmark planets')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per scenario')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--i-know', action='store_true',
+                            help='Seed the configured database even though DEBUG is off')
+
+    def handle(self, *args, **options):
+        # Up to a million rows go into the default database: only a throwaway one.
+        if not settings.DEBUG and not options['i_know']:
+            raise CommandError(
+                f"bench_flight_search writes {options['flights']:,} flights into the "
+                f"'{connection.settings_dict['NAME']}' database. Point it at a throwaway database "
+                f"(DEBUG=True) or pass --i-know."
+            )
+        planets = self.ensure_planets(options['planets'])
+        self.ensure_flights(planets, options['flights'], options['batch_size'], options['seed'])
+
+        self.stdout.write(f'\nDatabase vendor: {connection.vendor}')
+        for label, raw in SCENARIOS:
+            self.run_scenario(label, raw, options['repeat'])
+
+    def ensure_planets(self, count):
+        planets = []
+        for i in range(count):
+            planet, _ = Planet.objects.get_or_create(
+                slug=f'bench-{i}',
+                defaults={'name': f'Bench {i}', 'description': 'Benchmark planet', 'travel_time_days': 1 + i},
+            )
+            planets.append(planet)
+        return planets
+
+    def ensure_flights(self, planets, target, batch_size, seed):
+        existing = Flight.objects.filter(flight_number__startswith=BENCH_PREFIX).count()
+        if existing >= target:
+            self.stdout.write(f'Using {existing:,} existing benchmark flights')
+            return
+
+        rng = random.Random(seed + existing)
+        now = timezone.now()
+        statuses = [code for code, _ in Flight.FLIGHT_STATUS]
+        started = time.perf_counter()
+        batch = []
+        for n in range(existing, target):
+            origin, destination = rng.sample(planets, 2)
+            departure = now + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            batch.append(Flight(
+                flight_number=f'{BENCH_PREFIX}{n}',
+                origin_planet=origin,
+                destination_planet=destination,
+                departure_datetime=departure,
+                arrival_datetime=departure + timedelta(days=destination.travel_time_days),
+                seats_total=200,
+                seats_available=rng.randint(0, 200),
+                price_credits=Decimal(rng.randint(5000, 120000)),
+                status=rng.choices(statuses, weights=[85, 5, 5, 5])[0],
+            ))
+            if len(batch) >= batch_size:
+                Flight.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Flight.objects.bulk_create(batch)
+
+        created = target - existing
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Seeded {created:,} flights in {elapsed:.1f}s')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM ANALYZE flight_flight')
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def resolve(self, raw):
+        today = timezone.localdate()
+        data = {
+            key: (today + timedelta(days=int(value[1:]))).isoformat() if key.startswith('departure_') else value
+            for key, value in raw.items()
+        }
+        serializer = FlightSearchSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def run_scenario(self, label, raw, repeat):
+        params = self.resolve(raw)
+        ordering = FlightViewSet.SORT_ORDERINGS[params['sort']]
+        ordering = ordering + ['-pk' if ordering[-1].startswith('-') else 'pk']
+        queryset = FlightViewSet.filter_search(Flight.objects.all(), params).order_by(*ordering)
+        # Explain the id lookup, which is what the composite indexes cover; the
+        # timed query fetches full rows the way the API does.
+        id_page = queryset.values_list('id', flat=True)[:51]
+        plan = id_page.explain()
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset[:51])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        flight_steps = [line for line in plan.splitlines() if 'flight_flight' in line]
+        index_only = bool(flight_steps) and all(
+            'Index Only Scan' in line or 'COVERING INDEX' in line for line in flight_steps
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+        self.stdout.write(f'  params: {dict(raw)}')
+        for line in plan.splitlines():
+            self.stdout.write(f'  | {line}')
+        self.stdout.write(
+            f'  index-only: {"yes" if index_only else "no"}  '
+            f'p50: {statistics.median(timings):.2f} ms  max: {max(timings):.2f} ms  ({repeat} runs)'
+        )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flight.inventory import expire_holds
+
+
+class Command(BaseCommand):
+    help = 'Release pods and seats held by pending bookings whose hold has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, sweeping every N seconds (0 sweeps once and exits)')
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                expired = expire_holds(batch_size=options['batch_size'])
+                total += expired
+                if expired < options['batch_size']:
+                    break
+            if total or not options['interval']:
+                self.stdout.write(f'✓ Expired {total} held bookings')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flight import export
+
+
+class Command(BaseCommand):
+    help = 'Stream every flight or booking to NDJSON or CSV without loading the table into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.EXPORTS))
+        parser.add_argument('--format', dest='output_format', choices=sorted(export.CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        chunks = export.stream(options['dataset'], options['output_format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+            self.stderr.write(f"✓ Exported {options['dataset']} to {options['output']} "
+                              f"in {time.perf_counter() - started:.1f}s")
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,222 @@
+"""
+Bulk import of ``FlightSchedule`` rows from CSV.
+
+    python manage.py import_flight_schedules data/flights.csv flights2.csv
+
+Columns (as written by ``data/createflights.py``): id, flight number,
+departure date, departure time, price, destination base id, arrival base
+id, arrival date, arrival time. A header row is skipped. Dates may be
+``YYYY-MM-DD`` or ``DD/MM/YYYY``.
+
+The file is streamed and handled in batches: each batch is validated in
+memory (base ids are checked against one preloaded id set, repeated date
+and time strings are parsed once) and upserted on ``id`` in its own
+transaction -- ``COPY`` into a temp table plus ``INSERT ... ON CONFLICT``
+on PostgreSQL, ``bulk_create(update_conflicts=True)`` elsewhere. Reruns
+are idempotent. After every committed batch the line number is saved to a
+checkpoint file, so an interrupted import resumes where it stopped.
+"""
+import csv
+import io
+import json
+import os
+import time
+from datetime import date, datetime
+from datetime import time as time_of_day
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from flight.models import FlightSchedule, PlanetBase
+
+COLUMNS = [
+    'id', 'flight_number', 'departure_date', 'departure_time', 'price',
+    'destination_base_id', 'arrival_base_id', 'arrival_date', 'arrival_time',
+]
+UPDATE_FIELDS = COLUMNS[1:]
+MAX_PRICE = Decimal('1e8')  # max_digits=10, decimal_places=2
+SHOWN_ERRORS = 20
+
+
+@lru_cache(maxsize=None)
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, '%d/%m/%Y').date()
+
+
+@lru_cache(maxsize=None)
+def parse_time(value):
+    return time_of_day.fromisoformat(value)
+
+
+def parse_row(row, base_ids):
+    """Return the row as a tuple in ``COLUMNS`` order, or raise ``ValueError``."""
+    if len(row) != len(COLUMNS):
+        raise ValueError(f'expected {len(COLUMNS)} columns, got {len(row)}')
+    pk, number, departure_date, departure_time, price, destination, arrival, arrival_date, arrival_time = (
+        value.strip() for value in row
+    )
+    number_limit = FlightSchedule._meta.get_field('flight_number').max_length
+    if not number or len(number) > number_limit:
+        raise ValueError(f'flight number must be 1-{number_limit} characters')
+    try:
+        amount = Decimal(price)
+        if not amount.is_finite():  # NaN cannot be compared or stored
+            raise InvalidOperation
+        price = amount.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'invalid price {price!r}')
+    if not 0 <= price < MAX_PRICE:
+        raise ValueError(f'price {price} out of range')
+    pk, destination, arrival = int(pk), int(destination), int(arrival)
+    for base_id in (destination, arrival):
+        if base_id not in base_ids:
+            raise ValueError(f'unknown base {base_id}')
+    departure = (parse_date(departure_date), parse_time(departure_time))
+    arrival_at = (parse_date(arrival_date), parse_time(arrival_time))
+    if arrival_at < departure:
+        raise ValueError('arrives before it departs')
+    return (pk, number, *departure, price, destination, arrival, *arrival_at)
+
+
+def upsert_rows(rows):
+    """Insert or update ``rows`` (tuples in ``COLUMNS`` order) on ``id``."""
+    if connection.vendor == 'postgresql':
+        _copy_upsert(rows)
+    else:
+        FlightSchedule.objects.bulk_create(
+            [FlightSchedule(**dict(zip(COLUMNS, row))) for row in rows],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=UPDATE_FIELDS,
+        )
+
+
+def _copy_upsert(rows):
+    opts = FlightSchedule._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    staging = qn(f'{opts.db_table}_import')
+    columns = ', '.join(qn(opts.get_field(name).column) for name in COLUMNS)
+    updates = ', '.join(
+        f'{qn(opts.get_field(name).column)} = EXCLUDED.{qn(opts.get_field(name).column)}' for name in UPDATE_FIELDS
+    )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+        )
+        copy_sql = f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+            cursor.cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+            f'ON CONFLICT ({qn(opts.pk.column)}) DO UPDATE SET {updates}'
+        )
+
+
+class Checkpoint:
+    """Last committed line of a file, invalidated when the file changes."""
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.fingerprint = [stat.st_size, int(stat.st_mtime)]
+
+    def load(self):
+        try:
+            with open(self.path) as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return 0
+        return data.get('line', 0) if data.get('file') == self.fingerprint else 0
+
+    def save(self, line):
+        with open(self.path, 'w') as handle:
+            json.dump({'file': self.fingerprint, 'line': line}, handle)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Command(BaseCommand):
+    help = 'Bulk upsert FlightSchedule rows from CSV files (idempotent, resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <file>.progress; one file only)')
+        parser.add_argument('--restart', action='store_true', help='Ignore saved checkpoints and start over')
+
+    def handle(self, *args, **options):
+        if options['checkpoint'] and len(options['files']) > 1:
+            raise CommandError('--checkpoint can only be used with a single file.')
+        base_ids = set(PlanetBase.objects.values_list('id', flat=True))
+        for path in options['files']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist.')
+            checkpoint = Checkpoint(options['checkpoint'] or f'{path}.progress', path)
+            self.import_file(path, base_ids, checkpoint, options['batch_size'], options['restart'])
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [FlightSchedule]):
+                cursor.execute(sql)
+
+    def import_file(self, path, base_ids, checkpoint, batch_size, restart):
+        resume_after = 0 if restart else checkpoint.load()
+        if resume_after:
+            self.stdout.write(f'Resuming {path} after line {resume_after}')
+        started = time.perf_counter()
+        stats = {'imported': 0, 'invalid': 0}
+
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            batch = []
+            for line, row in enumerate(csv.reader(handle), 1):
+                if line <= resume_after or not row:
+                    continue
+                if line == 1 and not row[0].strip().isdigit():
+                    continue  # header
+                batch.append((line, row))
+                if len(batch) >= batch_size:
+                    self.flush(batch, base_ids, checkpoint, stats, started)
+                    batch = []
+            if batch:
+                self.flush(batch, base_ids, checkpoint, stats, started)
+
+        checkpoint.clear()
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        rate = stats['imported'] / elapsed
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {path}: upserted {stats['imported']} rows, skipped {stats['invalid']} invalid "
+            f'in {elapsed:.2f}s ({rate:,.0f} rows/s)'
+        ))
+
+    def flush(self, batch, base_ids, checkpoint, stats, started):
+        rows = {}
+        for line, row in batch:
+            try:
+                parsed = parse_row(row, base_ids)
+            except (ValueError, InvalidOperation) as exc:
+                stats['invalid'] += 1
+                if stats['invalid'] <= SHOWN_ERRORS:
+                    self.stderr.write(f'  line {line}: {exc}')
+                continue
+            rows[parsed[0]] = parsed  # a repeated id keeps its last row
+        with transaction.atomic():
+            if rows:
+                upsert_rows(list(rows.values()))
+        checkpoint.save(batch[-1][0])
+        stats['imported'] += len(rows)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(f"  line {batch[-1][0]}: {stats['imported']} rows "
+                          f"({stats['imported'] / elapsed:,.0f} rows/s)")
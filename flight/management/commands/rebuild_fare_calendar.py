@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncDate
+
+from flight.models import Flight, FareCalendarDay
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the fare calendar from Flight (needed after bulk writes that skip signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cells = (
+            Flight.objects.filter(status='scheduled')
+            .annotate(day=TruncDate('departure_datetime'))
+            .values('origin_planet_id', 'destination_planet_id', 'day')
+            .annotate(min_price=Min('price_credits'), flight_count=Count('id'))
+            .order_by()
+        )
+        created = 0
+        with transaction.atomic():
+            FareCalendarDay.objects.all().delete()
+            batch = []
+            for cell in cells.iterator(chunk_size=options['batch_size']):
+                batch.append(FareCalendarDay(**cell))
+                if len(batch) >= options['batch_size']:
+                    FareCalendarDay.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            FareCalendarDay.objects.bulk_create(batch)
+            created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Fare calendar rebuilt: {created} route-days'))
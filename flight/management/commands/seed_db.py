@@ -1,12 +1,105 @@
+import multiprocessing
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.db import connection, connections
 from django.utils import timezone
+from flight import response_cache
 from flight.models import Planet, Flight, Pod, PlanetBase
-from datetime import timedelta
-import random
+
+FLIGHTS_PER_SCALE = 1000
+SEED_PREFIX = 'SD'
+# Fixed so a seed always produces the same departures; override with --start.
+DEFAULT_START = date(2030, 1, 1)
+
+# Pod types: (type, price, pods of this type per flight)
+POD_TYPES = [
+    ('standard', Decimal('5000'), (3, 6)),
+    ('luxury', Decimal('15000'), (3, 6)),
+    ('cryo', Decimal('10000'), (3, 6)),
+]
+
+
+def seed_chunk(chunk):
+    """
+    Create flights ``start`` to ``end`` and their pods. Every value comes from
+    an RNG seeded with ``(seed, index)``, so a chunk produces the same rows
+    whichever process runs it and in whatever order; flights that already
+    exist are skipped. Returns ``(flights, pods)`` created.
+    """
+    index, start, end, seed, anchor, slugs = chunk
+    rng = random.Random(f'{seed}:{index}')
+    planets = list(Planet.objects.filter(slug__in=slugs).order_by('slug').values_list('id', 'travel_time_days'))
+    anchor = timezone.make_aware(datetime.combine(date.fromisoformat(anchor), datetime.min.time()))
+
+    flights, pod_plans = [], []
+    for n in range(start, end):
+        (origin_id, _), (destination_id, travel_days) = rng.sample(planets, 2)
+        departure = anchor + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        seats_total = rng.choice([120, 160, 200])
+        flights.append(Flight(
+            flight_number=f'{SEED_PREFIX}-{seed}-{n:08d}',
+            origin_planet_id=origin_id,
+            destination_planet_id=destination_id,
+            departure_datetime=departure,
+            arrival_datetime=departure + timedelta(days=travel_days, hours=rng.randint(2, 12)),
+            seats_total=seats_total,
+            seats_available=rng.randint(0, seats_total),
+            price_credits=Decimal(rng.randint(10_000, 500_000)),
+            status=rng.choices(['scheduled', 'completed', 'cancelled'], weights=[90, 7, 3])[0],
+        ))
+        pod_plans.append([
+            (pod_type, price, rng.random() < 0.7)
+            for pod_type, price, (low, high) in POD_TYPES
+            for _ in range(rng.randint(low, high))
+        ])
+
+    existing = set(Flight.objects.filter(
+        flight_number__in=[flight.flight_number for flight in flights],
+    ).values_list('flight_number', flat=True))
+    todo = [(flight, plan) for flight, plan in zip(flights, pod_plans) if flight.flight_number not in existing]
+    if not todo:
+        return 0, 0
+
+    created = Flight.objects.bulk_create([flight for flight, _ in todo])
+    if any(flight.pk is None for flight in created):  # backend cannot return ids
+        ids = dict(Flight.objects.filter(
+            flight_number__in=[flight.flight_number for flight in created],
+        ).values_list('flight_number', 'id'))
+        for flight in created:
+            flight.pk = ids[flight.flight_number]
+
+    pods = [
+        Pod(flight_id=flight.pk, pod_number=str(number), pod_type=pod_type,
+            price_credits=price, is_available=available)
+        for flight, plan in todo
+        for number, (pod_type, price, available) in enumerate(plan, 1)
+    ]
+    Pod.objects.bulk_create(pods, batch_size=5000)
+    return len(todo), len(pods)
+
 
 class Command(BaseCommand):
-    help = 'Seed the database with planets, flights, pods, and bases'
+    help = 'Seed the database with planets, bases and a deterministic, scalable set of flights and pods'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.05,
+                            help=f'Flights in thousands ({FLIGHTS_PER_SCALE:,} per 1.0; default 0.05 = 50)')
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, same flights (default: 0)')
+        parser.add_argument('--workers', type=int, default=1, help='Processes to seed with (PostgreSQL)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Flights per chunk')
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help=f'First departure day, YYYY-MM-DD (default: {DEFAULT_START.isoformat()})')
+
+    def report_progress(self, done, chunks, flights, pods, started):
+        if done == chunks or done % 10 == 0:
+            rate = (flights + pods) / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(f'  {done}/{chunks} chunks: {flights:,} flights, {pods:,} pods ({rate:,.0f} rows/s)')
 
     def handle(self, *args, **options):
         self.stdout.write('Starting database seeding...')
@@ -30,41 +123,41 @@ class Command(BaseCommand):
 
         # Planet data with 30 planets from our solar system and beyond
         planets_data = [
-            ('Earth', 'earth', 'Our home planet. Blue marble with diverse ecosystems.', 0, 0, '🌍', 100000),
-            ('Mars', 'mars', 'The red planet. Known for its thin atmosphere and polar ice caps.', 225000000, 250, '🔴', 50000),
-            ('Venus', 'venus', 'Hot and hostile planet with extreme atmospheric pressure.', 108000000, 150, '✨', 45000),
-            ('Mercury', 'mercury', 'The smallest planet, closest to the sun.', 77000000, 120, '⚡', 40000),
-            ('Jupiter', 'jupiter', 'Gas giant with the Great Red Spot. Largest planet in our system.', 550000000, 600, '🪐', 75000),
-            ('Saturn', 'saturn', 'The ringed planet. Known for its spectacular ring system.', 1200000000, 800, '💫', 85000),
-            ('Uranus', 'uranus', 'Ice giant with extreme winds and a tilted rotation axis.', 2600000000, 1200, '🌀', 95000),
-            ('Neptune', 'neptune', 'Furthest ice giant with supersonic winds.', 4500000000, 1600, '🌊', 100000),
-            ('Moon', 'moon', "Earth's natural satellite. Gateway to space.", 384400, 3, '🌙', 10000),
-            ('Europa', 'europa', "Jupiter's icy moon with a hidden subsurface ocean.", 550000000, 620, '❄️', 80000),
-            ('Titan', 'titan', "Saturn's largest moon with methane lakes.", 1200000000, 820, '🏜️', 90000),
-            ('Proxima Centauri b', 'proxima-centauri-b', 'Exoplanet in the habitable zone of Proxima Centauri.', 40000000000000, 2000, '🌟', 500000),
-            ('TRAPPIST-1e', 'trappist-1e', 'Earth-sized exoplanet in habitable zone.', 39000000000000, 1900, '🪐', 480000),
-            ('Kepler-452b', 'kepler-452b', 'Earth cousin in the habitable zone of Kepler-452.', 1200000000000, 1800, '🌎', 450000),
-            ('Enceladus', 'enceladus', "Saturn's icy moon with subsurface water.", 1200000000, 830, '🧊', 88000),
-            ('Io', 'io', "Jupiter's most volcanically active moon.", 550000000, 610, '🌋', 78000),
-            ('Ganymede', 'ganymede', "Jupiter's largest moon, larger than Mercury.", 550000000, 630, '🎯', 82000),
-            ('Callisto', 'callisto', "Jupiter's heavily cratered moon.", 550000000, 640, '🎲', 81000),
-            ('Mimas', 'mimas', "Saturn's moon famous for its giant impact crater.", 1200000000, 810, '⭕', 87000),
-            ('Rhea', 'rhea', "Saturn's second-largest moon.", 1200000000, 815, '⚪', 88500),
-            ('Iapetus', 'iapetus', "Saturn's moon with unusual two-tone coloring.", 1200000000, 825, '🍪', 89000),
-            ('Triton', 'triton', "Neptune's largest moon with nitrogen geysers.", 4500000000, 1620, '❄️', 102000),
-            ('Pluto', 'pluto', 'Dwarf planet with icy terrain and nitrogen plains.', 5900000000, 1800, '🧊', 110000),
-            ('Ceres', 'ceres', 'Dwarf planet in the asteroid belt.', 414000000, 500, '🪨', 65000),
-            ('Vesta', 'vesta', 'Large asteroid with diverse terrain.', 250000000, 300, '⛰️', 35000),
-            ('Juno', 'juno', 'Bright asteroid in the asteroid belt.', 300000000, 350, '✨', 38000),
-            ('Apophis', 'apophis', 'Near-Earth asteroid with unique characteristics.', 10000000, 45, '🌠', 25000),
-            ('Phoebe', 'phoebe', "Saturn's irregular moon.", 1200000000, 850, '🪨', 90000),
-            ('Miranda', 'miranda', "Uranus's moon with extreme terrain variations.", 2600000000, 1220, '🗻', 98000),
-            ('Oberon', 'oberon', "Uranus's largest moon.", 2600000000, 1230, '👑', 99000),
+            ('Earth', 'earth', 'Our home planet. Blue marble with diverse ecosystems.', 0, 0, '🌍'),
+            ('Mars', 'mars', 'The red planet. Known for its thin atmosphere and polar ice caps.', 225000000, 250, '🔴'),
+            ('Venus', 'venus', 'Hot and hostile planet with extreme atmospheric pressure.', 108000000, 150, '✨'),
+            ('Mercury', 'mercury', 'The smallest planet, closest to the sun.', 77000000, 120, '⚡'),
+            ('Jupiter', 'jupiter', 'Gas giant with the Great Red Spot. Largest planet in our system.', 550000000, 600, '🪐'),
+            ('Saturn', 'saturn', 'The ringed planet. Known for its spectacular ring system.', 1200000000, 800, '💫'),
+            ('Uranus', 'uranus', 'Ice giant with extreme winds and a tilted rotation axis.', 2600000000, 1200, '🌀'),
+            ('Neptune', 'neptune', 'Furthest ice giant with supersonic winds.', 4500000000, 1600, '🌊'),
+            ('Moon', 'moon', "Earth's natural satellite. Gateway to space.", 384400, 3, '🌙'),
+            ('Europa', 'europa', "Jupiter's icy moon with a hidden subsurface ocean.", 550000000, 620, '❄️'),
+            ('Titan', 'titan', "Saturn's largest moon with methane lakes.", 1200000000, 820, '🏜️'),
+            ('Proxima Centauri b', 'proxima-centauri-b', 'Exoplanet in the habitable zone of Proxima Centauri.', 40000000000000, 2000, '🌟'),
+            ('TRAPPIST-1e', 'trappist-1e', 'Earth-sized exoplanet in habitable zone.', 39000000000000, 1900, '🪐'),
+            ('Kepler-452b', 'kepler-452b', 'Earth cousin in the habitable zone of Kepler-452.', 1200000000000, 1800, '🌎'),
+            ('Enceladus', 'enceladus', "Saturn's icy moon with subsurface water.", 1200000000, 830, '🧊'),
+            ('Io', 'io', "Jupiter's most volcanically active moon.", 550000000, 610, '🌋'),
+            ('Ganymede', 'ganymede', "Jupiter's largest moon, larger than Mercury.", 550000000, 630, '🎯'),
+            ('Callisto', 'callisto', "Jupiter's heavily cratered moon.", 550000000, 640, '🎲'),
+            ('Mimas', 'mimas', "Saturn's moon famous for its giant impact crater.", 1200000000, 810, '⭕'),
+            ('Rhea', 'rhea', "Saturn's second-largest moon.", 1200000000, 815, '⚪'),
+            ('Iapetus', 'iapetus', "Saturn's moon with unusual two-tone coloring.", 1200000000, 825, '🍪'),
+            ('Triton', 'triton', "Neptune's largest moon with nitrogen geysers.", 4500000000, 1620, '❄️'),
+            ('Pluto', 'pluto', 'Dwarf planet with icy terrain and nitrogen plains.', 5900000000, 1800, '🧊'),
+            ('Ceres', 'ceres', 'Dwarf planet in the asteroid belt.', 414000000, 500, '🪨'),
+            ('Vesta', 'vesta', 'Large asteroid with diverse terrain.', 250000000, 300, '⛰️'),
+            ('Juno', 'juno', 'Bright asteroid in the asteroid belt.', 300000000, 350, '✨'),
+            ('Apophis', 'apophis', 'Near-Earth asteroid with unique characteristics.', 10000000, 45, '🌠'),
+            ('Phoebe', 'phoebe', "Saturn's irregular moon.", 1200000000, 850, '🪨'),
+            ('Miranda', 'miranda', "Uranus's moon with extreme terrain variations.", 2600000000, 1220, '🗻'),
+            ('Oberon', 'oberon', "Uranus's largest moon.", 2600000000, 1230, '👑'),
         ]
 
         # Create planets
         planets = {}
-        for name, slug, description, distance, travel_time, emoji, flight_price in planets_data:
+        for name, slug, description, distance, travel_time, emoji in planets_data:
             planet, created = Planet.objects.get_or_create(
                 slug=slug,
                 defaults={
@@ -75,7 +168,7 @@ class Command(BaseCommand):
                     'emoji': emoji,
                 }
             )
-            planets[slug] = (planet, flight_price)
+            planets[slug] = planet
             if created:
                 self.stdout.write(f'✓ Created planet: {planet.name}')
 
@@ -95,7 +188,7 @@ class Command(BaseCommand):
 
         for planet_slug, base_name, description in bases_data:
             if planet_slug in planets:
-                planet, _ = planets[planet_slug]
+                planet = planets[planet_slug]
                 base, created = PlanetBase.objects.get_or_create(
                     planet=planet,
                     name=base_name,
@@ -106,60 +199,49 @@ class Command(BaseCommand):
                 if created:
                     self.stdout.write(f'✓ Created base: {base.name}')
 
-        # Pod types and data
-        pod_types = [
-            {'type': 'standard', 'price': 5000},
-            {'type': 'luxury', 'price': 15000},
-            {'type': 'cryo', 'price': 10000},
+        # Flights and pods: generated in independent, deterministically seeded
+        # chunks so reruns skip what exists and chunks can run in parallel.
+        total = round(options['scale'] * FLIGHTS_PER_SCALE)
+        start = options['start'] or DEFAULT_START
+        chunks = [
+            (index, index * options['batch_size'], min(total, (index + 1) * options['batch_size']),
+             options['seed'], start.isoformat(), sorted(planets))
+            for index in range(-(-total // options['batch_size']))
         ]
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write('SQLite allows one writer at a time; seeding with a single worker')
+            workers = 1
+
+        self.stdout.write(f'Seeding {total:,} flights in {len(chunks)} chunks with {workers} worker(s)...')
+        started = time.perf_counter()
+        flight_count = pod_count = 0
+        if workers > 1:
+            connections.close_all()  # children must not share the parent's connection
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                results = pool.imap_unordered(seed_chunk, chunks)
+                for done, (flights, pods) in enumerate(results, 1):
+                    flight_count += flights
+                    pod_count += pods
+                    self.report_progress(done, len(chunks), flight_count, pod_count, started)
+        else:
+            for done, chunk in enumerate(chunks, 1):
+                flights, pods = seed_chunk(chunk)
+                flight_count += flights
+                pod_count += pods
+                self.report_progress(done, len(chunks), flight_count, pod_count, started)
 
-        # Create flights
-        now = timezone.now()
-        flight_count = 0
-        planet_slugs = list(planets.keys())
-        
-        for i, source_slug in enumerate(planet_slugs[:5]):
-            for dest_slug in planet_slugs[i+1:6]:
-                source, _ = planets[source_slug]
-                destination, base_fare = planets[dest_slug]
-                
-                # Create 2-3 flights per route
-                for j in range(random.randint(2, 3)):
-                    flight_time = now + timedelta(days=random.randint(5, 60))
-                    
-                    flight = Flight.objects.create(
-                        flight_number=f'FL{source.name[:3].upper()}-{destination.name[:3].upper()}-{j+1}',
-                        origin_planet=source,
-                        destination_planet=destination,
-                        departure_datetime=flight_time,
-                        arrival_datetime=flight_time + timedelta(days=destination.travel_time_days),
-                        seats_total=200,
-                        seats_available=random.randint(10, 150),
-                        price_credits=base_fare + random.randint(-5000, 10000),
-                        status='scheduled',
-                    )
-                    
-                    # Create pods for this flight - ensure unique pod numbers per flight
-                    pod_counter = 1
-                    for pod_type_info in pod_types:
-                        for _ in range(random.randint(3, 6)):
-                            Pod.objects.create(
-                                flight=flight,
-                                pod_number=str(pod_counter),
-                                pod_type=pod_type_info['type'],
-                                price_credits=pod_type_info['price'],
-                                is_available=random.choice([True, True, False]),
-                            )
-                            pod_counter += 1
-                    
-                    flight_count += 1
-                    self.stdout.write(f'✓ Created flight: {flight.flight_number}')
+        if flight_count:
+            # bulk_create sends no signals: resync what they would have maintained.
+            call_command('rebuild_fare_calendar', stdout=self.stdout)
+            response_cache.bump(Flight)
+            response_cache.bump(Pod)
 
         self.stdout.write(
             self.style.SUCCESS(
                 f'\n✓ Database seeding completed!\n'
-                f'  - {len(planets)} planets created\n'
-                f'  - {flight_count} flights created\n'
+                f'  - {len(planets)} planets\n'
+                f'  - {flight_count:,} flights and {pod_count:,} pods created\n'
                 f'  - Demo user: demo@example.com / demo123'
             )
         )
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count
+from django.utils import timezone
+
+from flight.inventory import InventoryConflict, reserve_booking
+from flight.models import Planet, Flight, Pod, Booking
+
+
+def run_contention(flight, users, attempts, threads, pod_ids=None, seed=0):
+    """
+    Fire ``attempts`` concurrent bookings at one flight from ``threads``
+    workers. Each attempt targets a random pod from ``pod_ids`` (or no pod).
+    Returns a stats dict; lock timeouts (SQLite) are retried and counted.
+    """
+    lock = threading.Lock()
+    stats = {'booked': 0, 'conflicts': 0, 'retries': 0}
+    remaining = iter(range(attempts))
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                user = users[rng.randrange(len(users))]
+                pod_id = rng.choice(pod_ids) if pod_ids else None
+                while True:
+                    try:
+                        reserve_booking(user, flight.pk, pod_id)
+                        outcome = 'booked'
+                    except InventoryConflict:
+                        outcome = 'conflicts'
+                    except OperationalError:
+                        with lock:
+                            stats['retries'] += 1
+                        time.sleep(rng.uniform(0.001, 0.005))
+                        continue
+                    break
+                with lock:
+                    stats[outcome] += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['bookings_per_second'] = stats['booked'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
+
+
+def check_inventory(flight):
+    """Return a list of invariant violations for ``flight`` (empty when consistent)."""
+    flight.refresh_from_db()
+    active = Booking.objects.filter(flight=flight, status__in=['pending', 'confirmed'])
+    problems = []
+    if flight.seats_available < 0:
+        problems.append(f'seats_available is negative ({flight.seats_available})')
+    if active.count() != flight.seats_total - flight.seats_available:
+        problems.append(
+            f'{active.count()} active bookings but {flight.seats_total - flight.seats_available} seats taken'
+        )
+    double = active.exclude(pod=None).values('pod').annotate(n=Count('id')).filter(n__gt=1)
+    if double.exists():
+        problems.append(f'{double.count()} pods booked more than once')
+    booked_pods = set(active.exclude(pod=None).values_list('pod', flat=True))
+    available_but_booked = Pod.objects.filter(pk__in=booked_pods, is_available=True).count()
+    if available_but_booked:
+        problems.append(f'{available_but_booked} booked pods still marked available')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Stress-test booking creation on one hot flight and check for overselling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=2000)
+        parser.add_argument('--seats', type=int, default=500)
+        parser.add_argument('--pods', type=int, default=300, help='Pods on the flight (0 books seats only)')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        tag = f'STRESS-{int(time.time())}'
+        origin, _ = Planet.objects.get_or_create(slug='stress-origin', defaults={'name': 'Stress Origin', 'description': 'Stress test'})
+        destination, _ = Planet.objects.get_or_create(slug='stress-destination', defaults={'name': 'Stress Destination', 'description': 'Stress test'})
+        departure = timezone.now() + timedelta(days=30)
+        flight = Flight.objects.create(
+            flight_number=tag[:20],
+            origin_planet=origin,
+            destination_planet=destination,
+            departure_datetime=departure,
+            arrival_datetime=departure + timedelta(days=1),
+            seats_total=options['seats'],
+            seats_available=options['seats'],
+            price_credits=Decimal('1000.00'),
+        )
+        Pod.objects.bulk_create([
+            Pod(flight=flight, pod_number=str(n + 1), pod_type='standard', price_credits=Decimal('100.00'))
+            for n in range(options['pods'])
+        ])
+        pod_ids = list(flight.pods.values_list('id', flat=True))
+        User.objects.bulk_create([
+            User(username=f'{tag.lower()}-{n}') for n in range(options['users'])
+        ])
+        users = list(User.objects.filter(username__startswith=tag.lower()))
+
+        self.stdout.write(
+            f'Hot flight {flight.flight_number}: {options["seats"]} seats, {len(pod_ids)} pods, '
+            f'{options["attempts"]} attempts over {options["threads"]} threads ({connection.vendor})'
+        )
+        stats = run_contention(flight, users, options['attempts'], options['threads'], pod_ids, options['seed'])
+        problems = check_inventory(flight)
+
+        self.stdout.write(
+            f'  booked: {stats["booked"]}  conflicts: {stats["conflicts"]}  lock retries: {stats["retries"]}\n'
+            f'  elapsed: {stats["elapsed"]:.2f}s  throughput: {stats["bookings_per_second"]:.0f} bookings/s'
+        )
+        if problems:
+            raise CommandError('Inventory invariants violated: ' + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('✓ No overselling: seats, pods and bookings agree'))
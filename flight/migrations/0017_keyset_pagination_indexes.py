@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0016_alter_planet_options_remove_planet_distance_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'booked_at', 'id'], name='booking_user_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_datetime', 'id'], name='flight_departure_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pod',
+            index=models.Index(fields=['pod_type', 'pod_number', 'id'], name='pod_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0017_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin_planet', 'destination_planet', 'status', 'departure_datetime', 'id'], include=('price_credits', 'seats_available'), name='flight_route_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin_planet', 'destination_planet', 'status', 'price_credits', 'departure_datetime', 'id'], include=('seats_available',), name='flight_route_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['status', 'departure_datetime', 'id'], include=('price_credits', 'seats_available'), name='flight_status_departure_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0018_flight_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['updated_at'], name='flight_updated_at_idx'),
+        ),
+    ]
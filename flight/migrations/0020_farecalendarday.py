@@ -0,0 +1,30 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0019_flight_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FareCalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('flight_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('destination_planet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flight.planet')),
+                ('origin_planet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flight.planet')),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('origin_planet', 'destination_planet', 'day')},
+            },
+        ),
+    ]
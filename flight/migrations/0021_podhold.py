@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0020_farecalendarday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PodHold',
+            fields=[
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hold', serialize=False, to='flight.booking')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flight.flight')),
+                ('pod', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flight.pod')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0021_podhold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pod',
+            index=models.Index(fields=['flight', 'is_available', 'pod_type', 'pod_number', 'id'], name='pod_availability_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0022_pod_availability_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='podhold',
+            name='pod',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='flight.pod'),
+        ),
+    ]
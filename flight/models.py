@@ -1,5 +1,10 @@
-from django.db import models
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
 
 class Planet(models.Model):
@@ -47,10 +52,48 @@ class Flight(models.Model):
 
     class Meta:
         ordering = ['-departure_datetime']
+        indexes = [
+            models.Index(fields=['departure_datetime', 'id'], name='flight_departure_keyset_idx'),
+            # Search access paths: route + status, then the date window or the
+            # price sort, ending in the keyset order. INCLUDE columns
+            # (PostgreSQL only) let the remaining filters be answered from the
+            # index alone.
+            models.Index(
+                fields=['origin_planet', 'destination_planet', 'status', 'departure_datetime', 'id'],
+                include=['price_credits', 'seats_available'],
+                name='flight_route_departure_idx',
+            ),
+            models.Index(
+                fields=['origin_planet', 'destination_planet', 'status', 'price_credits', 'departure_datetime', 'id'],
+                include=['seats_available'],
+                name='flight_route_price_idx',
+            ),
+            models.Index(
+                fields=['status', 'departure_datetime', 'id'],
+                include=['price_credits', 'seats_available'],
+                name='flight_status_departure_idx',
+            ),
+            # Delta sync of the itinerary route index (flight/routing.py)
+            models.Index(fields=['updated_at'], name='flight_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.flight_number}: {self.origin_planet} → {self.destination_planet}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which fare calendar cell the stored row counted towards, so
+        # a save that moves the flight can refresh the cell it left.
+        instance._loaded_fare_cell = instance.fare_cell if not instance.get_deferred_fields() else None
+        return instance
+
+    @property
+    def fare_cell(self):
+        """``(origin_id, destination_id, day)`` of this flight in the fare calendar."""
+        day = timezone.localtime(self.departure_datetime).date()
+        return (self.origin_planet_id, self.destination_planet_id, day)
+
 
 class Pod(models.Model):
     POD_TYPES = [
@@ -69,6 +112,14 @@ class Pod(models.Model):
     class Meta:
         unique_together = ['flight', 'pod_number']
         ordering = ['pod_type', 'pod_number']
+        indexes = [
+            models.Index(fields=['pod_type', 'pod_number', 'id'], name='pod_keyset_idx'),
+            # A flight's available pods of one type, already in keyset order.
+            models.Index(
+                fields=['flight', 'is_available', 'pod_type', 'pod_number', 'id'],
+                name='pod_availability_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Pod {self.pod_number} ({self.pod_type}) - {self.flight.flight_number}"
@@ -93,11 +144,135 @@ class Booking(models.Model):
     class Meta:
         ordering = ['-booked_at']
         unique_together = ['user', 'flight', 'pod']
+        indexes = [
+            models.Index(fields=['user', 'booked_at', 'id'], name='booking_user_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} → {self.flight.flight_number}"
 
 
+class PodHold(models.Model):
+    """Inventory reserved by a pending booking until ``expires_at``.
+
+    A hold exists exactly while its booking is pending: confirming or
+    cancelling deletes it, and ``manage.py expire_holds`` releases expired
+    ones in set-based batches. Flight and pod are copied from the booking so
+    the sweep never joins ``Booking``; deleting the pod keeps the hold, so
+    the booking is still cancelled and its seat returned.
+    """
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, primary_key=True, related_name='hold')
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='+')
+    pod = models.ForeignKey(Pod, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Hold for booking {self.booking_id} until {self.expires_at}"
+
+
+class FareCalendarDay(models.Model):
+    """Cheapest scheduled fare per route per departure day.
+
+    Maintained incrementally by the ``Flight`` signals below, so the fare
+    calendar is one range read on the unique (route, day) index instead of
+    an aggregate over ``Flight``. ``manage.py rebuild_fare_calendar`` resyncs
+    it after bulk writes that bypass signals.
+    """
+    origin_planet = models.ForeignKey(Planet, on_delete=models.CASCADE, related_name='+')
+    destination_planet = models.ForeignKey(Planet, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    flight_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['day']
+        unique_together = ['origin_planet', 'destination_planet', 'day']
+
+    def __str__(self):
+        return f"{self.origin_planet_id} → {self.destination_planet_id} on {self.day}: {self.min_price}"
+
+    @classmethod
+    def refresh(cls, origin_id, destination_id, day):
+        """
+        Recompute one cell from the scheduled flights of that route and day.
+
+        The cell row is locked (created first if missing) before the flights
+        are read, so concurrent refreshes of one cell run one after the other
+        and the last one sees every committed flight.
+        """
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        with transaction.atomic():
+            cell, _ = cls.objects.select_for_update().get_or_create(
+                origin_planet_id=origin_id, destination_planet_id=destination_id, day=day,
+                defaults={'min_price': 0},
+            )
+            stats = Flight.objects.filter(
+                origin_planet_id=origin_id,
+                destination_planet_id=destination_id,
+                status='scheduled',
+                departure_datetime__gte=start,
+                departure_datetime__lt=start + timedelta(days=1),
+            ).aggregate(min_price=models.Min('price_credits'), flight_count=models.Count('id'))
+            if not stats['flight_count']:
+                cell.delete()
+                return
+            cell.min_price = stats['min_price']
+            cell.flight_count = stats['flight_count']
+            cell.save(update_fields=['min_price', 'flight_count', 'updated_at'])
+
+
+@receiver(post_save, sender=Flight)
+def update_fare_calendar(sender, instance, **kwargs):
+    cells = {instance.fare_cell}
+    loaded = getattr(instance, '_loaded_fare_cell', None)
+    if loaded is not None:
+        cells.add(loaded)
+    for cell in cells:
+        FareCalendarDay.refresh(*cell)
+    instance._loaded_fare_cell = instance.fare_cell
+
+
+@receiver(post_delete, sender=Flight)
+def remove_from_fare_calendar(sender, instance, **kwargs):
+    FareCalendarDay.refresh(*instance.fare_cell)
+
+
+@receiver(post_save, sender=Flight)
+def update_route_index(sender, instance, **kwargs):
+    """Patch this process's itinerary route index once the save commits."""
+    from .routing import route_index
+    transaction.on_commit(lambda: route_index.update_flight(instance))
+
+
+@receiver(post_delete, sender=Flight)
+def remove_from_route_index(sender, instance, **kwargs):
+    from .routing import route_index
+    flight_id = instance.pk
+    transaction.on_commit(lambda: route_index.remove(flight_id))
+
+
+@receiver([post_save, post_delete], sender=Pod)
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_seatmap(sender, instance, **kwargs):
+    from . import seatmap
+    seatmap.invalidate(instance.flight_id)
+
+
+@receiver([post_save, post_delete], sender=Planet)
+@receiver([post_save, post_delete], sender=Flight)
+@receiver([post_save, post_delete], sender=Pod)
+def bump_response_cache(sender, **kwargs):
+    from . import response_cache
+    response_cache.bump(sender)
+
+
+@receiver([post_save, post_delete], sender=Pod)
+def touch_flight(sender, instance, **kwargs):
+    """Pods render inside flight responses, so a pod change must move the flight's ETag."""
+    Flight.objects.filter(pk=instance.flight_id).update(updated_at=timezone.now())
+
+
 # Deprecated models (kept for backward compatibility)
 class PlanetBase(models.Model):
     name = models.CharField(max_length=100)
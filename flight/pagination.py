@@ -0,0 +1,212 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.duration import duration_string
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Keep full precision: DjangoJSONEncoder truncates microseconds, which
+    # would make the cursor skip or repeat rows sharing a timestamp prefix.
+    if isinstance(value, timedelta):
+        return duration_string(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a view's natural ordering.
+
+    The cursor is the ordering key of the last (or first) row on the page,
+    so every page is a single indexed range scan with ``LIMIT page_size + 1``.
+    There is no ``COUNT(*)`` and no ``OFFSET``, so page N costs the same as
+    page 1. The primary key is appended as a tiebreaker when the ordering
+    is not already unique.
+
+    Views choose the ordering with ``keyset_ordering`` (an attribute or
+    property, so it may depend on the request); otherwise the model's
+    ``Meta.ordering`` is used, falling back to ``pk``. Annotated names work
+    as keys too.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    def window_queryset(self, queryset, request, view=None):
+        """
+        The sliced queryset of rows behind the requested page (including the
+        one extra row that decides whether there is a next page).
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_ordering(queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = False
+        if self.cursor is not None:
+            values, reverse = self.cursor
+            values = self._to_python(queryset, values)
+            queryset = queryset.filter(self._seek_filter(values, reverse))
+
+        order_by = [
+            ('-' if desc != reverse else '') + name for name, desc in self.keys
+        ]
+        return queryset.order_by(*order_by)[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_rows(list(self.window_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views; the page is fetched with the async ORM."""
+        window = self.window_queryset(queryset, request, view)
+        return self.paginate_rows([row async for row in window])
+
+    def paginate_rows(self, rows):
+        """Turn the fetched window into the page, setting the navigation state."""
+        cursor = self.cursor
+        reverse = cursor is not None and cursor[1]
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        if reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering is None:
+            ordering = queryset.model._meta.ordering or ['pk']
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        keys = []
+        for field in ordering:
+            assert isinstance(field, str) and '__' not in field, (
+                'Keyset pagination needs plain model field names for ordering, '
+                'got {field!r}.'.format(field=field)
+            )
+            keys.append((field.lstrip('-'), field.startswith('-')))
+
+        names = {name for name, _ in keys}
+        if not names & {'pk', 'id', queryset.model._meta.pk.name}:
+            keys.append(('pk', keys[-1][1] if keys else False))
+        return keys
+
+    def _to_python(self, queryset, values):
+        """Convert cursor strings back to the key fields' Python types."""
+        opts = queryset.model._meta
+        converted = []
+        for (name, _), value in zip(self.keys, values):
+            if name in queryset.query.annotations:
+                field = queryset.query.annotations[name].output_field
+            elif name == 'pk':
+                field = opts.pk
+            else:
+                field = opts.get_field(name)
+            try:
+                converted.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return converted
+
+    def _seek_filter(self, values, reverse):
+        """
+        Expand ``(a, b, c) > (x, y, z)`` into
+        ``a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)``,
+        flipping each comparison for descending keys.
+        """
+        seek = Q()
+        equal = Q()
+        for (name, desc), value in zip(self.keys, values):
+            lookup = 'lt' if desc != reverse else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            reverse = bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursors only ever hold strings (see _encode_value).
+        if (
+            not isinstance(values, list) or len(values) != len(self.keys)
+            or not all(isinstance(value, str) for value in values)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, row, reverse):
+        values = [_encode_value(getattr(row, name)) for name, _ in self.keys]
+        payload = {'v': values}
+        if reverse:
+            payload['r'] = 1
+        encoded = b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,204 @@
+"""
+Versioned response cache for hot, read-mostly list endpoints.
+
+A cached list declares the models it renders (``cache_dependencies``). Each
+model has a generation counter in the cache; an entry records the
+generations of every dependency it was built from and is only fresh while
+they are all current. A write therefore invalidates every cached page of
+that model with one ``incr``. Keys are the endpoint plus the normalized
+query string.
+
+``Planet``, ``Flight`` and ``Pod`` signals bump their generation right away
+and again after commit, so a page another request cached from the
+pre-commit state is dropped too. Inventory changes made with
+``QuerySet.update()`` bump ``Flight`` explicitly (``flight.inventory``).
+
+Misses go through ``flight.singleflight``: one request recomputes a page
+while concurrent ones wait for it, or are served the previous (stale)
+version for up to ``RESPONSE_CACHE_STALE_SECONDS`` past its freshness.
+
+With read replicas (``spacetravel.db.replicas``), a request pinned to the
+primary bypasses the cache, and a page read from a replica is served but
+not stored while a dependency was bumped within the replica lag window: the
+replica may not have the write yet, and the entry would be stored under the
+new generation.
+
+Entries live in the ``responses`` cache alias: local memory per process by
+default, where each worker only sees its own bumps and staleness is bounded
+by ``RESPONSE_CACHE_SECONDS``; point ``RESPONSE_CACHE_BACKEND`` at a shared
+cache (e.g. Redis) to share entries, generations and refresh locks between
+workers.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from spacetravel.db import replicas
+
+from . import singleflight
+
+CACHE_ALIAS = 'responses'
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(model):
+    return f'gen:{model._meta.label_lower}'
+
+
+def _seed():
+    # Counters that were evicted restart from the clock, never from a number
+    # that entries still in the cache may have recorded.
+    return time.time_ns()
+
+
+def generations(models):
+    """Current generation of each model, in order."""
+    cache = get_cache()
+    keys = [_generation_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _seed(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _incr(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+
+
+def _bumped_key(model):
+    return f'bumped:{model._meta.label_lower}'
+
+
+def _advance(model):
+    _incr(_generation_key(model))
+    get_cache().set(_bumped_key(model), time.time(), replicas.pin_seconds())
+
+
+def bump(model):
+    """Invalidate every cached response that renders ``model``."""
+    _advance(model)
+    transaction.on_commit(lambda: _advance(model))
+
+
+def bumped_since(models, since):
+    """Whether any of ``models`` was bumped at or after the ``since`` timestamp (within the lag window)."""
+    stamps = get_cache().get_many([_bumped_key(model) for model in models]).values()
+    return any(stamp >= since for stamp in stamps)
+
+
+def bypasses_cache():
+    """Whether the current request is pinned to the primary, so must not read or store entries."""
+    routing = replicas.current()
+    return routing is not None and routing.pinned
+
+
+def storable(models, started):
+    """Whether a page computed since ``started`` may be cached; see the module docstring."""
+    routing = replicas.current()
+    if routing is None or not routing.used_replica:
+        return True
+    return not bumped_since(models, started - replicas.pin_seconds())
+
+
+class CachedListMixin:
+    """
+    Serve ``list`` from the response cache.
+
+    Hits run no queries and no serializers. Cached ``ETag`` /
+    ``Last-Modified`` headers are replayed, so conditional requests still
+    get a 304 on a hit.
+    """
+    cache_dependencies = ()
+
+    def get_response_cache_key(self, request):
+        return response_cache_key(self.basename, request)
+
+    def list(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or bypasses_cache():
+            return super().list(request, *args, **kwargs)
+        cache = get_cache()
+        fresh_seconds = cache.default_timeout
+        versions = generations(self.cache_dependencies)
+        started = time.time()
+        produced = []
+
+        def compute():
+            # Build the full page even if this client's validators match:
+            # the entry is shared with every request waiting on it.
+            self.evaluate_preconditions = False
+            response = super(CachedListMixin, self).list(request, *args, **kwargs)
+            produced.append(response)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return None
+            if not storable(self.cache_dependencies, started):
+                return None
+            headers = {name: response[name] for name in CACHED_HEADERS if name in response}
+            return make_entry(versions, response.data, headers, fresh_seconds)
+
+        entry = singleflight.fetch(
+            cache, self.get_response_cache_key(request), compute, lambda entry: is_fresh(entry, versions),
+            timeout=fresh_seconds + settings.RESPONSE_CACHE_STALE_SECONDS,
+            lock_timeout=settings.RESPONSE_CACHE_LOCK_SECONDS,
+            wait=settings.RESPONSE_CACHE_LOCK_SECONDS,
+        )
+        if entry is None:
+            # Not cacheable (e.g. a 400); answer with our own result.
+            return produced[-1] if produced else super().list(request, *args, **kwargs)
+        return self.cached_response(request, entry)
+
+    def cached_response(self, request, entry):
+        return replay(request, entry, Response)
+
+
+def response_cache_key(basename, request):
+    """Cache key of a list page: endpoint plus normalized query string and media type."""
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    parts = [
+        request.scheme,
+        request.get_host(),
+        request.path,
+        repr(params),
+        request.accepted_media_type or '',
+    ]
+    digest = hashlib.md5('|'.join(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'resp:{basename}:{digest}'
+
+
+def make_entry(versions, data, headers, fresh_seconds):
+    return {'versions': versions, 'fresh_until': time.time() + fresh_seconds, 'data': data, 'headers': headers}
+
+
+def is_fresh(entry, versions):
+    return entry['versions'] == versions and entry['fresh_until'] > time.time()
+
+
+def replay(request, entry, render):
+    """Answer ``request`` from a cache entry: a 304 if its validators match, else ``render(data)``."""
+    headers = entry['headers']
+    last_modified = headers.get('Last-Modified')
+    response = get_conditional_response(
+        request._request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+    )
+    if response is None:
+        response = render(entry['data'])
+    for name, value in headers.items():
+        response[name] = value
+    return response
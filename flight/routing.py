@@ -0,0 +1,245 @@
+"""
+In-memory route index for multi-leg itinerary search.
+
+Each process keeps a time-expanded view of the ``Flight`` graph: for every
+origin planet, the bookable legs sorted by departure. Connections are found
+by bisecting the departure list of the planet a leg arrives at, so a search
+runs in memory instead of issuing chained ORM queries.
+
+The index stays current three ways:
+
+* ``post_save``/``post_delete`` on ``Flight`` patch single legs after commit
+  (see ``flight.models``), for changes made in this process;
+* a delta sync every ``SYNC_INTERVAL_SECONDS`` picks up rows whose
+  ``updated_at`` moved, for changes made by other workers. ``updated_at``
+  is stamped before commit, so a row can become visible after rows stamped
+  later; each sync rereads the last ``SYNC_OVERLAP_SECONDS`` before its
+  watermark (reapplying a row is harmless), and a transaction that stays
+  open longer than that is only seen by the next rebuild;
+* a full rebuild every ``REBUILD_INTERVAL_SECONDS`` drops legs deleted
+  elsewhere and legs that have departed.
+"""
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULTS = {
+    'MIN_CONNECTION_MINUTES': 60,
+    'MAX_CONNECTION_HOURS': 7 * 24,
+    'SYNC_INTERVAL_SECONDS': 30,
+    'SYNC_OVERLAP_SECONDS': 60,
+    'REBUILD_INTERVAL_SECONDS': 60 * 60,
+}
+
+LEG_FIELDS = [
+    'id', 'flight_number', 'origin_planet_id', 'destination_planet_id',
+    'departure_datetime', 'arrival_datetime', 'price_credits',
+]
+
+Leg = namedtuple('Leg', ['id', 'flight_number', 'origin_id', 'destination_id', 'departure', 'arrival', 'price'])
+
+
+def get_setting(name):
+    return getattr(settings, 'ITINERARY_SEARCH', {}).get(name, DEFAULTS[name])
+
+
+def is_bookable(status, seats_available, departure):
+    return status == 'scheduled' and seats_available > 0 and departure >= timezone.now()
+
+
+class RouteIndex:
+    """Per-origin legs sorted by departure, with copy-on-write updates.
+
+    Writers hold a lock and swap in new per-origin lists; readers never lock
+    and always see a consistent list for each planet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._legs = {}        # flight id -> Leg
+        self._by_origin = {}   # planet id -> (departures, legs), both sorted by departure
+        self._slugs = {}       # planet slug -> planet id
+        self._planets = {}     # planet id -> planet slug
+        self._watermark = None
+        self._built_at = None
+        self._synced_at = None
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    def ensure_fresh(self):
+        # Once built, only one thread refreshes; the others search the
+        # slightly older index rather than queueing behind the reload.
+        if not self._refresh_lock.acquire(blocking=not self.is_built):
+            return
+        try:
+            now = time.monotonic()
+            if not self.is_built or now - self._built_at > get_setting('REBUILD_INTERVAL_SECONDS'):
+                self.rebuild()
+            elif now - self._synced_at > get_setting('SYNC_INTERVAL_SECONDS'):
+                self.sync()
+        finally:
+            self._refresh_lock.release()
+
+    def rebuild(self):
+        from .models import Flight, Planet
+
+        rows = Flight.objects.filter(
+            status='scheduled', seats_available__gt=0, departure_datetime__gte=timezone.now(),
+        ).values_list(*LEG_FIELDS, 'updated_at')
+        legs = {}
+        by_origin = {}
+        watermark = None
+        for row in rows.iterator(chunk_size=5000):
+            leg = Leg(*row[:-1])
+            legs[leg.id] = leg
+            by_origin.setdefault(leg.origin_id, []).append(leg)
+            watermark = row[-1] if watermark is None else max(watermark, row[-1])
+        for origin_id, origin_legs in by_origin.items():
+            origin_legs.sort(key=lambda leg: (leg.departure, leg.id))
+            by_origin[origin_id] = ([leg.departure for leg in origin_legs], origin_legs)
+        planets = dict(Planet.objects.values_list('id', 'slug'))
+
+        with self._lock:
+            self._legs = legs
+            self._by_origin = by_origin
+            self._planets = planets
+            self._slugs = {slug: pk for pk, slug in planets.items()}
+            self._watermark = watermark
+            self._built_at = self._synced_at = time.monotonic()
+
+    def sync(self):
+        """Apply rows changed since the last load, from any process."""
+        from .models import Flight, Planet
+
+        changed = Flight.objects.values_list(*LEG_FIELDS, 'status', 'seats_available', 'updated_at')
+        if self._watermark is not None:
+            overlap = timedelta(seconds=get_setting('SYNC_OVERLAP_SECONDS'))
+            changed = changed.filter(updated_at__gte=self._watermark - overlap)
+        for row in changed.iterator(chunk_size=5000):
+            leg = Leg(*row[:7])
+            status, seats_available, updated_at = row[7:]
+            if is_bookable(status, seats_available, leg.departure):
+                self._put(leg)
+            else:
+                self.remove(leg.id)
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+        planets = dict(Planet.objects.values_list('id', 'slug'))
+        with self._lock:
+            self._planets = planets
+            self._slugs = {slug: pk for pk, slug in planets.items()}
+            self._synced_at = time.monotonic()
+
+    def update_flight(self, flight):
+        """Patch the index from a saved ``Flight`` instance."""
+        if not self.is_built:
+            return
+        if is_bookable(flight.status, flight.seats_available, flight.departure_datetime):
+            self._put(Leg(*(getattr(flight, name) for name in LEG_FIELDS)))
+        else:
+            self.remove(flight.pk)
+
+    def remove(self, flight_id):
+        with self._lock:
+            leg = self._legs.pop(flight_id, None)
+            if leg is not None:
+                self._replace_origin(leg.origin_id, drop=leg)
+
+    def _put(self, leg):
+        with self._lock:
+            old = self._legs.get(leg.id)
+            if old == leg:
+                return
+            if old is not None and old.origin_id != leg.origin_id:
+                self._replace_origin(old.origin_id, drop=old)
+                old = None
+            self._legs[leg.id] = leg
+            self._replace_origin(leg.origin_id, drop=old, add=leg)
+
+    def _replace_origin(self, origin_id, drop=None, add=None):
+        _, legs = self._by_origin.get(origin_id, ([], []))
+        legs = [leg for leg in legs if drop is None or leg.id != drop.id]
+        if add is not None:
+            keys = [(leg.departure, leg.id) for leg in legs]
+            legs.insert(bisect_left(keys, (add.departure, add.id)), add)
+        if legs:
+            self._by_origin[origin_id] = ([leg.departure for leg in legs], legs)
+        else:
+            self._by_origin.pop(origin_id, None)
+
+    def planet_id(self, slug):
+        return self._slugs.get(slug)
+
+    def planet_slug(self, planet_id):
+        return self._planets.get(planet_id)
+
+    def departures(self, planet_id, earliest, latest):
+        """Legs leaving ``planet_id`` with ``earliest <= departure < latest``."""
+        departures, legs = self._by_origin.get(planet_id, ([], []))
+        start = bisect_left(departures, earliest)
+        end = bisect_left(departures, latest, lo=start)
+        return legs[start:end]
+
+    def search(self, origin_id, destination_id, earliest, latest, max_legs=3,
+               min_connection=None, max_connection=None, sort='price', limit=10):
+        """
+        Return up to ``limit`` itineraries (lists of legs) from ``origin_id``
+        to ``destination_id`` whose first leg departs in ``[earliest, latest)``,
+        cheapest or shortest first. Each connection leaves at least
+        ``min_connection`` and at most ``max_connection`` after the previous
+        leg arrives; planets are never revisited.
+        """
+        if min_connection is None:
+            min_connection = timedelta(minutes=get_setting('MIN_CONNECTION_MINUTES'))
+        if max_connection is None:
+            max_connection = timedelta(hours=get_setting('MAX_CONNECTION_HOURS'))
+        if sort == 'price':
+            def cost(path):
+                return sum(leg.price for leg in path)
+        else:
+            def cost(path):
+                return path[-1].arrival - path[0].departure
+
+        # Max-heap (by negated cost) of the best ``limit`` itineraries so far.
+        # Both costs only grow as a path is extended, so any partial path
+        # already worse than the current worst result can be pruned.
+        best = []
+        counter = itertools.count()
+
+        def worse_than_best(value):
+            return len(best) >= limit and value >= -best[0][0]
+
+        def extend(path, planet_id, ready_at, latest_departure, visited):
+            for leg in self.departures(planet_id, ready_at, latest_departure):
+                if leg.destination_id in visited:
+                    continue
+                candidate = path + [leg]
+                value = cost(candidate)
+                if worse_than_best(value):
+                    continue
+                if leg.destination_id == destination_id:
+                    entry = (-value, -next(counter), candidate)
+                    if len(best) < limit:
+                        heapq.heappush(best, entry)
+                    else:
+                        heapq.heapreplace(best, entry)
+                elif len(candidate) < max_legs:
+                    extend(candidate, leg.destination_id, leg.arrival + min_connection,
+                           leg.arrival + max_connection, visited | {leg.destination_id})
+
+        extend([], origin_id, earliest, latest, {origin_id})
+        ranked = sorted(best, key=lambda entry: (-entry[0], -entry[1]))
+        return [path for _, _, path in ranked]
+
+
+route_index = RouteIndex()
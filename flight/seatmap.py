@@ -0,0 +1,99 @@
+"""
+Compact pod availability per flight.
+
+A seat map groups a flight's pods by type and encodes them as strings:
+
+* ``ids`` and ``numbers`` are range lists (``"101-140,152"``) in pod-id order;
+* ``availability`` is run-length encoded over the same order, ``A`` for
+  available and ``U`` for taken (``"A12U3A25"``).
+
+It is built from one narrow query and cached per flight in the
+``SEATMAP_CACHE`` cache. Pod and booking signals and every inventory change
+in ``flight.inventory`` invalidate it there; with a local-memory cache that
+only reaches the process that made the change, so deployments with several
+processes need a shared cache for availability to stay current.
+"""
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Flight, Pod
+
+
+def get_cache():
+    return caches[settings.SEATMAP_CACHE]
+
+
+def cache_key(flight_id):
+    return f'seatmap:{flight_id}'
+
+
+def invalidate(flight_id):
+    """Drop the cached seat map for ``flight_id`` once the transaction commits."""
+    transaction.on_commit(lambda: get_cache().delete(cache_key(flight_id)))
+
+
+def compress_ranges(values):
+    """
+    ``["1", "2", "3", "7"]`` -> ``"1-3,7"``. Only canonical integers are
+    collapsed into ranges; anything else (``"B1"``, ``"01"``) is listed
+    as-is, so every value can be read back exactly.
+    """
+    parts = []
+    start = previous = None
+    for value in values:
+        text = str(value)
+        number = int(text) if text.isascii() and text.isdigit() and str(int(text)) == text else None
+        if number is not None and previous is not None and number == previous + 1:
+            previous = number
+            continue
+        if start is not None:
+            parts.append(str(start) if start == previous else f'{start}-{previous}')
+        if number is None:
+            parts.append(str(value))
+            start = previous = None
+        else:
+            start = previous = number
+    if start is not None:
+        parts.append(str(start) if start == previous else f'{start}-{previous}')
+    return ','.join(parts)
+
+
+def run_length(flags):
+    return ''.join(f"{'A' if flag else 'U'}{len(list(run))}" for flag, run in groupby(flags))
+
+
+def build(flight_id):
+    """Return the seat map dict, or ``None`` if the flight does not exist."""
+    rows = list(
+        Pod.objects.filter(flight_id=flight_id)
+        .order_by('pod_type', 'id')
+        .values_list('pod_type', 'id', 'pod_number', 'is_available')
+    )
+    if not rows and not Flight.objects.filter(pk=flight_id).exists():
+        return None
+
+    pod_types = {}
+    for pod_type, pods in groupby(rows, key=lambda row: row[0]):
+        pods = list(pods)
+        pod_types[pod_type] = {
+            'total': len(pods),
+            'available': sum(1 for pod in pods if pod[3]),
+            'ids': compress_ranges(pod[1] for pod in pods),
+            'numbers': compress_ranges(pod[2] for pod in pods),
+            'availability': run_length(pod[3] for pod in pods),
+        }
+    return {'flight_id': flight_id, 'pod_types': pod_types}
+
+
+def get(flight_id):
+    cache = get_cache()
+    key = cache_key(flight_id)
+    seatmap = cache.get(key)
+    if seatmap is None:
+        seatmap = build(flight_id)
+        if seatmap is not None:
+            cache.set(key, seatmap, settings.SEATMAP_CACHE_SECONDS)
+    return seatmap
@@ -1,26 +1,30 @@
+from datetime import timedelta
+
 from rest_framework import serializers
+from django.utils import timezone
 from django.contrib.auth.models import User
 from accounts.models import Profile
-from .models import Planet, Flight, Pod, Booking
+from spacetravel.serializers import DynamicFieldsMixin
+from .models import Planet, Flight, Pod, Booking, FareCalendarDay
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
         read_only_fields = ['id']
 
 
-class ProfileSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    
+class ProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ['id', 'user', 'avatar', 'bio', 'passport_id', 'preferred_pod_type', 'credits_balance', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {'user': (UserSerializer, {})}
+        default_expand = ['user']
 
 
-class PlanetSerializer(serializers.ModelSerializer):
+class PlanetSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Planet
         fields = ['id', 'name', 'slug', 'description', 'gltf_model_url', 'distance_from_earth_km', 
@@ -28,17 +32,15 @@ class PlanetSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
 
 
-class PodSerializer(serializers.ModelSerializer):
+class PodSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Pod
         fields = ['id', 'flight', 'pod_number', 'pod_type', 'price_credits', 'is_available', 'created_at']
         read_only_fields = ['id', 'created_at']
+        expandable_fields = {'flight': ('flight.serializers.FlightSummarySerializer', {})}
 
 
-class FlightSerializer(serializers.ModelSerializer):
-    origin_planet = PlanetSerializer(read_only=True)
-    destination_planet = PlanetSerializer(read_only=True)
-    pods = PodSerializer(many=True, read_only=True)
+class FlightSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     origin_planet_id = serializers.IntegerField(write_only=True)
     destination_planet_id = serializers.IntegerField(write_only=True)
     
@@ -48,6 +50,12 @@ class FlightSerializer(serializers.ModelSerializer):
                   'destination_planet_id', 'departure_datetime', 'arrival_datetime', 'seats_total', 
                   'seats_available', 'price_credits', 'status', 'pods', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {
+            'origin_planet': (PlanetSerializer, {}),
+            'destination_planet': (PlanetSerializer, {}),
+            'pods': (PodSerializer, {'many': True}),
+        }
+        default_expand = ['origin_planet', 'destination_planet', 'pods']
     
     def create(self, validated_data):
         origin_id = validated_data.pop('origin_planet_id')
@@ -57,12 +65,179 @@ class FlightSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class BookingSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    flight = FlightSerializer(read_only=True)
-    pod = PodSerializer(read_only=True)
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    flight_id = serializers.IntegerField(write_only=True)
+    pod_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
     
     class Meta:
         model = Booking
-        fields = ['id', 'user', 'flight', 'pod', 'status', 'total_price', 'booked_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'booked_at', 'updated_at']
+        fields = ['id', 'user', 'flight', 'pod', 'flight_id', 'pod_id', 'status', 'total_price',
+                  'booked_at', 'updated_at']
+        # Status moves through the confirm/cancel actions and the price is
+        # computed from the flight and pod when inventory is claimed.
+        read_only_fields = ['id', 'user', 'flight', 'pod', 'status', 'total_price', 'booked_at', 'updated_at']
+        expandable_fields = {
+            'user': (UserSerializer, {}),
+            'flight': (FlightSerializer, {}),
+            'pod': (PodSerializer, {}),
+        }
+        default_expand = ['user', 'flight', 'pod']
+
+    def update(self, instance, validated_data):
+        # Changing flight or pod would bypass the inventory claim; rebook instead.
+        validated_data.pop('flight_id', None)
+        validated_data.pop('pod_id', None)
+        return super().update(instance, validated_data)
+
+
+class PlanetSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Planet
+        fields = ['id', 'name', 'slug', 'emoji']
+
+
+class FlightSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """A flight without its pods, for embedding in lists."""
+
+    class Meta:
+        model = Flight
+        fields = ['id', 'flight_number', 'origin_planet', 'destination_planet', 'departure_datetime',
+                  'arrival_datetime', 'price_credits', 'status']
+        expandable_fields = {
+            'origin_planet': (PlanetSummarySerializer, {}),
+            'destination_planet': (PlanetSummarySerializer, {}),
+        }
+        default_expand = ['origin_planet', 'destination_planet']
+
+
+class BookingListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Booking list rows: the flight summary and the booked pod only."""
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'flight', 'pod', 'status', 'total_price', 'booked_at', 'updated_at']
+        read_only_fields = fields
+        expandable_fields = {
+            'flight': (FlightSummarySerializer, {}),
+            'pod': (PodSerializer, {}),
+        }
+        default_expand = ['flight', 'pod']
+
+
+class GroupBookingSerializer(serializers.Serializer):
+    """Input of ``POST /api/v1/bookings/group/``."""
+    MAX_PODS = 40
+
+    flight_id = serializers.IntegerField()
+    pod_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=MAX_PODS)
+
+    def validate_pod_ids(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Each pod can only be listed once.')
+        return value
+
+
+class PodFilterSerializer(serializers.Serializer):
+    """Validates the query parameters of the pod list."""
+    flight = serializers.IntegerField(required=False)
+    pod_type = serializers.ChoiceField(choices=Pod.POD_TYPES, required=False)
+    is_available = serializers.BooleanField(required=False, allow_null=True, default=None)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+
+
+class FlightSearchSerializer(serializers.Serializer):
+    """Validates the query parameters of the flight search mode."""
+    SORT_CHOICES = ['departure', '-departure', 'price', '-price', 'duration', '-duration']
+
+    origin = serializers.SlugField(required=False)
+    destination = serializers.SlugField(required=False)
+    departure_after = serializers.DateField(required=False)
+    departure_before = serializers.DateField(required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    status = serializers.ChoiceField(choices=Flight.FLIGHT_STATUS, required=False)
+    min_seats = serializers.IntegerField(min_value=0, required=False)
+    sort = serializers.ChoiceField(choices=SORT_CHOICES, default='-departure')
+
+    def validate(self, data):
+        after = data.get('departure_after')
+        before = data.get('departure_before')
+        if after and before and after > before:
+            raise serializers.ValidationError({'departure_before': 'Must be on or after departure_after.'})
+        return data
+
+
+class FareCalendarQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of ``/api/v1/flights/fare-calendar/``."""
+    origin = serializers.SlugField()
+    destination = serializers.SlugField()
+    start = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, max_value=60, default=60)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the ``export`` actions."""
+    output = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+
+
+class ItinerarySearchSerializer(serializers.Serializer):
+    """Validates the query parameters of ``/api/v1/itineraries/``."""
+    MAX_WINDOW_DAYS = 60
+
+    origin = serializers.SlugField()
+    destination = serializers.SlugField()
+    departure_after = serializers.DateField(required=False)
+    departure_before = serializers.DateField(required=False)
+    max_legs = serializers.IntegerField(min_value=1, max_value=3, default=3)
+    min_connection_minutes = serializers.IntegerField(min_value=0, max_value=7 * 24 * 60, required=False)
+    sort = serializers.ChoiceField(choices=['price', 'duration'], default='price')
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+    def validate(self, data):
+        if data['origin'] == data['destination']:
+            raise serializers.ValidationError({'destination': 'Must differ from origin.'})
+        after = data.get('departure_after') or timezone.localdate()
+        before = data.get('departure_before') or after + timedelta(days=30)
+        if before < after:
+            raise serializers.ValidationError({'departure_before': 'Must be on or after departure_after.'})
+        if (before - after).days > self.MAX_WINDOW_DAYS:
+            raise serializers.ValidationError(
+                {'departure_before': f'Search window is limited to {self.MAX_WINDOW_DAYS} days.'}
+            )
+        data['departure_after'] = after
+        data['departure_before'] = before
+        return data
+
+
+class ItineraryLegSerializer(serializers.Serializer):
+    flight_id = serializers.IntegerField(source='id')
+    flight_number = serializers.CharField()
+    origin = serializers.SerializerMethodField()
+    destination = serializers.SerializerMethodField()
+    departure_datetime = serializers.DateTimeField(source='departure')
+    arrival_datetime = serializers.DateTimeField(source='arrival')
+    price_credits = serializers.DecimalField(source='price', max_digits=10, decimal_places=2)
+
+    def get_origin(self, leg):
+        return self.context['planet_slugs'].get(leg.origin_id)
+
+    def get_destination(self, leg):
+        return self.context['planet_slugs'].get(leg.destination_id)
+
+
+class ItinerarySerializer(serializers.Serializer):
+    """Serializes one itinerary, a list of ``routing.Leg`` tuples."""
+
+    def to_representation(self, legs):
+        departure = legs[0].departure
+        arrival = legs[-1].arrival
+        return {
+            'legs': ItineraryLegSerializer(legs, many=True, context=self.context).data,
+            'connections': len(legs) - 1,
+            'total_price': serializers.DecimalField(max_digits=12, decimal_places=2).to_representation(
+                sum(leg.price for leg in legs)
+            ),
+            'departure_datetime': serializers.DateTimeField().to_representation(departure),
+            'arrival_datetime': serializers.DateTimeField().to_representation(arrival),
+            'duration_hours': round((arrival - departure).total_seconds() / 3600, 2),
+        }
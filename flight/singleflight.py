@@ -0,0 +1,90 @@
+"""
+Single-flight recomputation of cached values.
+
+When a hot cache entry expires or is invalidated, every concurrent request
+would otherwise recompute it at once. ``fetch`` lets one caller per key do
+the work:
+
+* within a process, the first caller takes an in-flight slot for the key
+  and the others wait on it;
+* across processes, the leader also takes an ``add()`` lock in the cache,
+  so with a shared backend one worker recomputes for the whole fleet.
+
+While the refresh runs, callers that have a stale entry return it straight
+away; callers without one wait (at most ``wait`` seconds) for the new value
+and only compute it themselves if the leader fails or times out.
+"""
+import threading
+import time
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def fetch(cache, key, compute, is_fresh, timeout=None, lock_timeout=10, wait=10, poll_interval=0.05):
+    """
+    Return the entry cached under ``key``, refreshing it through
+    ``compute()`` when ``is_fresh(entry)`` is false.
+
+    ``compute`` returns the entry to store, or ``None`` when its result must
+    not be cached; ``fetch`` then returns ``None`` too. Entries are stored
+    with ``timeout``, which should outlive freshness by the stale window.
+    """
+    entry = cache.get(key)
+    if entry is not None and is_fresh(entry):
+        return entry
+
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        if entry is not None:
+            return entry
+        if call.done.wait(wait) and call.result is not None:
+            return call.result
+        return _store(cache, key, compute(), timeout)
+
+    try:
+        call.result = _refresh(cache, key, compute, is_fresh, entry, timeout, lock_timeout, wait, poll_interval)
+        return call.result
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
+
+
+def _store(cache, key, value, timeout):
+    if value is not None:
+        cache.set(key, value, timeout)
+    return value
+
+
+def _refresh(cache, key, compute, is_fresh, stale, timeout, lock_timeout, wait, poll_interval):
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            return _store(cache, key, compute(), timeout)
+        finally:
+            cache.delete(lock_key)
+
+    # Another process is refreshing this key.
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        entry = cache.get(key)
+        if entry is not None and is_fresh(entry):
+            return entry
+        if cache.get(lock_key) is None:
+            break
+    return _store(cache, key, compute(), timeout)
@@ -1,3 +1,1646 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase as BaseAPITestCase, force_authenticate
+from accounts.authentication import CACHE_ALIAS as USER_CACHE_ALIAS
+from accounts.models import Profile
+from accounts.views import MeView
+from .async_views import FlightListView, PlanetListView
+from .viewsets import FlightViewSet
+from spacetravel.db import replicas
+from spacetravel.db.pool import ConnectionPool, PoolTimeout
+from spacetravel.timing import RequestTimings
+
+from .inventory import confirm_booking, expire_holds, release_booking, reserve_booking
+from .management.commands.import_flight_schedules import Checkpoint, parse_row
+from .management.commands.seed_db import DEFAULT_START
+from .management.commands.stress_booking import check_inventory, run_contention
+from .models import Planet, Flight, Pod, Booking, PodHold, FareCalendarDay, FlightSchedule, PlanetBase
+from . import singleflight
+from .response_cache import CACHE_ALIAS
+from .routing import route_index
+from .seatmap import compress_ranges
+
+
+class APITestCase(BaseAPITestCase):
+    """Cached responses and users outlive the per-test rollback, so every test starts cold."""
+
+    def setUp(self):
+        super().setUp()
+        caches[CACHE_ALIAS].clear()
+        caches[USER_CACHE_ALIAS].clear()
+
+
+def make_planet(name, distance=0.0, travel_time_days=1):
+    return Planet.objects.create(
+        name=name,
+        description=f'{name} test planet',
+        distance_from_earth_km=distance,
+        travel_time_days=travel_time_days,
+    )
+
+
+def make_flight(origin, destination, number, departure=None, price='1000.00', pods=3, **kwargs):
+    departure = departure or timezone.now() + timedelta(days=7)
+    flight = Flight.objects.create(
+        flight_number=number,
+        origin_planet=origin,
+        destination_planet=destination,
+        departure_datetime=departure,
+        arrival_datetime=departure + timedelta(days=destination.travel_time_days or 1),
+        price_credits=Decimal(price),
+        **kwargs,
+    )
+    for i in range(pods):
+        Pod.objects.create(
+            flight=flight,
+            pod_number=str(i + 1),
+            pod_type=Pod.POD_TYPES[i % len(Pod.POD_TYPES)][0],
+            price_credits=Decimal('500.00'),
+        )
+    return flight
+
+
+class FlightQueryBudgetTests(APITestCase):
+    """The flight endpoints must not issue queries per row or per pod."""
+
+    # One for the page's ETag validators, one for flights joined to both
+    # planets, one for the prefetched pods. Detail validators come from the row.
+    LIST_BUDGET = 3
+    DETAIL_BUDGET = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', distance=225.0, travel_time_days=250)
+        cls.moon = make_planet('Moon', distance=0.38, travel_time_days=3)
+
+    def _make_flights(self, count):
+        for i in range(count):
+            destination = self.mars if i % 2 else self.moon
+            make_flight(self.earth, destination, f'QB-{count}-{i}', pods=4)
+
+    def test_list_query_count_is_constant(self):
+        self._make_flights(3)
+        with self.assertNumQueries(self.LIST_BUDGET):
+            small = self.client.get('/api/v1/flights/')
+        self._make_flights(12)
+        with self.assertNumQueries(self.LIST_BUDGET):
+            large = self.client.get('/api/v1/flights/')
+        self.assertEqual(small.status_code, 200)
+        self.assertEqual(large.status_code, 200)
+
+    def test_filtered_list_stays_within_budget(self):
+        self._make_flights(6)
+        with self.assertNumQueries(self.LIST_BUDGET):
+            response = self.client.get('/api/v1/flights/', {'origin': 'earth', 'destination': 'mars'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_stays_within_budget(self):
+        flight = make_flight(self.earth, self.mars, 'QB-DETAIL', pods=10)
+        with self.assertNumQueries(self.DETAIL_BUDGET):
+            response = self.client.get(f'/api/v1/flights/{flight.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['pods']), 10)
+        self.assertEqual(response.data['origin_planet']['slug'], 'earth')
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', distance=225.0, travel_time_days=250)
+        base = timezone.now() + timedelta(days=30)
+        # Pairs of flights share a departure time so the pk tiebreaker matters.
+        for i in range(7):
+            make_flight(cls.earth, cls.mars, f'KP-{i}', departure=base - timedelta(hours=i // 2), pods=0)
+
+    def _walk(self, url, params):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_every_row_once_in_order(self):
+        pages = self._walk('/api/v1/flights/', {'page_size': 2})
+        numbers = [row['flight_number'] for page in pages for row in page['results']]
+        expected = list(
+            Flight.objects.order_by('-departure_datetime', '-pk').values_list('flight_number', flat=True)
+        )
+        self.assertEqual(numbers, expected)
+        self.assertEqual(len(pages), 4)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertNotIn('count', pages[0])
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/v1/flights/', {'page_size': 3}).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [row['id'] for row in back['results']],
+            [row['id'] for row in first['results']],
+        )
+
+    def test_pages_issue_no_count_or_offset(self):
+        first = self.client.get('/api/v1/flights/', {'page_size': 2}).data
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first['next'])
+        for query in ctx.captured_queries:
+            sql = query['sql'].upper()
+            self.assertNotIn('OFFSET', sql)
+            # The only count is the ETag validator over the LIMITed page window.
+            if 'COUNT(' in sql:
+                self.assertIn('LIMIT 3', sql)
+
+    def test_pod_pages_follow_type_and_number(self):
+        flight = Flight.objects.first()
+        for i in range(5):
+            Pod.objects.create(flight=flight, pod_number=f'P{i}', pod_type='luxury' if i % 2 else 'cryo',
+                               price_credits=Decimal('10.00'))
+        pages = self._walk('/api/v1/pods/', {'page_size': 2})
+        keys = [(row['pod_type'], row['pod_number']) for page in pages for row in page['results']]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(keys), 5)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/api/v1/flights/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_values_are_404(self):
+        for values in ([None, None], [{'a': 1}, 1], [['2030-01-01'], '1'], ['not-a-date', '1'], ['2030-01-01', 'x']):
+            cursor = base64.b64encode(json.dumps({'v': values}).encode()).decode()
+            response = self.client.get('/api/v1/flights/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, values)
+            self.assertEqual(response.json()['detail'], 'Invalid cursor')
+
+
+class FlightSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', distance=225.0, travel_time_days=250)
+        cls.moon = make_planet('Moon', distance=0.38, travel_time_days=3)
+        cls.base = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=10)
+        cls.cheap = make_flight(cls.earth, cls.mars, 'S-CHEAP', departure=cls.base, price='900.00', pods=0,
+                                seats_available=5)
+        cls.pricey = make_flight(cls.earth, cls.mars, 'S-PRICEY', departure=cls.base + timedelta(days=2),
+                                 price='5000.00', pods=0, seats_available=80)
+        cls.short = make_flight(cls.earth, cls.moon, 'S-SHORT', departure=cls.base + timedelta(days=1),
+                                price='2000.00', pods=0, seats_available=50)
+        cls.cancelled = make_flight(cls.earth, cls.mars, 'S-CANCELLED', departure=cls.base, price='100.00',
+                                    pods=0, status='cancelled')
+
+    def search(self, **params):
+        response = self.client.get('/api/v1/flights/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['flight_number'] for row in response.data['results']]
+
+    def test_date_window_is_inclusive_of_both_days(self):
+        day = self.base.date()
+        self.assertEqual(
+            set(self.search(departure_after=day, departure_before=day + timedelta(days=1))),
+            {'S-CHEAP', 'S-SHORT', 'S-CANCELLED'},
+        )
+
+    def test_combined_filters(self):
+        self.assertEqual(self.search(status='scheduled', max_price='2500', min_seats=10), ['S-SHORT'])
+
+    def test_sort_by_price_and_duration(self):
+        self.assertEqual(self.search(status='scheduled', sort='price'), ['S-CHEAP', 'S-SHORT', 'S-PRICEY'])
+        self.assertEqual(self.search(status='scheduled', sort='-price'), ['S-PRICEY', 'S-SHORT', 'S-CHEAP'])
+        self.assertEqual(self.search(status='scheduled', sort='duration')[0], 'S-SHORT')
+
+    def test_duration_sort_paginates(self):
+        first = self.client.get('/api/v1/flights/', {'sort': 'duration', 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(first['results'][0]['flight_number'], 'S-SHORT')
+        self.assertNotEqual(second['results'][0]['id'], first['results'][0]['id'])
+
+    def test_invalid_params_are_rejected(self):
+        response = self.client.get('/api/v1/flights/', {'departure_after': '2030-01-02', 'departure_before': '2030-01-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/flights/', {'sort': 'seats'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ItinerarySearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.moon = make_planet('Moon', travel_time_days=1)
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.titan = make_planet('Titan', travel_time_days=3)
+        cls.t0 = timezone.now().replace(microsecond=0) + timedelta(days=2)
+
+    def leg(self, number, origin, destination, depart_hours, hours, price):
+        departure = self.t0 + timedelta(hours=depart_hours)
+        return Flight.objects.create(
+            flight_number=number, origin_planet=origin, destination_planet=destination,
+            departure_datetime=departure, arrival_datetime=departure + timedelta(hours=hours),
+            price_credits=Decimal(price),
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.direct = self.leg('DIRECT', self.earth, self.titan, 0, 100, '9000')
+        self.a = self.leg('E-M', self.earth, self.moon, 0, 10, '1000')
+        self.b = self.leg('M-T', self.moon, self.titan, 12, 20, '2000')
+        self.too_tight = self.leg('M-T-TIGHT', self.moon, self.titan, 10, 5, '100')
+        self.c = self.leg('M-MA', self.moon, self.mars, 11, 5, '500')
+        self.d = self.leg('MA-T', self.mars, self.titan, 20, 5, '500')
+        route_index.rebuild()
+
+    def search(self, **params):
+        params = {'origin': 'earth', 'destination': 'titan', **params}
+        response = self.client.get('/api/v1/itineraries/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [[leg['flight_number'] for leg in it['legs']] for it in response.data['results']]
+
+    def test_ranks_by_price_and_respects_min_connection(self):
+        self.assertEqual(self.search(), [['E-M', 'M-MA', 'MA-T'], ['E-M', 'M-T'], ['DIRECT']])
+
+    def test_ranks_by_duration(self):
+        self.assertEqual(self.search(sort='duration'), [['E-M', 'M-MA', 'MA-T'], ['E-M', 'M-T'], ['DIRECT']])
+        self.assertEqual(self.search(sort='duration', max_legs=2)[0], ['E-M', 'M-T'])
+
+    def test_max_legs_and_limit(self):
+        self.assertEqual(self.search(max_legs=2), [['E-M', 'M-T'], ['DIRECT']])
+        self.assertEqual(self.search(max_legs=1), [['DIRECT']])
+        self.assertEqual(self.search(limit=1), [['E-M', 'M-MA', 'MA-T']])
+
+    def test_zero_min_connection_allows_tight_transfer(self):
+        self.assertIn(['E-M', 'M-T-TIGHT'], self.search(min_connection_minutes=0))
+
+    def test_search_runs_no_queries_once_index_is_fresh(self):
+        with self.assertNumQueries(0):
+            self.search()
+
+    def test_index_follows_flight_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.status = 'cancelled'
+            self.a.save()
+        self.assertEqual(self.search(), [['DIRECT']])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.direct.delete()
+        self.assertEqual(self.search(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leg('E-T-NEW', self.earth, self.titan, 5, 50, '10')
+        self.assertEqual(self.search(), [['E-T-NEW']])
+
+    def test_delta_sync_picks_up_other_process_changes(self):
+        # A queryset update bypasses signals, like a write from another worker.
+        Flight.objects.filter(pk=self.b.pk).update(price_credits=Decimal('1'), updated_at=timezone.now())
+        route_index.sync()
+        self.assertEqual(self.search()[0], ['E-M', 'M-T'])
+
+    def test_delta_sync_rereads_rows_committed_behind_the_watermark(self):
+        Flight.objects.filter(pk=self.a.pk).update(updated_at=timezone.now())
+        route_index.sync()
+        # Stamped before the watermark, but only visible now.
+        Flight.objects.filter(pk=self.b.pk).update(
+            price_credits=Decimal('1'), updated_at=timezone.now() - timedelta(seconds=5),
+        )
+        route_index.sync()
+        self.assertEqual(self.search()[0], ['E-M', 'M-T'])
+
+    def test_unknown_planet_is_404(self):
+        response = self.client.get('/api/v1/itineraries/', {'origin': 'earth', 'destination': 'pluto'})
+        self.assertEqual(response.status_code, 404)
+
+
+class FareCalendarTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.day = timezone.localdate() + timedelta(days=5)
+        cls.noon = timezone.make_aware(datetime.combine(cls.day, datetime.min.time())) + timedelta(hours=12)
+
+    def cell(self, day=None):
+        return FareCalendarDay.objects.filter(
+            origin_planet=self.earth, destination_planet=self.mars, day=day or self.day
+        ).first()
+
+    def test_saves_and_deletes_keep_cells_current(self):
+        first = make_flight(self.earth, self.mars, 'FC-1', departure=self.noon, price='800.00', pods=0)
+        make_flight(self.earth, self.mars, 'FC-2', departure=self.noon + timedelta(hours=2), price='500.00', pods=0)
+        self.assertEqual((self.cell().min_price, self.cell().flight_count), (Decimal('500.00'), 2))
+
+        first = Flight.objects.get(pk=first.pk)
+        first.departure_datetime += timedelta(days=1)
+        first.save()
+        self.assertEqual(self.cell().flight_count, 1)
+        self.assertEqual(self.cell(self.day + timedelta(days=1)).min_price, Decimal('800.00'))
+
+        Flight.objects.get(flight_number='FC-2').delete()
+        self.assertIsNone(self.cell())
+
+    def test_cancelled_flights_are_excluded(self):
+        flight = make_flight(self.earth, self.mars, 'FC-C', departure=self.noon, price='300.00', pods=0)
+        flight.status = 'cancelled'
+        flight.save()
+        self.assertIsNone(self.cell())
+
+    def test_endpoint_serves_grid_in_one_query(self):
+        make_flight(self.earth, self.mars, 'FC-E', departure=self.noon, price='700.00', pods=0)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/flights/fare-calendar/', {'origin': 'earth', 'destination': 'mars'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['days']), 60)
+        self.assertEqual(response.data['days'][5], {'date': self.day.isoformat(), 'min_price': '700.00', 'flight_count': 1})
+        self.assertIsNone(response.data['days'][0]['min_price'])
+
+    def test_rebuild_command_matches_incremental_state(self):
+        make_flight(self.earth, self.mars, 'FC-R1', departure=self.noon, price='450.00', pods=0)
+        expected = list(FareCalendarDay.objects.values_list('day', 'min_price', 'flight_count'))
+        FareCalendarDay.objects.all().delete()
+        call_command('rebuild_fare_calendar', stdout=StringIO())
+        self.assertEqual(list(FareCalendarDay.objects.values_list('day', 'min_price', 'flight_count')), expected)
+
+
+class BookingInventoryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.user = User.objects.create_user('traveller', password='pw-traveller-1')
+        cls.other = User.objects.create_user('rival', password='pw-rival-1')
+
+    def setUp(self):
+        super().setUp()
+        self.flight = make_flight(self.earth, self.mars, 'INV-1', price='1000.00', pods=2, seats_available=2)
+        self.pod = self.flight.pods.first()
+        self.client.force_authenticate(self.user)
+
+    def book(self, pod=None, user=None):
+        if user:
+            self.client.force_authenticate(user)
+        data = {'flight_id': self.flight.pk}
+        if pod:
+            data['pod_id'] = pod.pk
+        return self.client.post('/api/v1/bookings/', data, format='json')
+
+    def test_booking_claims_pod_and_seat(self):
+        response = self.book(self.pod)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total_price'], '1500.00')
+        self.flight.refresh_from_db()
+        self.pod.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 1)
+        self.assertFalse(self.pod.is_available)
+
+    def test_taken_pod_is_a_conflict_and_rolls_back(self):
+        self.assertEqual(self.book(self.pod).status_code, 201)
+        response = self.book(self.pod, user=self.other)
+        self.assertEqual(response.status_code, 409)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_sold_out_flight_releases_the_pod_claim(self):
+        Flight.objects.filter(pk=self.flight.pk).update(seats_available=0)
+        self.assertEqual(self.book(self.pod).status_code, 409)
+        self.pod.refresh_from_db()
+        self.assertTrue(self.pod.is_available)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_cancel_returns_inventory_once(self):
+        booking_id = self.book(self.pod).data['id']
+        response = self.client.post(f'/api/v1/bookings/{booking_id}/cancel/')
+        self.assertEqual(response.data['status'], 'cancelled')
+        again = self.client.post(f'/api/v1/bookings/{booking_id}/cancel/')
+        self.assertEqual(again.status_code, 409)
+        self.assertIn('cancelled', again.data['detail'])
+        self.flight.refresh_from_db()
+        self.pod.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 2)
+        self.assertTrue(self.pod.is_available)
+        self.assertEqual(self.client.post(f'/api/v1/bookings/{booking_id}/confirm/').status_code, 409)
+
+
+class BookingContentionTests(TransactionTestCase):
+    """Concurrent bookings on one hot flight never oversell seats or pods."""
+
+    def setUp(self):
+        super().setUp()
+        earth = make_planet('Earth')
+        mars = make_planet('Mars', travel_time_days=2)
+        self.users = [User.objects.create(username=f'stress-{n}') for n in range(10)]
+        self.flight = make_flight(earth, mars, 'HOT-1', pods=0, seats_total=40, seats_available=40)
+
+    def test_seat_only_bookings_stop_at_capacity(self):
+        stats = run_contention(self.flight, self.users, attempts=80, threads=8)
+        self.assertEqual(stats['booked'], 40)
+        self.assertEqual(stats['conflicts'], 40)
+        self.assertEqual(check_inventory(self.flight), [])
+        self.assertGreater(stats['bookings_per_second'], 0)
+
+    def test_pods_are_never_double_booked(self):
+        Pod.objects.bulk_create([
+            Pod(flight=self.flight, pod_number=str(n), price_credits=Decimal('10.00')) for n in range(15)
+        ])
+        pod_ids = list(self.flight.pods.values_list('id', flat=True))
+        stats = run_contention(self.flight, self.users, attempts=60, threads=8, pod_ids=pod_ids)
+        self.assertLessEqual(stats['booked'], 15)
+        self.assertEqual(check_inventory(self.flight), [])
+
+
+class PodHoldTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.user = User.objects.create_user('holder', password='pw-holder-1')
+
+    def setUp(self):
+        super().setUp()
+        self.flight = make_flight(self.earth, self.mars, 'HOLD-1', pods=3, seats_available=10)
+        self.pods = list(self.flight.pods.all())
+
+    def test_pending_booking_gets_a_hold(self):
+        booking = reserve_booking(self.user, self.flight.pk, self.pods[0].pk)
+        self.assertEqual(booking.hold.pod_id, self.pods[0].pk)
+        self.assertGreater(booking.hold.expires_at, timezone.now())
+
+    def test_confirm_and_cancel_drop_the_hold(self):
+        confirmed = reserve_booking(self.user, self.flight.pk, self.pods[0].pk)
+        cancelled = reserve_booking(self.user, self.flight.pk, self.pods[1].pk)
+        self.assertTrue(confirm_booking(confirmed))
+        self.assertTrue(release_booking(cancelled))
+        self.assertFalse(PodHold.objects.exists())
+
+    def test_expired_hold_cannot_be_confirmed(self):
+        self.client.force_authenticate(self.user)
+        booking = reserve_booking(self.user, self.flight.pk, self.pods[0].pk)
+        with override_settings(BOOKING_HOLD_TTL_SECONDS=0):
+            late = reserve_booking(self.user, self.flight.pk, self.pods[1].pk)
+        response = self.client.post(f'/api/v1/bookings/{late.pk}/confirm/')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('expired', response.data['detail'])
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'pending')
+        self.assertTrue(PodHold.objects.filter(booking=late).exists())  # left for the sweep
+        self.assertEqual(self.client.post(f'/api/v1/bookings/{booking.pk}/confirm/').status_code, 200)
+
+    def test_deleting_the_pod_keeps_the_hold(self):
+        booking = reserve_booking(self.user, self.flight.pk, self.pods[0].pk)
+        self.pods[0].delete()
+        self.assertIsNone(PodHold.objects.get(booking=booking).pod_id)
+        self.assertEqual(expire_holds(now=timezone.now() + timedelta(days=1)), 1)
+        booking.refresh_from_db()
+        self.flight.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+        self.assertEqual(self.flight.seats_available, 10)
+
+    def test_sweeper_releases_expired_holds_in_batches(self):
+        bookings = [reserve_booking(self.user, self.flight.pk, pod.pk) for pod in self.pods]
+        bookings.append(reserve_booking(self.user, self.flight.pk))
+        PodHold.objects.filter(booking__in=bookings[:3]).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with self.assertNumQueries(7):
+            self.assertEqual(expire_holds(batch_size=2), 2)
+        self.assertEqual(expire_holds(batch_size=2), 1)
+        self.assertEqual(expire_holds(batch_size=2), 0)
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 9)
+        self.assertEqual(Pod.objects.filter(flight=self.flight, is_available=True).count(), 3)
+        self.assertEqual(
+            list(Booking.objects.order_by('pk').values_list('status', flat=True)),
+            ['cancelled', 'cancelled', 'cancelled', 'pending'],
+        )
+        self.assertEqual(PodHold.objects.count(), 1)
+
+    def test_command_sweeps_until_empty(self):
+        for pod in self.pods:
+            reserve_booking(self.user, self.flight.pk, pod.pk)
+        PodHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('expire_holds', batch_size=1, stdout=out)
+        self.assertIn('Expired 3', out.getvalue())
+        self.assertFalse(PodHold.objects.exists())
+
+
+class GroupBookingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.user = User.objects.create_user('family', password='pw-family-1')
+
+    def setUp(self):
+        super().setUp()
+        self.flight = make_flight(self.earth, self.mars, 'GRP-1', price='100.00', pods=40, seats_available=45)
+        self.pod_ids = list(self.flight.pods.values_list('id', flat=True))
+        self.client.force_authenticate(self.user)
+
+    def book(self, pod_ids):
+        return self.client.post('/api/v1/bookings/group/', {'flight_id': self.flight.pk, 'pod_ids': pod_ids},
+                                format='json')
+
+    def test_books_every_pod_with_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.book(self.pod_ids[:2]).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            response = self.book(self.pod_ids[2:])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.data['bookings']), 38)
+        self.assertEqual(response.data['total_price'], '22800.00')
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 5)
+        self.assertEqual(PodHold.objects.count(), 40)
+
+    def test_one_taken_pod_fails_the_whole_group(self):
+        reserve_booking(self.user, self.flight.pk, self.pod_ids[3])
+        response = self.book(self.pod_ids[:5])
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(str(self.pod_ids[3]), str(response.data['detail']))
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(Pod.objects.filter(flight=self.flight, is_available=False).count(), 1)
+
+    def test_not_enough_seats_fails_the_whole_group(self):
+        Flight.objects.filter(pk=self.flight.pk).update(seats_available=3)
+        self.assertEqual(self.book(self.pod_ids[:4]).status_code, 409)
+        self.assertFalse(Pod.objects.filter(is_available=False).exists())
+
+    def test_validates_group_size_and_duplicates(self):
+        self.assertEqual(self.book([]).status_code, 400)
+        self.assertEqual(self.book(self.pod_ids + [self.pod_ids[0]]).status_code, 400)
+        self.assertEqual(self.book([self.pod_ids[0], self.pod_ids[0]]).status_code, 400)
+
+
+class SeatmapTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.user = User.objects.create_user('seatmap', password='pw-seatmap-1')
+
+    def setUp(self):
+        super().setUp()
+        self.flight = make_flight(self.earth, self.mars, 'MAP-1', pods=0)
+        for n in range(1, 11):
+            Pod.objects.create(flight=self.flight, pod_number=str(n), pod_type='luxury' if n > 6 else 'standard',
+                               price_credits=Decimal('10.00'), is_available=n not in (3, 4))
+        self.ids = list(self.flight.pods.order_by('id').values_list('id', flat=True))
+        self.url = f'/api/v1/flights/{self.flight.pk}/seatmap/'
+
+    def test_encodes_availability_per_type(self):
+        data = self.client.get(self.url).data
+        self.assertEqual(data['pod_types']['standard'], {
+            'total': 6, 'available': 4,
+            'ids': f'{self.ids[0]}-{self.ids[5]}', 'numbers': '1-6', 'availability': 'A2U2A2',
+        })
+        self.assertEqual(data['pod_types']['luxury']['availability'], 'A4')
+
+    def test_cached_until_inventory_changes(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_booking(self.user, self.flight.pk, self.ids[0])
+        data = self.client.get(self.url).data
+        self.assertEqual(data['pod_types']['standard']['availability'], 'U1A1U2A2')
+
+    def test_pod_save_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Pod.objects.get(pk=self.ids[2]).delete()
+        self.assertEqual(self.client.get(self.url).data['pod_types']['standard']['total'], 5)
+
+    def test_unknown_flight_is_404(self):
+        self.assertEqual(self.client.get('/api/v1/flights/999999/seatmap/').status_code, 404)
+
+    @override_settings(SEATMAP_CACHE='default')
+    def test_uses_the_configured_cache(self):
+        cache.clear()
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(f'seatmap:{self.flight.pk}'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Pod.objects.filter(pk=self.ids[0]).first().save()
+        self.assertIsNone(cache.get(f'seatmap:{self.flight.pk}'))
+
+    def test_compress_ranges(self):
+        self.assertEqual(compress_ranges(['1', '2', '3', '7', 'B1', '9', '10']), '1-3,7,B1,9-10')
+        self.assertEqual(compress_ranges(['01', '02', '03', '4', '5']), '01,02,03,4-5')
+        self.assertEqual(compress_ranges(['0', '1', '00']), '0-1,00')
+
+
+class PodFilterTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        earth = make_planet('Earth')
+        mars = make_planet('Mars', travel_time_days=2)
+        cls.flight = make_flight(earth, mars, 'POD-1', pods=6)
+        cls.other = make_flight(earth, mars, 'POD-2', pods=6)
+        Pod.objects.filter(flight=cls.flight, pod_number='2').update(is_available=False)
+        Pod.objects.filter(flight=cls.flight, pod_number='5').update(price_credits=Decimal('900.00'))
+
+    def pods(self, **params):
+        response = self.client.get('/api/v1/pods/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(row['flight'], row['pod_number']) for row in response.data['results']]
+
+    def test_filters_by_flight_type_and_availability(self):
+        self.assertEqual(len(self.pods(flight=self.flight.pk)), 6)
+        # Pods 2 and 5 are luxury (see make_flight); pod 2 is taken.
+        self.assertEqual(self.pods(flight=self.flight.pk, pod_type='luxury', is_available='true'),
+                         [(self.flight.pk, '5')])
+        self.assertEqual(self.pods(flight=self.flight.pk, is_available='false'), [(self.flight.pk, '2')])
+
+    def test_filters_by_price_range(self):
+        self.assertEqual(self.pods(min_price='600'), [(self.flight.pk, '5')])
+        self.assertEqual(len(self.pods(max_price='500')), 11)
+
+    def test_rejects_bad_filters(self):
+        self.assertEqual(self.client.get('/api/v1/pods/', {'pod_type': 'economy'}).status_code, 400)
+
+
+class BookingListQueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.user = User.objects.create_user('lister', password='pw-lister-1')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def make_bookings(self, count):
+        for i in range(count):
+            flight = make_flight(self.earth, self.mars, f'BL-{Flight.objects.count()}', pods=8)
+            reserve_booking(self.user, flight.pk, flight.pods.first().pk)
+
+    def test_list_is_one_query_and_omits_other_pods(self):
+        self.make_bookings(2)
+        with self.assertNumQueries(1):
+            self.client.get('/api/v1/bookings/')
+        self.make_bookings(8)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/bookings/')
+        row = response.data['results'][0]
+        self.assertNotIn('pods', row['flight'])
+        self.assertEqual(set(row['flight']['origin_planet']), {'id', 'name', 'slug', 'emoji'})
+        self.assertIsNotNone(row['pod'])
+
+    def test_full_view_and_detail_stay_within_budget(self):
+        self.make_bookings(5)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/bookings/', {'view': 'full'})
+        self.assertEqual(len(response.data['results'][0]['flight']['pods']), 8)
+        booking = Booking.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/v1/bookings/{booking.pk}/')
+        self.assertEqual(response.data['user']['username'], 'lister')
+
+
+class SparseFieldsetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        for i in range(4):
+            make_flight(cls.earth, cls.mars, f'SF-{i}', pods=3)
+
+    def test_fields_whitelist_reaches_into_nested_serializers(self):
+        response = self.client.get('/api/v1/flights/', {'fields': 'id,price_credits,origin_planet.slug'})
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'price_credits', 'origin_planet'})
+        self.assertEqual(row['origin_planet'], {'slug': 'earth'})
+
+    def test_collapsed_relations_render_as_primary_keys(self):
+        response = self.client.get('/api/v1/flights/', {'expand': ''})
+        row = response.data['results'][0]
+        self.assertEqual(row['origin_planet'], self.earth.pk)
+        self.assertEqual(len(row['pods']), 3)
+        self.assertIsInstance(row['pods'][0], int)
+
+    def test_expand_opt_in_relation(self):
+        pod = Pod.objects.first()
+        response = self.client.get(f'/api/v1/pods/{pod.pk}/')
+        self.assertEqual(response.data['flight'], pod.flight_id)
+        response = self.client.get(f'/api/v1/pods/{pod.pk}/', {'expand': 'flight.origin_planet'})
+        self.assertEqual(response.data['flight']['origin_planet']['slug'], 'earth')
+
+    def test_narrow_shape_runs_a_narrow_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/v1/flights/', {'fields': 'id,flight_number', 'expand': ''})
+        self.assertEqual(len(ctx.captured_queries), 2)
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('flight_planet', sql)
+        self.assertNotIn('price_credits', sql)
+        # The keyset cursor column is still loaded.
+        self.assertIn('departure_datetime', sql)
+
+    def test_write_requests_ignore_the_query_string(self):
+        response = self.client.post('/api/v1/pods/?fields=id', {
+            'flight': Flight.objects.first().pk, 'pod_number': 'X1', 'price_credits': '10.00',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('pod_number', response.data)
+
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.flight = make_flight(cls.earth, cls.mars, 'CG-1', pods=2)
+        cls.user = User.objects.create_user('conditional', password='pw-conditional-1')
+
+    def test_list_revalidates_to_304(self):
+        response = self.client.get('/api/v1/planets/')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+        caches[CACHE_ALIAS].clear()
+        response = self.client.get('/api/v1/planets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_etag_follows_edits_additions_and_query(self):
+        etag = self.client.get('/api/v1/planets/')['ETag']
+        self.assertNotEqual(self.client.get('/api/v1/planets/', {'fields': 'id'})['ETag'], etag)
+        make_planet('Venus')
+        self.assertEqual(self.client.get('/api/v1/planets/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get('/api/v1/planets/')['ETag']
+        Planet.objects.get(slug='venus').delete()
+        self.assertEqual(self.client.get('/api/v1/planets/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_follows_rows_replaced_in_a_full_page(self):
+        make_planet('Venus')
+        make_planet('Jupiter')
+        Planet.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        url = '/api/v1/planets/?page_size=2'
+        etag = self.client.get(url)['ETag']
+        second = self.client.get(url).data['results'][1]['id']
+        Planet.objects.filter(pk=second).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_planet_edits_change_flight_etags(self):
+        stamp = timezone.now() - timedelta(days=1)
+        Planet.objects.update(updated_at=stamp)
+        Flight.objects.update(updated_at=stamp)
+        urls = [
+            '/api/v1/flights/', f'/api/v1/flights/{self.flight.pk}/',
+            '/api/v1/async/flights/', f'/api/v1/async/flights/{self.flight.pk}/',
+            f'/api/v1/flights/{self.flight.pk}/?fields=id,destination_planet.name',
+        ]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        mars = Planet.objects.get(pk=self.mars.pk)
+        mars.name = 'Red Planet'
+        mars.save()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+
+    def test_detail_if_modified_since(self):
+        response = self.client.get(f'/api/v1/flights/{self.flight.pk}/')
+        response = self.client.get(
+            f'/api/v1/flights/{self.flight.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_booking_changes_flight_etag(self):
+        url = f'/api/v1/flights/{self.flight.pk}/'
+        etag = self.client.get(url)['ETag']
+        reserve_booking(self.user, self.flight.pk, self.flight.pods.first().pk)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_user_edits_change_profile_etags(self):
+        self.client.force_authenticate(self.user)
+        profile = Profile.objects.get(user=self.user)
+        urls = ['/api/v1/profiles/', f'/api/v1/profiles/{profile.pk}/']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Profile.objects.filter(pk=profile.pk).update(bio='Saved elsewhere')
+        self.user.email = 'conditional@example.com'
+        self.user.save()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+        self.assertEqual(Profile.objects.get(pk=profile.pk).bio, 'Saved elsewhere')
+
+    def test_profiles_send_validators(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/profiles/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/profiles/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class ResponseCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.flight = make_flight(cls.earth, cls.mars, 'RC-1', pods=2)
+        cls.user = User.objects.create_user('cacher', password='pw-cacher-1')
+
+    def test_hits_run_no_queries(self):
+        first = self.client.get('/api/v1/planets/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/v1/planets/')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/planets/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_params_are_normalized(self):
+        self.client.get('/api/v1/flights/', {'origin': 'earth', 'destination': 'mars'})
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/flights/?destination=mars&origin=earth')
+        with self.assertNumQueries(3):
+            self.client.get('/api/v1/flights/', {'origin': 'earth'})
+
+    def test_signals_bump_the_generation(self):
+        self.client.get('/api/v1/planets/')
+        make_planet('Venus')
+        response = self.client.get('/api/v1/planets/')
+        self.assertIn('venus', [row['slug'] for row in response.data['results']])
+
+        self.client.get('/api/v1/flights/')
+        pod = self.flight.pods.first()
+        pod.price_credits = Decimal('1.00')
+        pod.save()
+        response = self.client.get('/api/v1/flights/')
+        prices = [p['price_credits'] for p in response.data['results'][0]['pods']]
+        self.assertIn('1.00', prices)
+
+    def test_inventory_updates_bump_flights(self):
+        self.client.get('/api/v1/flights/')
+        reserve_booking(self.user, self.flight.pk)
+        response = self.client.get('/api/v1/flights/')
+        self.assertEqual(response.data['results'][0]['seats_available'], self.flight.seats_available - 1)
+
+
+class SingleFlightTests(TransactionTestCase):
+    """Concurrent misses on one cache key are computed once."""
+
+    THREADS = 8
+
+    def setUp(self):
+        super().setUp()
+        caches[CACHE_ALIAS].clear()
+        earth = make_planet('Earth')
+        mars = make_planet('Mars', travel_time_days=2)
+        for i in range(3):
+            make_flight(earth, mars, f'SFL-{i}', pods=2)
+
+    def run_together(self, target):
+        barrier = threading.Barrier(self.THREADS)
+        results = [None] * self.THREADS
+
+        def worker(index):
+            try:
+                barrier.wait()
+                results[index] = target()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_run_one_query_set(self):
+        queries = []
+        lock = threading.Lock()
+
+        def slow_and_counted(execute, sql, params, many, context):
+            with lock:
+                queries.append(sql)
+            time.sleep(0.05)  # keep the leader busy while the others arrive
+            return execute(sql, params, many, context)
+
+        def get_flights():
+            with connection.execute_wrapper(slow_and_counted):
+                return APIClient().get('/api/v1/flights/', {'origin': 'earth'})
+
+        responses = self.run_together(get_flights)
+        self.assertEqual([response.status_code for response in responses], [200] * self.THREADS)
+        self.assertEqual(len({str(response.data) for response in responses}), 1)
+        # One validator query, one page query, one pod prefetch -- in total.
+        self.assertEqual(len(queries), 3)
+
+    def test_waiters_get_stale_value_during_refresh(self):
+        cache = caches[CACHE_ALIAS]
+        cache.set('sf:test', {'value': 'old', 'fresh': False})
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'value': 'new', 'fresh': True}
+
+        def is_fresh(entry):
+            return entry['fresh']
+
+        leader = threading.Thread(target=singleflight.fetch, args=(cache, 'sf:test', compute, is_fresh))
+        leader.start()
+        started.wait(5)
+        self.assertEqual(singleflight.fetch(cache, 'sf:test', compute, is_fresh)['value'], 'old')
+        release.set()
+        leader.join()
+        self.assertEqual(singleflight.fetch(cache, 'sf:test', compute, is_fresh)['value'], 'new')
+        self.assertEqual(len(calls), 1)
+
+    def test_uncacheable_results_are_not_shared(self):
+        responses = self.run_together(lambda: APIClient().get('/api/v1/flights/', {'sort': 'nope'}))
+        self.assertEqual([response.status_code for response in responses], [400] * self.THREADS)
+
+
+class ExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.staff = User.objects.create_user('ops', password='pw-ops-1', is_staff=True)
+        for i in range(5):
+            flight = make_flight(cls.earth, cls.mars, f'EX-{i}', pods=1)
+            reserve_booking(cls.staff, flight.pk, flight.pods.first().pk)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.staff)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_flights_stream_as_ndjson_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/flights/export/')
+            body = self.read(response)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['flight_number'] for row in rows], [f'EX-{i}' for i in range(5)])
+        self.assertEqual(rows[0]['origin'], 'earth')
+
+    def test_bookings_stream_as_csv(self):
+        body = self.read(self.client.get('/api/v1/bookings/export/', {'output': 'csv'}))
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['username'], 'ops')
+        self.assertEqual(rows[0]['status'], 'pending')
+
+    async def test_streams_asynchronously_under_asgi(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.staff).access_token))()
+        response = await self.async_client.get('/api/v1/flights/export/', headers={'Authorization': f'Bearer {token}'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertEqual(len(body.splitlines()), 5)
+
+    def test_staff_only_and_validated(self):
+        self.assertEqual(self.client.get('/api/v1/flights/export/', {'output': 'xml'}).status_code, 400)
+        self.client.force_authenticate(User.objects.create_user('analyst', password='pw-analyst-1'))
+        self.assertEqual(self.client.get('/api/v1/bookings/export/').status_code, 403)
+
+    def test_command_writes_the_same_rows(self):
+        out = StringIO()
+        call_command('export_data', 'flights', '--format', 'csv', '--chunk-size', '2', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'flight_number'])
+        self.assertEqual(len(lines), 6)
+
+
+class FlightScheduleImportTests(APITestCase):
+
+    ROWS = [
+        ['Flight ID', 'Flight Number', 'Departure Date', 'Departure Time', 'Price',
+         'Destination Base ID', 'Arrival Base ID', 'Arrival Date', 'Arrival Time'],
+        ['10', 'FL010', '2032-07-02', '10:01:00', '3499.93', '1', '2', '2032-07-02', '12:31:00'],
+        ['11', 'FL011', '16/05/2032', '10:30:00', '1800', '2', '1', '16/05/2032', '14:45:00'],
+        ['12', 'FL012', '2032-07-04', '10:03:00', '1200.00', '99', '1', '2032-07-04', '12:33:00'],
+        ['13', 'FL013', '2032-07-05', '10:04:00', 'cheap', '1', '2', '2032-07-05', '12:34:00'],
+        ['14', 'FL014', '2032-07-06', '10:05:00', '999.99', '1', '2', '2032-07-06', '12:35:00'],
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        planet = make_planet('Mars')
+        for pk in (1, 2):
+            PlanetBase.objects.create(id=pk, name=f'Base {pk}', description='', planet=planet)
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'schedules.csv')
+        self.write(self.ROWS)
+
+    def write(self, rows):
+        with open(self.path, 'w', newline='') as handle:
+            csv.writer(handle).writerows(rows)
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_flight_schedules', self.path, '--batch-size', '2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_valid_rows_and_reports_invalid_ones(self):
+        out, err = self.run_import()
+        self.assertEqual(sorted(FlightSchedule.objects.values_list('id', flat=True)), [10, 11, 14])
+        self.assertIn('upserted 3 rows, skipped 2 invalid', out)
+        self.assertIn('rows/s', out)
+        self.assertIn('line 4: unknown base 99', err)
+        self.assertEqual(FlightSchedule.objects.get(pk=11).departure_date.isoformat(), '2032-05-16')
+        self.assertFalse(os.path.exists(self.path + '.progress'))
+
+    def test_rejects_non_finite_prices(self):
+        for price in ('NaN', 'sNaN', '-Infinity'):
+            self.assertRaisesRegex(ValueError, 'invalid price', parse_row, [
+                '15', 'FL015', '2032-07-07', '10:06:00', price, '1', '2', '2032-07-07', '12:36:00',
+            ], {1, 2})
+        rows = [list(row) for row in self.ROWS]
+        rows[1][4] = 'NaN'
+        self.write(rows)
+        out, err = self.run_import()
+        self.assertIn('skipped 3 invalid', out)
+        self.assertIn("line 2: invalid price 'NaN'", err)
+
+    def test_rerun_is_idempotent_and_updates(self):
+        self.run_import()
+        rows = [list(row) for row in self.ROWS]
+        rows[1][4] = '100.00'
+        self.write(rows)
+        self.run_import()
+        self.assertEqual(FlightSchedule.objects.count(), 3)
+        self.assertEqual(FlightSchedule.objects.get(pk=10).price, Decimal('100.00'))
+
+    def test_resumes_after_checkpoint(self):
+        self.run_import()
+        FlightSchedule.objects.all().delete()
+        # Pretend a previous run committed everything up to line 3.
+        Checkpoint(self.path + '.progress', self.path).save(3)
+        out, _ = self.run_import()
+        self.assertIn('Resuming', out)
+        self.assertEqual(list(FlightSchedule.objects.values_list('id', flat=True)), [14])
+        self.run_import('--restart')
+        self.assertEqual(FlightSchedule.objects.count(), 3)
+
+
+class SeedDbTests(APITestCase):
+
+    def seed(self, *args):
+        out = StringIO()
+        call_command('seed_db', '--start', '2031-01-01', '--batch-size', '4', *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        return list(Flight.objects.order_by('flight_number').values_list(
+            'flight_number', 'origin_planet__slug', 'destination_planet__slug', 'departure_datetime',
+            'price_credits', 'seats_available', 'status',
+        ))
+
+    def test_seeding_is_deterministic_and_idempotent(self):
+        out = self.seed('--scale', '0.01', '--seed', '7')
+        self.assertIn('10 flights', out)
+        first = self.snapshot()
+        pods = Pod.objects.count()
+        self.assertGreaterEqual(pods, 10 * 9)
+        self.assertTrue(FareCalendarDay.objects.exists())
+
+        self.seed('--scale', '0.01', '--seed', '7')
+        self.assertEqual(Flight.objects.count(), 10)
+
+        Flight.objects.all().delete()
+        self.seed('--scale', '0.01', '--seed', '7')
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(Pod.objects.count(), pods)
+
+    def test_default_start_is_fixed(self):
+        call_command('seed_db', '--scale', '0.005', stdout=StringIO())
+        first = self.snapshot()
+        self.assertGreaterEqual(min(row[3] for row in first).date(), DEFAULT_START)
+        Flight.objects.all().delete()
+        call_command('seed_db', '--scale', '0.005', stdout=StringIO())
+        self.assertEqual(self.snapshot(), first)
+
+    def test_seed_changes_data_and_sqlite_uses_one_worker(self):
+        self.seed('--scale', '0.005', '--seed', '1')
+        out = self.seed('--scale', '0.005', '--seed', '2', '--workers', '4')
+        self.assertIn('single worker', out)
+        self.assertEqual(Flight.objects.count(), 10)
+
+
+class BenchApiTests(APITestCase):
+
+    def bench(self, *args):
+        out = StringIO()
+        call_command('bench_api', '--scale', '0.01', '--iterations', '3', '--warmup', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_every_endpoint_and_cleans_up(self):
+        call_command('seed_db', '--scale', '0.01', stdout=StringIO())
+        seats = sum(Flight.objects.values_list('seats_available', flat=True))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            out = self.bench('--scale', '0', '--save-baseline', path)
+            with open(path) as handle:
+                endpoints = json.load(handle)['endpoints']
+        for name in ('planet list', 'flight search', 'flight detail', 'booking create', 'booking list'):
+            self.assertIn(name, out)
+            self.assertEqual(endpoints[name]['requests'], 3)
+            self.assertEqual(endpoints[name]['errors'], 0)
+            self.assertGreater(endpoints[name]['queries_per_request'], 0)
+        self.assertFalse(Booking.objects.filter(user__username='bench-api').exists())
+        self.assertEqual(sum(Flight.objects.values_list('seats_available', flat=True)), seats)
+
+    def test_needs_at_least_one_iteration(self):
+        with self.assertRaisesMessage(CommandError, '--iterations must be at least 1.'):
+            self.bench('--scale', '0', '--iterations', '0')
+
+    def test_baseline_comparison_flags_regressions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            self.bench('--save-baseline', path)
+            self.assertIn('No regressions', self.bench('--scale', '0', '--baseline', path, '--min-delta-ms', '1000'))
+
+            with open(path) as handle:
+                baseline = json.load(handle)
+            baseline['endpoints']['booking list']['queries_per_request'] = 0
+            baseline['endpoints']['flight detail']['p95_ms'] = 0.001
+            with open(path, 'w') as handle:
+                json.dump(baseline, handle)
+            with self.assertRaisesMessage(CommandError, 'booking list: 1.0 SQL/request'):
+                self.bench('--scale', '0', '--baseline', path, '--min-delta-ms', '0')
+
+
+TIMING = {'ENABLED': True, 'HEADER': True, 'SLOW_REQUEST_MS': 10000, 'SLOW_QUERY_MS': 10000, 'DUPLICATE_QUERIES': 5}
+
+
+class RequestTimingTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='timed', password='pw')
+        self.client.force_authenticate(self.user)
+        for name in ('Mars', 'Venus', 'Titan'):
+            make_planet(name)
+
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/v1/planets/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_TIMING=TIMING)
+    def test_server_timing_header(self):
+        response = self.client.get('/api/v1/planets/')
+        self.assertEqual(response.status_code, 200)
+        entries = {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(entries), {'db', 'serialize', 'view', 'render', 'total'})
+        self.assertRegex(entries['db'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries"$')
+        self.assertRegex(entries['serialize'], r'^serialize;dur=[\d.]+$')
+
+    @override_settings(REQUEST_TIMING={**TIMING, 'HEADER': False, 'SLOW_REQUEST_MS': 0, 'SLOW_QUERY_MS': 0})
+    def test_logs_slow_requests_and_queries(self):
+        with self.assertLogs('spacetravel.timing', 'WARNING') as logs:
+            response = self.client.get('/api/v1/planets/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertTrue(any(line.startswith('WARNING:spacetravel.timing:Slow request GET /api/v1/planets/ -> 200')
+                            for line in logs.output))
+        self.assertTrue(any('Slow query during GET /api/v1/planets/' in line for line in logs.output))
+
+    @override_settings(REQUEST_TIMING={**TIMING, 'DUPLICATE_QUERIES': 1})
+    def test_flags_repeated_queries(self):
+        with self.assertLogs('spacetravel.timing', 'WARNING') as logs:
+            response = self.client.get('/api/v1/planets/')
+        self.assertIn('dup;desc=', response['Server-Timing'])
+        self.assertTrue(any('possible N+1' in line for line in logs.output))
+
+    @override_settings(REQUEST_TIMING=TIMING)
+    async def test_server_timing_under_asgi(self):
+        response = await self.async_client.get('/api/v1/async/flights/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=')
+
+    def test_duplicate_detection_ignores_parameters(self):
+        timings = RequestTimings(slow_query_ms=10000)
+        with connection.execute_wrapper(timings.execute_wrapper):
+            for planet in Planet.objects.all():
+                Planet.objects.get(pk=planet.pk)
+            list(Planet.objects.filter(pk__in=[1, 2]))
+            list(Planet.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual(timings.queries, 6)
+        self.assertEqual(sorted(count for _, count, _ in timings.duplicates(2)), [2, 3])
+        self.assertEqual(timings.duplicates(4), [])
+
+
+class RequestProfilingTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.settings_override = override_settings(REQUEST_PROFILING={
+            'ENABLED': True, 'DIRECTORY': tmp.name, 'MAX_PROFILES': 3, 'DEFAULT_MODE': 'sample',
+            'SAMPLE_INTERVAL_MS': 0.5, 'SAMPLE_RATES': {'planet-list': 1.0},
+        })
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.directory = tmp.name
+        self.staff = User.objects.create_user(username='ops', password='pw', is_staff=True)
+        self.user = User.objects.create_user(username='traveller', password='pw')
+        make_planet('Mars')
+
+    def stored(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def test_staff_request_is_profiled_and_downloadable(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/api/v1/flights/', HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(response['X-Profile-Url'], f'/api/v1/request-profiles/{profile_id}/download/')
+
+        meta = self.client.get(f'/api/v1/request-profiles/{profile_id}/').json()
+        self.assertEqual((meta['endpoint'], meta['mode'], meta['user'], meta['requested']),
+                         ('flight-list', 'cprofile', 'ops', True))
+        self.assertTrue(any('viewsets.py' in line for line in meta['top']))
+
+        download = self.client.get(response['X-Profile-Url'])
+        self.assertEqual(download.status_code, 200)
+        path = os.path.join(self.directory, 'downloaded.pstats')
+        with open(path, 'wb') as handle:
+            handle.write(b''.join(download.streaming_content))
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn('list', functions)
+
+    def test_query_flag_takes_collapsed_stack_samples(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/api/v1/flights/?profile=1')
+        meta = self.client.get(f"/api/v1/request-profiles/{response['X-Profile-Id']}/").json()
+        self.assertEqual(meta['mode'], 'sample')
+        with open(os.path.join(self.directory, meta['file'])) as handle:
+            lines = handle.read().splitlines()
+        self.assertEqual(len(lines), meta['stacks'])
+        for line in lines:
+            self.assertRegex(line, r'^\S+ \d+$')
+
+    def test_non_staff_cannot_trigger_or_download(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/flights/', HTTP_X_PROFILE='cprofile')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.stored(), [])
+        self.assertEqual(self.client.get('/api/v1/request-profiles/').status_code, 403)
+
+    def test_sample_rates_profile_live_traffic_in_the_background(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/planets/')
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.get('/api/v1/flights/')
+        self.assertEqual(len(self.stored()), 1)
+
+        self.client.force_authenticate(self.staff)
+        profiles = self.client.get('/api/v1/request-profiles/').json()['results']
+        self.assertEqual([(p['endpoint'], p['requested'], p['user']) for p in profiles],
+                         [('planet-list', False, 'traveller')])
+
+    def test_old_profiles_are_pruned(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(5):
+            self.client.get('/api/v1/planets/')
+        self.assertEqual(len(self.stored()), 3)
+        self.assertEqual(len(os.listdir(self.directory)), 6)
+
+    def test_account_views_are_profiled(self):
+        request = APIRequestFactory().get('/api/v1/accounts/me/', HTTP_X_PROFILE='sample')
+        force_authenticate(request, user=self.staff)
+        response = MeView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Profile-Id', response)
+
+    @override_settings(REQUEST_PROFILING={'ENABLED': False})
+    def test_disabled(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/api/v1/planets/', HTTP_X_PROFILE='cprofile')
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class AsyncReadViewTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.earth = make_planet('Earth')
+        cls.mars = make_planet('Mars', travel_time_days=2)
+        cls.flights = [
+            make_flight(cls.earth, cls.mars, f'AS-{n}', departure=timezone.now() + timedelta(days=n), price=f'{n}00.00')
+            for n in range(1, 4)
+        ]
+
+    def assertSameBody(self, path, query=''):
+        sync = self.client.get(f'/api/v1/{path}{query}')
+        asynchronous = self.client.get(f'/api/v1/async/{path}{query}')
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        self.assertEqual(asynchronous['Content-Type'], 'application/json')
+        body = json.loads(asynchronous.content)
+        expected = json.loads(sync.content)
+        for page in (body, expected):
+            if isinstance(page, dict) and 'results' in page:
+                page['next'] = page['next'] and page['next'].replace('/async/', '/')
+                page['previous'] = page['previous'] and page['previous'].replace('/async/', '/')
+        self.assertEqual(body, expected)
+        return asynchronous
+
+    def test_responses_match_the_viewsets(self):
+        self.assertSameBody('planets/')
+        self.assertSameBody('flights/')
+        self.assertSameBody('flights/', '?origin=earth&destination=mars&sort=price&page_size=2')
+        self.assertSameBody('flights/', '?fields=id,price_credits,origin_planet.slug&expand=origin_planet')
+        self.assertSameBody(f'flights/{self.flights[0].pk}/')
+        self.assertSameBody(f'flights/{self.flights[0].pk}/', '?fields=id,pods.pod_number')
+
+    def test_errors_match_the_viewsets(self):
+        self.assertEqual(self.assertSameBody('flights/', '?sort=altitude').status_code, 400)
+        self.assertEqual(self.assertSameBody('flights/999999/').status_code, 404)
+        self.assertEqual(self.assertSameBody('flights/', '?cursor=bogus').status_code, 404)
+
+    def test_cursor_pagination(self):
+        seen = []
+        url = '/api/v1/async/flights/?sort=price&page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            seen += [flight['flight_number'] for flight in page['results']]
+            url = page['next']
+        self.assertEqual(seen, ['AS-1', 'AS-2', 'AS-3'])
+
+    def test_conditional_get(self):
+        for path in ('planets/', f'flights/{self.flights[0].pk}/'):
+            response = self.client.get(f'/api/v1/async/{path}')
+            again = self.client.get(f'/api/v1/async/{path}', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_lists_use_the_response_cache(self):
+        first = self.client.get('/api/v1/async/planets/').json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/async/planets/').json(), first)
+        make_planet('Venus')
+        self.assertEqual(len(self.client.get('/api/v1/async/planets/').json()['results']), 3)
+
+    def test_other_methods_go_to_the_fallback(self):
+        factory = APIRequestFactory()
+        view = FlightListView.as_view(fallback=FlightViewSet.as_view({'get': 'list', 'post': 'create'}))
+        response = async_to_sync(view)(factory.post('/api/v1/flights/', {}, format='json'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('flight_number', response.data)
+        self.assertEqual(async_to_sync(FlightListView.as_view())(factory.post('/api/v1/flights/')).status_code, 405)
+
+    async def test_concurrent_misses_build_once(self):
+        builds = []
+        build_entry = PlanetListView.build_entry
+
+        async def counted(view, *args):
+            builds.append(view)
+            return await build_entry(view, *args)
+
+        PlanetListView.build_entry = counted
+        self.addCleanup(setattr, PlanetListView, 'build_entry', build_entry)
+        responses = await asyncio.gather(*(self.async_client.get('/api/v1/async/planets/') for _ in range(4)))
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len(builds), 1)
+
+    async def test_served_natively_under_asgi(self):
+        response = await self.async_client.get('/api/v1/async/flights/', {'origin': 'earth', 'sort': 'price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([flight['flight_number'] for flight in response.json()['results']], ['AS-1', 'AS-2', 'AS-3'])
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 0.0
+        self.opened = []
+
+    def connect(self):
+        self.opened.append(FakeConnection(len(self.opened)))
+        return self.opened[-1]
+
+    def make_pool(self, **kwargs):
+        options = {'size': 2, 'max_overflow': 1, 'timeout': 0.05, 'idle_timeout': 60,
+                   'health_check': lambda conn: conn.healthy, 'health_check_after': 5}
+        return ConnectionPool(self.connect, clock=lambda: self.now, **{**options, **kwargs})
+
+    def test_reuses_returned_connections(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool = self.make_pool()
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        self.assertEqual([conn.closed for conn in conns], [False, False, True])
+        self.assertEqual(pool.stats['opened'], 3)
+
+    def test_waits_then_times_out_when_exhausted(self):
+        pool = ConnectionPool(self.connect, size=1, max_overflow=0, timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        threading.Timer(0.01, pool.release, args=[held]).start()
+        pool.timeout = 5
+        self.assertIs(pool.acquire(), held)
+
+    def test_idle_connections_expire(self):
+        pool = self.make_pool()
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        self.now = 30
+        pool.release(second)
+        self.now = 70
+        self.assertIs(pool.acquire(), second)
+        self.assertTrue(first.closed)
+
+    def test_health_check_before_reusing_an_idle_connection(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        first.healthy = False
+        self.assertIs(pool.acquire(), first)  # idle too briefly to be checked
+        pool.release(first)
+
+        self.now = 10
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.stats['failed_checks'], 1)
+
+    def test_unusable_connections_are_not_reused(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first, reusable=False)
+        self.assertTrue(first.closed)
+        self.assertIsNot(pool.acquire(), first)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(self._refuse, size=1, max_overflow=0, timeout=0.05)
+        for _ in range(2):
+            with self.assertRaises(ConnectionRefusedError):
+                pool.acquire()
+
+    def _refuse(self):
+        raise ConnectionRefusedError
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the replica stand-in is a second SQLite file')
+@override_settings(READ_REPLICAS={
+    'ALIASES': ['replica'], 'MAX_LAG_SECONDS': 5, 'LAG_CHECK_SECONDS': 60, 'CACHE': CACHE_ALIAS,
+})
+class ReadReplicaTests(TransactionTestCase):
+    """A second SQLite database stands in for a replica that has not caught up."""
+
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict, 'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        replicas._lags.clear()
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        caches[CACHE_ALIAS].clear()
+        replicas._lags.clear()
+        self.earth = make_planet('Earth')
+        self.mars = make_planet('Mars', travel_time_days=2)
+        Planet.objects.using('replica').all().delete()
+        Planet.objects.using('replica').create(name='Replica', description='', distance_from_earth_km=0, travel_time_days=1)
+
+    def planet_names(self, path):
+        return [planet['name'] for planet in self.client.get(path).json()['results']]
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertEqual(self.planet_names('/api/v1/planets/'), ['Replica'])
+        self.assertEqual(self.planet_names('/api/v1/async/planets/'), ['Replica'])
+        # Views that did not opt in, and code outside views, use the primary.
+        self.assertEqual(Planet.objects.count(), 2)
+
+    def test_reads_after_a_write_in_the_request_use_the_primary(self):
+        token = replicas.begin(use_replicas=True)
+        try:
+            self.assertEqual(Planet.objects.count(), 1)
+            make_planet('Venus')
+            self.assertEqual(Planet.objects.count(), 3)
+        finally:
+            replicas.end(token)
+
+    def test_user_reads_from_the_primary_after_booking(self):
+        user = User.objects.create_user('replica-reader', password='pw-replica-1')
+        flight = make_flight(self.earth, self.mars, 'REP-1', pods=0, seats_available=2)
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get('/api/v1/bookings/').json()['results'], [])
+
+        response = self.client.post('/api/v1/bookings/', {'flight_id': flight.pk}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(self.client.get('/api/v1/bookings/').json()['results']), 1)
+        self.assertEqual(self.planet_names('/api/v1/planets/'), ['Earth', 'Mars'])
+
+        caches[CACHE_ALIAS].clear()  # the pin and cached pages expire
+        self.assertEqual(self.client.get('/api/v1/bookings/').json()['results'], [])
+
+    def test_pinned_requests_bypass_the_response_cache(self):
+        caches[CACHE_ALIAS].clear()  # nothing bumped recently
+        self.assertEqual(self.planet_names('/api/v1/planets/'), ['Replica'])
+        user = User.objects.create_user('replica-pinned', password='pw-replica-2')
+        replicas.pin_to_primary(user)
+        self.client.force_authenticate(user)
+        self.assertEqual(self.planet_names('/api/v1/planets/'), ['Earth', 'Mars'])
+        self.client.force_authenticate(None)
+        self.assertEqual(self.planet_names('/api/v1/planets/'), ['Replica'])
+
+    def test_replica_pages_are_not_stored_after_a_bump(self):
+        caches[CACHE_ALIAS].clear()
+        make_planet('Venus')
+        for path in ('/api/v1/planets/', '/api/v1/async/planets/'):
+            self.assertEqual(self.planet_names(path), ['Replica'])
+        replicas._lags['replica'] = (time.monotonic(), 30.0)
+        for path in ('/api/v1/planets/', '/api/v1/async/planets/'):
+            self.assertEqual(self.planet_names(path), ['Earth', 'Mars', 'Venus'])
+
+    def test_async_views_keep_pinned_users_on_the_primary(self):
+        user = User.objects.create_user('replica-async', password='pw-replica-3')
+        flight = make_flight(self.earth, self.mars, 'REP-2', pods=0)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        self.assertEqual(self.client.get(f'/api/v1/async/flights/{flight.pk}/').status_code, 404)
+        replicas.pin_to_primary(user)
+        self.assertEqual(self.client.get(f'/api/v1/async/flights/{flight.pk}/').status_code, 200)
+        self.assertEqual(self.planet_names('/api/v1/async/planets/'), ['Earth', 'Mars'])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get('/api/v1/async/planets/').status_code, 401)
+
+    def test_lagging_replica_is_skipped(self):
+        replicas._lags['replica'] = (time.monotonic(), 30.0)
+        self.assertEqual(self.planet_names('/api/v1/planets/'), ['Earth', 'Mars'])
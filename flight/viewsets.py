@@ -1,20 +1,79 @@
+from datetime import datetime, time, timedelta
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny, SAFE_METHODS
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.utils import timezone
 from accounts.models import Profile
-from .models import Planet, Flight, Pod, Booking
+from spacetravel import profiling
+from spacetravel.db.replicas import ReplicaReadMixin
+from spacetravel.profiling import ProfiledViewMixin
+from spacetravel.serializers import DynamicFieldsMixin
+from .models import Planet, Flight, Pod, Booking, FareCalendarDay
 from .serializers import (
     UserSerializer, ProfileSerializer, PlanetSerializer, 
-    FlightSerializer, PodSerializer, BookingSerializer
+    FlightSerializer, PodSerializer, BookingSerializer, FlightSearchSerializer, FareCalendarQuerySerializer,
+    ItinerarySearchSerializer, ItinerarySerializer, GroupBookingSerializer, PodFilterSerializer,
+    BookingListSerializer, ExportQuerySerializer,
 )
+from .conditional import ConditionalGetMixin
+from .response_cache import CachedListMixin
+from .inventory import InventoryConflict, reserve_booking, reserve_group, confirm_booking, release_booking
+from . import export, seatmap as seatmaps
+from .routing import route_index
+
+
+class ShapedQuerysetMixin:
+    """
+    Fetch only the relations and columns the response will render, as
+    narrowed by ``?fields=`` / ``?expand=``. Keyset ordering columns are
+    always loaded so building the cursor never hits a deferred field, and
+    so is the ``ETag`` source column of conditional views (on the rendered
+    ``validator_related`` objects too).
+    """
+
+    def shape_queryset(self, queryset):
+        serializer = self.get_serializer()
+        if not isinstance(serializer, DynamicFieldsMixin):
+            return queryset
+        ordering = getattr(self, 'keyset_ordering', None) or queryset.model._meta.ordering or ()
+        required = [name.lstrip('-') for name in ordering]
+        if getattr(self, 'validator_field', None):
+            required.append(self.validator_field)
+            required.extend(f'{name}__{self.validator_field}' for name in getattr(self, 'validator_related', ()))
+        return serializer.optimize_queryset(
+            queryset,
+            required=required,
+            trim=self.request.method in SAFE_METHODS,
+        )
+
+
+def export_response(request, name):
+    """Stream the ``name`` export in the format chosen by ``?output=``."""
+    params = ExportQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    output_format = params.validated_data['output']
+    chunks = export.astream if isinstance(request._request, ASGIRequest) else export.stream
+    response = StreamingHttpResponse(
+        chunks(name, output_format), content_type=export.CONTENT_TYPES[output_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output_format}"'
+    return response
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ProfiledViewMixin, ShapedQuerysetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        return self.shape_queryset(User.objects.all())
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -22,72 +81,309 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(ProfiledViewMixin, ConditionalGetMixin, ShapedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
+    # The embedded user has no change stamp of its own: saving a user
+    # advances its profile's updated_at instead (accounts.models).
+
+    def get_queryset(self):
+        return self.shape_queryset(Profile.objects.all())
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        profile, created = Profile.objects.get_or_create(user=request.user)
+        try:
+            profile = request.user.profile  # loaded with the user by the authentication
+        except Profile.DoesNotExist:
+            profile, created = Profile.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
 
 
-class PlanetViewSet(viewsets.ReadOnlyModelViewSet):
+class PlanetViewSet(ProfiledViewMixin, ReplicaReadMixin, CachedListMixin, ConditionalGetMixin, ShapedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Planet.objects.all()
     serializer_class = PlanetSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
+    cache_dependencies = (Planet,)
+
+    def get_queryset(self):
+        return self.shape_queryset(Planet.objects.all())
 
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(ProfiledViewMixin, ReplicaReadMixin, CachedListMixin, ConditionalGetMixin, ShapedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
     permission_classes = [AllowAny]  # Can restrict to IsAuthenticated later
-    
+    # Search results embed both planets and the pods.
+    cache_dependencies = (Flight, Pod, Planet)
+    validator_related = ('origin_planet', 'destination_planet')
+
+    # Keyset orderings for ?sort=; each is backed by a composite index on Flight.
+    SORT_ORDERINGS = {
+        'departure': ['departure_datetime'],
+        '-departure': ['-departure_datetime'],
+        'price': ['price_credits', 'departure_datetime'],
+        # Fully descending, so flight_route_price_idx is scanned backwards.
+        '-price': ['-price_credits', '-departure_datetime', '-pk'],
+        'duration': ['duration', 'departure_datetime'],
+        '-duration': ['-duration', 'departure_datetime'],
+    }
+
+    def get_search_params(self):
+        """Validated search filters from the query string (list action only)."""
+        if not hasattr(self, '_search_params'):
+            params = {}
+            if self.action == 'list':
+                serializer = FlightSearchSerializer(data=self.request.query_params)
+                serializer.is_valid(raise_exception=True)
+                params = serializer.validated_data
+            self._search_params = params
+        return self._search_params
+
+    @property
+    def keyset_ordering(self):
+        return self.SORT_ORDERINGS[self.get_search_params().get('sort', '-departure')]
+
     def get_queryset(self):
-        queryset = Flight.objects.all()
-        origin = self.request.query_params.get('origin')
-        destination = self.request.query_params.get('destination')
-        
-        if origin:
-            queryset = queryset.filter(origin_planet__slug=origin)
-        if destination:
-            queryset = queryset.filter(destination_planet__slug=destination)
-        
+        # Joins and prefetches follow the rendered shape, so the nested
+        # serializer runs a fixed number of queries however many flights match.
+        queryset = self.shape_queryset(Flight.objects.all())
+        return self.filter_search(queryset, self.get_search_params())
+
+    @classmethod
+    def filter_search(cls, queryset, params):
+        """Apply validated ``FlightSearchSerializer`` params to a Flight queryset."""
+        if params.get('origin'):
+            queryset = queryset.filter(origin_planet__slug=params['origin'])
+        if params.get('destination'):
+            queryset = queryset.filter(destination_planet__slug=params['destination'])
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        # Date windows become datetime ranges so the departure index stays usable.
+        if params.get('departure_after'):
+            queryset = queryset.filter(departure_datetime__gte=cls._start_of_day(params['departure_after']))
+        if params.get('departure_before'):
+            next_day = params['departure_before'] + timedelta(days=1)
+            queryset = queryset.filter(departure_datetime__lt=cls._start_of_day(next_day))
+        if params.get('max_price') is not None:
+            queryset = queryset.filter(price_credits__lte=params['max_price'])
+        if params.get('min_seats') is not None:
+            queryset = queryset.filter(seats_available__gte=params['min_seats'])
+        if params.get('sort', '').lstrip('-') == 'duration':
+            queryset = queryset.annotate(
+                duration=ExpressionWrapper(
+                    F('arrival_datetime') - F('departure_datetime'), output_field=DurationField()
+                )
+            )
         return queryset
 
+    @action(detail=True, methods=['get'])
+    def seatmap(self, request, pk=None):
+        """Pod availability per type as compact range / run-length strings."""
+        try:
+            flight_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+        data = seatmaps.get(flight_id)
+        if data is None:
+            raise NotFound()
+        return Response(data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Every flight as NDJSON (default) or CSV, streamed. Staff only."""
+        return export_response(request, 'flights')
+
+    @action(detail=False, methods=['get'], url_path='fare-calendar')
+    def fare_calendar(self, request):
+        """Cheapest fare per day for one route, read from ``FareCalendarDay``."""
+        params = FareCalendarQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        start = params.get('start') or timezone.localdate()
+        end = start + timedelta(days=params['days'] - 1)
+
+        cells = {
+            cell['day']: cell
+            for cell in FareCalendarDay.objects.filter(
+                origin_planet__slug=params['origin'],
+                destination_planet__slug=params['destination'],
+                day__range=(start, end),
+            ).values('day', 'min_price', 'flight_count')
+        }
+        days = []
+        for offset in range(params['days']):
+            day = start + timedelta(days=offset)
+            cell = cells.get(day)
+            days.append({
+                'date': day.isoformat(),
+                'min_price': str(cell['min_price']) if cell else None,
+                'flight_count': cell['flight_count'] if cell else 0,
+            })
+        return Response({
+            'origin': params['origin'],
+            'destination': params['destination'],
+            'start': start.isoformat(),
+            'days': days,
+        })
+
+    @staticmethod
+    def _start_of_day(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
 
-class PodViewSet(viewsets.ModelViewSet):
+
+class ItineraryViewSet(ProfiledViewMixin, viewsets.ViewSet):
+    """
+    GET /api/v1/itineraries/?origin=earth&destination=titan — best 1–3 leg
+    connections, served from the in-memory route index.
+    """
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        params = ItinerarySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        route_index.ensure_fresh()
+        origin_id = route_index.planet_id(params['origin'])
+        destination_id = route_index.planet_id(params['destination'])
+        if origin_id is None or destination_id is None:
+            raise NotFound('Unknown planet.')
+
+        min_connection = params.get('min_connection_minutes')
+        itineraries = route_index.search(
+            origin_id,
+            destination_id,
+            earliest=max(FlightViewSet._start_of_day(params['departure_after']), timezone.now()),
+            latest=FlightViewSet._start_of_day(params['departure_before'] + timedelta(days=1)),
+            max_legs=params['max_legs'],
+            min_connection=timedelta(minutes=min_connection) if min_connection is not None else None,
+            sort=params['sort'],
+            limit=params['limit'],
+        )
+        context = {'planet_slugs': {pk: route_index.planet_slug(pk) for path in itineraries
+                                    for leg in path for pk in (leg.origin_id, leg.destination_id)}}
+        return Response({'results': ItinerarySerializer(itineraries, many=True, context=context).data})
+
+
+class PodViewSet(ProfiledViewMixin, ReplicaReadMixin, ShapedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Pod.objects.all()
     serializer_class = PodSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        queryset = self.shape_queryset(Pod.objects.all())
+        if self.action != 'list':
+            return queryset
+        params = PodFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        # flight, is_available and pod_type match the pod_availability_idx prefix.
+        if params.get('flight') is not None:
+            queryset = queryset.filter(flight_id=params['flight'])
+        if params.get('is_available') is not None:
+            queryset = queryset.filter(is_available=params['is_available'])
+        if params.get('pod_type'):
+            queryset = queryset.filter(pod_type=params['pod_type'])
+        if params.get('min_price') is not None:
+            queryset = queryset.filter(price_credits__gte=params['min_price'])
+        if params.get('max_price') is not None:
+            queryset = queryset.filter(price_credits__lte=params['max_price'])
+        return queryset
+
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(ProfiledViewMixin, ReplicaReadMixin, ShapedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     
+    def wants_full_list(self):
+        return self.action == 'list' and self.request.query_params.get('view') == 'full'
+
+    def get_serializer_class(self):
+        # Lists are lean unless ?view=full; everything else gets the nested form.
+        if self.action == 'list' and not self.wants_full_list():
+            return BookingListSerializer
+        return BookingSerializer
+
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user)
+        return self.shape_queryset(Booking.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.instance = reserve_booking(
+            self.request.user,
+            serializer.validated_data['flight_id'],
+            serializer.validated_data.get('pod_id'),
+        )
+
+    def perform_destroy(self, instance):
+        release_booking(instance)
+        instance.delete()
+
+    @action(detail=False, methods=['post'])
+    def group(self, request):
+        """Book 1–40 pods on one flight in a single all-or-nothing request."""
+        serializer = GroupBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        flight_id = serializer.validated_data['flight_id']
+        bookings, expires_at = reserve_group(request.user, flight_id, serializer.validated_data['pod_ids'])
+        return Response({
+            'flight_id': flight_id,
+            'status': 'pending',
+            'hold_expires_at': expires_at,
+            'total_price': str(sum(booking.total_price for booking in bookings)),
+            'bookings': [{'id': booking.pk, 'pod_id': booking.pod_id} for booking in bookings],
+        }, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Every user's bookings as NDJSON (default) or CSV, streamed. Staff only."""
+        return export_response(request, 'bookings')
+
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         booking = self.get_object()
-        booking.status = 'confirmed'
-        booking.save()
+        if not confirm_booking(booking):
+            booking.refresh_from_db(fields=['status'])
+            if booking.status == 'pending':
+                raise InventoryConflict('The hold on this booking has expired.')
+            raise InventoryConflict(f'Only pending bookings can be confirmed (this one is {booking.status}).')
+        booking.refresh_from_db()
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         booking = self.get_object()
-        booking.status = 'cancelled'
-        booking.save()
+        if not release_booking(booking):
+            raise InventoryConflict(f'Only pending or confirmed bookings can be cancelled (this one is {booking.status}).')
+        booking.refresh_from_db()
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
+
+
+class RequestProfileViewSet(viewsets.ViewSet):
+    """Request profiles stored by ``spacetravel.profiling``. Staff only."""
+    permission_classes = [IsAdminUser]
+    lookup_value_regex = r'[0-9T]+-[0-9a-f]+'
+
+    def list(self, request):
+        return Response({'results': profiling.list_profiles()})
+
+    def retrieve(self, request, pk=None):
+        found = profiling.load(pk)
+        if found is None:
+            raise NotFound()
+        return Response(found[0])
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The raw profile: collapsed stacks (``sample``) or a pstats file (``cprofile``)."""
+        found = profiling.load(pk)
+        if found is None or not found[1].exists():
+            raise NotFound()
+        meta, path = found
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=meta['file'])
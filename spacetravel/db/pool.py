@@ -0,0 +1,132 @@
+"""
+A thread-safe, driver-agnostic database connection pool.
+
+Up to ``size`` idle connections are kept for reuse; under load up to
+``max_overflow`` more are opened, and closed again when they are returned.
+A caller that finds the pool exhausted waits up to ``timeout`` seconds for a
+connection, then gets ``PoolTimeout``. Idle connections are reused most
+recently returned first, so surplus ones age out: after ``idle_timeout``
+seconds unused they are closed. A connection that has sat idle for at least
+``health_check_after`` seconds is checked with ``health_check`` before it is
+handed out, and replaced if the check fails (e.g. the server restarted or a
+firewall dropped the socket).
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, size=5, max_overflow=10, timeout=30, idle_timeout=300,
+                 health_check=None, health_check_after=5, clock=time.monotonic):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._health_check = health_check
+        self.health_check_after = health_check_after
+        self._clock = clock
+        self._idle = deque()  # (connection, returned at), most recently returned last
+        self._checked_out = 0
+        self._condition = threading.Condition()
+        self.stats = {'opened': 0, 'reused': 0, 'closed': 0, 'failed_checks': 0, 'timeouts': 0}
+
+    @property
+    def capacity(self):
+        return self.size + self.max_overflow
+
+    def acquire(self):
+        """A connection for the caller's exclusive use; give it back with ``release``."""
+        deadline = self._clock() + self.timeout
+        while True:
+            connection, idle_since, expired = self._reserve(deadline)
+            for stale in expired:
+                self._discard(stale)
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except BaseException:
+                    self._forget()
+                    raise
+                self.stats['opened'] += 1
+                return connection
+            if (
+                self._health_check is not None
+                and self._clock() - idle_since >= self.health_check_after
+                and not self._health_check(connection)
+            ):
+                self.stats['failed_checks'] += 1
+                self._forget()
+                self._discard(connection)
+                continue
+            self.stats['reused'] += 1
+            return connection
+
+    def release(self, connection, reusable=True):
+        """Return a connection; unusable and surplus connections are closed."""
+        with self._condition:
+            self._checked_out -= 1
+            keep = reusable and len(self._idle) < self.size
+            if keep:
+                self._idle.append((connection, self._clock()))
+            self._condition.notify()
+        if not keep:
+            self._discard(connection)
+
+    def close_all(self):
+        """Close the idle connections (those checked out are closed on return)."""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self.size = 0
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _reserve(self, deadline):
+        """Take an idle connection, or a slot to open one (``None``); wait while at capacity."""
+        with self._condition:
+            while True:
+                expired = self._expire_idle()
+                if self._idle:
+                    connection, idle_since = self._idle.pop()
+                    self._checked_out += 1
+                    return connection, idle_since, expired
+                if self._checked_out < self.capacity:
+                    self._checked_out += 1
+                    return None, None, expired
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection available within {self.timeout:g}s '
+                        f'({self._checked_out} in use, pool size {self.size} + overflow {self.max_overflow}).'
+                    )
+                self._condition.wait(remaining)
+
+    def _expire_idle(self):
+        expired = []
+        cutoff = self._clock() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def _forget(self):
+        with self._condition:
+            self._checked_out -= 1
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self.stats['closed'] += 1
+        _close_quietly(connection)
@@ -0,0 +1,181 @@
+"""
+Read replicas for the catalog and search endpoints.
+
+Replicas are the databases listed in ``READ_REPLICAS['ALIASES']`` (set up
+from ``DATABASE_REPLICA_URLS``). ``PrimaryReplicaRouter`` sends every write
+to ``default``, the primary, and reads to a replica only while a view that
+opted in with ``ReplicaReadMixin`` handles a safe (``GET`` / ``HEAD`` /
+``OPTIONS``) request; everything else reads from the primary as before. One
+replica serves all reads of a request.
+
+Replication is asynchronous, so reads must not miss the caller's own writes:
+
+* within a request, the first write moves the remaining reads to the
+  primary;
+* after a request that wrote, the user is pinned to the primary for
+  ``MAX_LAG_SECONDS + LAG_CHECK_SECONDS``. Pins live in the ``CACHE``
+  cache, which should be shared between processes.
+
+That window is enough because a replica whose lag exceeds
+``MAX_LAG_SECONDS`` is not used: the lag of each replica is measured at
+most every ``LAG_CHECK_SECONDS`` (on PostgreSQL; other backends report
+none), and one that cannot be reached is skipped until the next check.
+Without a usable replica, reads go to the primary.
+
+Other users may see a write up to ``MAX_LAG_SECONDS`` late. Shared caches
+must not undo the pin: requests pinned to the primary neither read nor
+store cached responses (``ReplicaRouting.pinned``), and ``used_replica``
+lets a cache refuse to store what a replica returned while it may still be
+missing a recent write.
+"""
+import math
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_current = ContextVar('replica_routing', default=None)
+
+_lags = {}  # alias -> (checked at, lag in seconds)
+_lags_lock = threading.Lock()
+
+# Seconds since the last replayed transaction, or 0 when everything received is replayed.
+POSTGRESQL_LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+def options():
+    return settings.READ_REPLICAS
+
+
+def measure_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRESQL_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        return math.inf
+
+
+def replica_lag(alias):
+    """The replica's last measured lag in seconds (``inf`` if unreachable)."""
+    now = time.monotonic()
+    checked = _lags.get(alias)
+    if checked is None or now - checked[0] >= options()['LAG_CHECK_SECONDS']:
+        lag = measure_lag(alias)
+        with _lags_lock:
+            _lags[alias] = checked = (now, lag)
+    return checked[1]
+
+
+def usable_replicas():
+    max_lag = options()['MAX_LAG_SECONDS']
+    return [alias for alias in options()['ALIASES'] if replica_lag(alias) <= max_lag]
+
+
+def pin_seconds():
+    return options()['MAX_LAG_SECONDS'] + options()['LAG_CHECK_SECONDS']
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    caches[options()['CACHE']].set(_pin_key(user), True, pin_seconds())
+
+
+def pinned_to_primary(user):
+    return user.is_authenticated and caches[options()['CACHE']].get(_pin_key(user)) is not None
+
+
+class ReplicaRouting:
+    """Where the reads of the current request go."""
+
+    def __init__(self, use_replicas, pinned=False):
+        self.use_replicas = use_replicas
+        # Kept on the primary because the user wrote recently.
+        self.pinned = pinned
+        self.wrote = False
+        self._replica = None
+
+    @property
+    def used_replica(self):
+        return self._replica not in (None, DEFAULT_DB_ALIAS)
+
+    def db_for_read(self):
+        if not self.use_replicas or self.wrote:
+            return DEFAULT_DB_ALIAS
+        if self._replica is None:
+            replicas = usable_replicas()
+            self._replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return self._replica
+
+
+def begin(use_replicas, pinned=False):
+    """Route the current context's queries with a fresh ``ReplicaRouting``; returns the reset token."""
+    configured = bool(options()['ALIASES'])
+    return _current.set(ReplicaRouting(use_replicas and not pinned and configured, pinned and configured))
+
+
+def current():
+    """The ``ReplicaRouting`` of the current request, or ``None`` outside replica-reading views."""
+    return _current.get()
+
+
+def end(token):
+    """Stop routing started by ``begin``; returns that request's ``ReplicaRouting``."""
+    routing = _current.get()
+    _current.reset(token)
+    return routing
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        return routing.db_for_read() if routing is not None else None
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *options()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Read from a replica while handling safe requests, unless the user wrote
+    recently; pin users to the primary after requests that wrote.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        safe = request.method in SAFE_METHODS
+        self._replica_routing = begin(safe, pinned=safe and pinned_to_primary(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        token = getattr(self, '_replica_routing', None)
+        if token is None:
+            return response
+        self._replica_routing = None
+        if end(token).wrote and request.user.is_authenticated:
+            pin_to_primary(request.user)
+        return response
@@ -0,0 +1,239 @@
+"""
+On-demand profiling of individual API requests.
+
+Enable with ``REQUEST_PROFILING=True``. A staff user then profiles one
+request by adding ``X-Profile: sample`` (or ``cprofile``) or
+``?profile=sample`` to it; the response carries ``X-Profile-Id`` and
+``X-Profile-Url``, where the profile can be downloaded. Background sampling
+of live traffic is configured per endpoint (URL name) with
+``REQUEST_PROFILING_SAMPLE_RATES``, e.g. ``{"flight-list": 0.01}``.
+
+Two capture modes:
+
+* ``sample`` -- a thread snapshots the request thread's stack every
+  ``SAMPLE_INTERVAL_MS`` and stores collapsed stacks (``a;b;c 12`` lines),
+  ready for flamegraph.pl or speedscope. Overhead is low and independent of
+  how many calls the request makes; it is the mode of sampled traffic.
+* ``cprofile`` -- deterministic ``cProfile`` capture saved as a ``pstats``
+  file (``python -m pstats``, snakeviz). Exact call counts, higher overhead.
+
+The capture covers the view from after authentication up to the finalized
+(not yet rendered) response. Profiles are files in ``DIRECTORY`` with a
+JSON sidecar, the oldest pruned past ``MAX_PROFILES``; they are listed and
+downloaded through ``/api/v1/request-profiles/`` (staff only).
+"""
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+MODES = ('sample', 'cprofile')
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+_PROFILE_ID = re.compile(r'^[0-9T]+-[0-9a-f]+$')
+SUMMARY_LINES = 25
+
+
+class SamplingCapture:
+    mode = 'sample'
+    extension = 'collapsed'
+
+    def __init__(self, interval_ms):
+        self.interval = interval_ms / 1000
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, handle):
+        for stack, count in self.stacks.most_common():
+            handle.write(f'{stack} {count}\n'.encode('utf-8'))
+
+    def summary(self):
+        return {'samples': sum(self.stacks.values()), 'stacks': len(self.stacks)}
+
+
+class CProfileCapture:
+    mode = 'cprofile'
+    extension = 'pstats'
+
+    def __init__(self, interval_ms=None):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        try:
+            self.profile.enable()
+        except ValueError:
+            return False  # another profiler is active in this process
+        return True
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, handle):
+        self.profile.create_stats()
+        handle.write(marshal.dumps(self.profile.stats))
+
+    def summary(self):
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return {'calls': stats.total_calls, 'top': out.getvalue().strip().splitlines()}
+
+
+CAPTURES = {capture.mode: capture for capture in (SamplingCapture, CProfileCapture)}
+
+
+def options():
+    return settings.REQUEST_PROFILING
+
+
+def requested_mode(request):
+    """The capture mode a staff user asked for on ``request``, or ``None``."""
+    value = request.headers.get(PROFILE_HEADER) or request.query_params.get(PROFILE_PARAM)
+    if not value or not request.user.is_staff:
+        return None
+    value = value.lower()
+    return value if value in MODES else options()['DEFAULT_MODE']
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name if match else None) or request.path
+
+
+class ProfiledViewMixin:
+    """
+    Profile the handler of a DRF view when a staff user asks for it or the
+    endpoint's sample rate picks the request.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._profile = None
+        if not options()['ENABLED']:
+            return
+        mode = requested_mode(request)
+        requested = mode is not None
+        if not requested:
+            rate = options()['SAMPLE_RATES'].get(endpoint_name(request), 0)
+            if not rate or random.random() >= rate:
+                return
+            mode = 'sample'
+        capture = CAPTURES[mode](options()['SAMPLE_INTERVAL_MS'])
+        if capture.start():
+            self._profile = (capture, requested, time.perf_counter())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        profile = getattr(self, '_profile', None)
+        if profile is None:
+            return response
+        self._profile = None
+        capture, requested, started = profile
+        capture.stop()
+        profile_id = save(capture, {
+            'endpoint': endpoint_name(request),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': request.user.get_username() if request.user.is_authenticated else None,
+            'requested': requested,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        })
+        if requested:
+            response['X-Profile-Id'] = profile_id
+            try:
+                response['X-Profile-Url'] = reverse('api:request-profile-download', args=[profile_id])
+            except NoReverseMatch:
+                pass
+        return response
+
+
+def _directory():
+    path = Path(options()['DIRECTORY'])
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save(capture, meta):
+    """Store a finished capture; returns its id."""
+    directory = _directory()
+    profile_id = f"{timezone.now().strftime('%Y%m%dT%H%M%S%f')}-{secrets.token_hex(4)}"
+    filename = f'{profile_id}.{capture.extension}'
+    with open(directory / filename, 'wb') as handle:
+        capture.write(handle)
+    meta = {
+        'id': profile_id,
+        'mode': capture.mode,
+        'file': filename,
+        'created_at': timezone.now().isoformat(),
+        **meta,
+        **capture.summary(),
+    }
+    with open(directory / f'{profile_id}.json', 'w') as handle:
+        json.dump(meta, handle)
+    prune(directory)
+    return profile_id
+
+
+def prune(directory):
+    for sidecar in sorted(directory.glob('*.json'), reverse=True)[options()['MAX_PROFILES']:]:
+        for path in directory.glob(f'{sidecar.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first (without the cProfile summary)."""
+    profiles = []
+    for sidecar in sorted(_directory().glob('*.json'), reverse=True):
+        try:
+            meta = json.loads(sidecar.read_text())
+        except (OSError, ValueError):
+            continue  # being written or pruned
+        meta.pop('top', None)
+        profiles.append(meta)
+    return profiles
+
+
+def load(profile_id):
+    """``(metadata, data file path)`` of a stored profile, or ``None``."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    directory = _directory()
+    try:
+        meta = json.loads((directory / f'{profile_id}.json').read_text())
+    except (OSError, ValueError):
+        return None
+    return meta, directory / meta['file']
@@ -0,0 +1,203 @@
+"""
+Sparse fieldsets and expandable relations for DRF model serializers.
+
+    GET /api/v1/flights/?fields=id,price_credits,origin_planet.slug
+    GET /api/v1/bookings/?expand=flight.pods
+
+``fields`` whitelists the fields to render, with dotted paths reaching into
+nested serializers. ``expand`` names the relations to render nested.
+Relations a serializer lists in ``Meta.expandable_fields`` are rendered as
+primary keys unless expanded. Without ``expand``, ``Meta.default_expand``
+applies, which keeps the existing response shape. Only the top-level
+serializer of a safe (GET/HEAD) request reads the query string.
+
+``optimize_queryset`` derives ``select_related``/``prefetch_related`` and an
+``only()`` column list from the shape the serializer will actually render,
+so a narrow request also runs a narrow query.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from .timing import serializing
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class Shape:
+    """The requested fields and expansions for one level of serializer nesting."""
+
+    def __init__(self):
+        self.fields = None   # None renders every field
+        self.expand = None   # None falls back to Meta.default_expand
+        self.children = {}
+
+    def child(self, name):
+        return self.children.setdefault(name, Shape())
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        root = cls()
+        if fields is not None:
+            root.fields = set()
+            for path in _split(fields):
+                node = root
+                *parents, leaf = path.split('.')
+                for part in parents:
+                    node.fields.add(part)
+                    node = node.child(part)
+                    if node.fields is None:
+                        node.fields = set()
+                node.fields.add(leaf)
+        if expand is not None:
+            root.expand = set()
+            for path in _split(expand):
+                node = root
+                for part in path.split('.'):
+                    if node.expand is None:
+                        node.expand = set()
+                    node.expand.add(part)
+                    node = node.child(part)
+        return root
+
+
+class DynamicFieldsMixin:
+    """
+    Adds ``?fields=`` / ``?expand=`` support to a ``ModelSerializer``.
+
+    ``Meta.expandable_fields`` maps a field name to ``(serializer, options)``.
+    The serializer may be a class or a dotted import path, and ``options``
+    are passed to it (for example ``{'many': True}``).
+    """
+
+    def __init__(self, *args, shape=None, **kwargs):
+        self._shape = shape
+        super().__init__(*args, **kwargs)
+
+    def _is_root(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_shape(self):
+        if self._shape is None:
+            request = self.context.get('request')
+            if request is not None and request.method in SAFE_METHODS and self._is_root():
+                self._shape = Shape.parse(request.query_params.get('fields'), request.query_params.get('expand'))
+            else:
+                self._shape = Shape()
+        return self._shape
+
+    def get_fields(self):
+        fields = super().get_fields()
+        shape = self.get_shape()
+        meta = getattr(self, 'Meta', None)
+        expand = shape.expand if shape.expand is not None else set(getattr(meta, 'default_expand', ()))
+
+        for name, (target, options) in getattr(meta, 'expandable_fields', {}).items():
+            if name not in fields:
+                continue
+            child = shape.children.get(name)
+            if name in expand or (child is not None and child.fields is not None):
+                serializer_class = import_string(target) if isinstance(target, str) else target
+                fields[name] = serializer_class(read_only=True, shape=child or Shape(), **options)
+            elif not isinstance(fields[name], (serializers.RelatedField, serializers.ManyRelatedField)):
+                # Collapsed relations render as primary keys; generated
+                # (possibly writable) key fields are kept as they are.
+                pk_options = {key: value for key, value in options.items() if key in ('many', 'source')}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **pk_options)
+
+        if shape.fields is not None:
+            fields = {name: field for name, field in fields.items() if name in shape.fields}
+        return fields
+
+    def to_representation(self, instance):
+        if not self._is_root():
+            return super().to_representation(instance)
+        with serializing():
+            return super().to_representation(instance)
+
+    def optimize_queryset(self, queryset, required=(), trim=True):
+        """
+        Add the joins and prefetches the rendered shape needs, and with
+        ``trim`` restrict columns to those it reads (plus ``required``;
+        ``relation__column`` entries count when that relation is joined).
+        """
+        only, select, prefetch = [], [], []
+        _plan(self, queryset.model, '', only, select, prefetch, trim)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if trim:
+            opts = queryset.model._meta
+            extra = []
+            for name in required:
+                relation, _, column = name.rpartition('__')
+                if relation:
+                    if relation in select:  # columns of unrendered relations are not needed
+                        extra.append(name)
+                    continue
+                try:
+                    extra.append(opts.get_field(column).name)
+                except FieldDoesNotExist:
+                    continue  # annotations are always selected
+            queryset = queryset.only(*only, *extra)
+        return queryset
+
+
+def _plan(serializer, model, prefix, only, select, prefetch, trim):
+    """Walk the rendered fields of ``serializer`` for ``model`` rows reached via ``prefix``."""
+    opts = model._meta
+    columns = [opts.pk.name]
+    exact = True
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            exact = False
+            continue
+        attr = field.source.split('.')[0]
+        try:
+            model_field = opts.get_field(attr)
+        except FieldDoesNotExist:
+            # Properties and methods may read any column.
+            exact = False
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+
+        if many and model_field.one_to_many:
+            related = model_field.related_model._default_manager.all()
+            fk_name = model_field.field.name
+            if isinstance(nested, DynamicFieldsMixin):
+                related = nested.optimize_queryset(related, required=[fk_name], trim=trim)
+            elif trim:
+                related = related.only(model_field.related_model._meta.pk.name, fk_name)
+            prefetch.append(Prefetch(prefix + attr, queryset=related))
+        elif many:
+            prefetch.append(prefix + attr)
+        elif isinstance(nested, serializers.BaseSerializer) and model_field.is_relation:
+            select.append(prefix + attr)
+            if model_field.concrete:
+                columns.append(attr)
+            if isinstance(nested, DynamicFieldsMixin):
+                _plan(nested, model_field.related_model, prefix + attr + '__', only, select, prefetch, trim)
+            else:
+                _all_columns(model_field.related_model, prefix + attr + '__', only)
+        elif model_field.concrete:
+            columns.append(attr)
+
+    if not exact:
+        _all_columns(model, prefix, only)
+    else:
+        only.extend(prefix + name for name in columns)
+
+
+def _all_columns(model, prefix, only):
+    only.extend(prefix + field.name for field in model._meta.concrete_fields)
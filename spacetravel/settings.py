@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 from datetime import timedelta
 from decouple import config, Csv
@@ -61,8 +62,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'spacetravel.timing.RequestTimingMiddleware',  # Opt-in: REQUEST_TIMING (first, to time the whole stack)
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files serving
+    'spacetravel.middleware.WhiteNoiseMiddleware',  # Static files serving (WSGI and ASGI)
     'corsheaders.middleware.CorsMiddleware',        # CORS — must be before CommonMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -144,6 +146,58 @@ else:
         }
     }
 
+# Read replicas (spacetravel/db/replicas.py): comma-separated database URLs,
+# added as 'replica1', 'replica2', ...; e.g. sqlite:///replica.sqlite3 for a
+# local stand-in. Safe requests of the catalog viewsets read from them; a
+# replica lagging more than DATABASE_REPLICA_MAX_LAG seconds is skipped.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+    for index, url in enumerate(DATABASE_REPLICA_URLS, 1):
+        # Tests run against the primary only.
+        DATABASES[f'replica{index}'] = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+
+READ_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'MAX_LAG_SECONDS': config('DATABASE_REPLICA_MAX_LAG', default=5, cast=float),
+    'LAG_CHECK_SECONDS': config('DATABASE_REPLICA_LAG_CHECK', default=1, cast=float),
+    # Users who just wrote read from the primary; shared by all processes
+    # when the 'responses' cache is.
+    'CACHE': 'responses',
+}
+DATABASE_ROUTERS = ['spacetravel.db.replicas.PrimaryReplicaRouter']
+
+# PostgreSQL connections. With DB_POOL=True each process keeps a pool of
+# server connections per database that requests borrow and return (see
+# spacetravel/db/backends/postgresql); otherwise each thread keeps a
+# persistent connection for DB_CONN_MAX_AGE seconds, checked before reuse.
+for database in DATABASES.values():
+    if database['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    if config('DB_POOL', default=False, cast=bool):
+        database.update({
+            'ENGINE': 'spacetravel.db.backends.postgresql',
+            # A connection goes back to the pool at the end of each request.
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'SIZE': config('DB_POOL_SIZE', default=5, cast=int),
+                'MAX_OVERFLOW': config('DB_POOL_MAX_OVERFLOW', default=10, cast=int),
+                'TIMEOUT': config('DB_POOL_TIMEOUT', default=30, cast=float),
+                'IDLE_TIMEOUT': config('DB_POOL_IDLE_TIMEOUT', default=300, cast=float),
+                'HEALTH_CHECKS': config('DB_POOL_HEALTH_CHECKS', default=True, cast=bool),
+                'HEALTH_CHECK_AFTER': config('DB_POOL_HEALTH_CHECK_AFTER', default=5, cast=float),
+            },
+        })
+    else:
+        database.update({
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+        })
+
+
+# Covering-index INCLUDE columns only exist on PostgreSQL; SQLite ignores them.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -200,11 +254,88 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset pagination: opaque cursors, no COUNT(*), constant cost per page
+    'DEFAULT_PAGINATION_CLASS': 'flight.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Itinerary search (flight/routing.py) — in-memory route index per process
+ITINERARY_SEARCH = {
+    'MIN_CONNECTION_MINUTES': config('ITINERARY_MIN_CONNECTION_MINUTES', default=60, cast=int),
+    'MAX_CONNECTION_HOURS': config('ITINERARY_MAX_CONNECTION_HOURS', default=168, cast=int),
+    'SYNC_INTERVAL_SECONDS': config('ITINERARY_SYNC_INTERVAL_SECONDS', default=30, cast=int),
+    'SYNC_OVERLAP_SECONDS': config('ITINERARY_SYNC_OVERLAP_SECONDS', default=60, cast=int),
+    'REBUILD_INTERVAL_SECONDS': config('ITINERARY_REBUILD_INTERVAL_SECONDS', default=3600, cast=int),
+}
+
+# How long a pending booking keeps its pod and seat (see flight/inventory.py)
+BOOKING_HOLD_TTL_SECONDS = config('BOOKING_HOLD_TTL_SECONDS', default=15 * 60, cast=int)
+
+# Per-flight seat maps (flight/seatmap.py): the cache they live in and their
+# lifetime; pod and booking changes invalidate them sooner, but only across
+# processes when that cache is shared (the 'responses' cache with
+# RESPONSE_CACHE_BACKEND set, see below); local memory suits a single process
+SEATMAP_CACHE = config('SEATMAP_CACHE', default='responses')
+SEATMAP_CACHE_SECONDS = config('SEATMAP_CACHE_SECONDS', default=60, cast=int)
+
+# Serve GET/HEAD of the planet list, flight search and flight detail URLs with
+# the native async views (flight/async_views.py); for ASGI deployments
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# Caches. 'responses' holds the versioned API response cache
+# (flight/response_cache.py), seat maps and replica pins: local memory per
+# process unless RESPONSE_CACHE_BACKEND/LOCATION point at a shared cache, e.g.
+# django.core.cache.backends.redis.RedisCache + redis://host:6379/1. Local
+# memory is only correct with a single process: invalidations do not reach
+# the others.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': config('RESPONSE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('RESPONSE_CACHE_LOCATION', default='responses'),
+        'TIMEOUT': config('RESPONSE_CACHE_SECONDS', default=60, cast=int),
+    },
+    # JWT-authenticated users and their profiles (accounts/authentication.py);
+    # deliberately per process, with a short lifetime
+    'users': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'users',
+    },
+}
+AUTH_USER_CACHE_SECONDS = config('AUTH_USER_CACHE_SECONDS', default=30, cast=int)
+
+# Past freshness, a cached response may still be served while one request
+# refreshes it; the refresh lock (and the longest wait for it) expires after
+RESPONSE_CACHE_STALE_SECONDS = config('RESPONSE_CACHE_STALE_SECONDS', default=30, cast=int)
+RESPONSE_CACHE_LOCK_SECONDS = config('RESPONSE_CACHE_LOCK_SECONDS', default=10, cast=int)
+
+# Per-request SQL/timing instrumentation (spacetravel/timing.py): Server-Timing
+# header plus logs of slow requests, slow queries and repeated (N+1) queries
+REQUEST_TIMING = {
+    'ENABLED': config('REQUEST_TIMING', default=False, cast=bool),
+    'HEADER': config('REQUEST_TIMING_HEADER', default=True, cast=bool),
+    'SLOW_REQUEST_MS': config('REQUEST_TIMING_SLOW_REQUEST_MS', default=500, cast=int),
+    'SLOW_QUERY_MS': config('REQUEST_TIMING_SLOW_QUERY_MS', default=100, cast=int),
+    'DUPLICATE_QUERIES': config('REQUEST_TIMING_DUPLICATE_QUERIES', default=5, cast=int),
+}
+
+# On-demand request profiling (spacetravel/profiling.py): staff send
+# X-Profile: sample|cprofile; SAMPLE_RATES maps URL names to the fraction of
+# requests profiled in the background, e.g. '{"flight-list": 0.01}'
+REQUEST_PROFILING = {
+    'ENABLED': config('REQUEST_PROFILING', default=False, cast=bool),
+    'DIRECTORY': config('REQUEST_PROFILING_DIR', default=str(BASE_DIR / 'profiles')),
+    'MAX_PROFILES': config('REQUEST_PROFILING_MAX_PROFILES', default=200, cast=int),
+    'DEFAULT_MODE': config('REQUEST_PROFILING_MODE', default='sample'),
+    'SAMPLE_INTERVAL_MS': config('REQUEST_PROFILING_INTERVAL_MS', default=5, cast=float),
+    'SAMPLE_RATES': config('REQUEST_PROFILING_SAMPLE_RATES', default='{}', cast=json.loads),
 }
 
 # JWT Settings
@@ -213,6 +344,9 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Tokens carry a hash of the password hash: changing the password revokes
+    # them, and the cached user behind a token is checked against it.
+    'CHECK_REVOKE_TOKEN': True,
 }
 
 # CORS Settings — allow React dev server
@@ -0,0 +1,212 @@
+"""
+Per-request SQL and timing instrumentation.
+
+Enable with ``REQUEST_TIMING=True``. Every response then carries a
+``Server-Timing`` header (shown in the browser's network panel)::
+
+    Server-Timing: db;dur=4.1;desc="6 queries", serialize;dur=2.3,
+                   view;dur=9.8, render;dur=1.2, total;dur=11.6
+
+* ``db`` -- time spent executing SQL on any connection, and the query count;
+* ``serialize`` -- time in ``to_representation`` of top-level serializers
+  built on ``DynamicFieldsMixin`` (every model serializer of the API);
+* ``view`` -- the view itself, including its queries and serializers;
+* ``render`` -- rendering a template or DRF response after the view;
+* ``total`` -- the whole middleware stack.
+
+Requests slower than ``SLOW_REQUEST_MS`` and queries slower than
+``SLOW_QUERY_MS`` are logged to ``spacetravel.timing``, as is any query
+(SQL with the parameters left out) run ``DUPLICATE_QUERIES`` or more times
+in one request, which is the usual sign of an N+1 access pattern. The
+header can be turned off with ``REQUEST_TIMING_HEADER=False`` while keeping
+the logs.
+
+Overhead is a couple of ``perf_counter()`` calls and a dict update per
+query; with the middleware disabled it is removed from the stack and the
+serializer hook costs one context variable lookup. The middleware runs
+natively under WSGI and ASGI.
+"""
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+
+# "IN (%s, %s, %s)" and multi-row VALUES differ only in length.
+_REPEATED_PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+_REPEATED_ROWS = re.compile(r'\(%s\.\.\.\)(?:\s*,\s*\(%s\.\.\.\))+')
+
+
+def normalize_sql(sql):
+    sql = _REPEATED_PLACEHOLDERS.sub('%s...', sql)
+    return _REPEATED_ROWS.sub('(%s...)...', sql)
+
+
+class RequestTimings:
+    """What one request spent, in milliseconds."""
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.view_ms = None
+        self.render_ms = None
+        self.by_sql = defaultdict(lambda: [0, 0.0])  # normalized SQL -> [count, ms]
+        self.slow_queries = []
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            stats = self.by_sql[normalize_sql(sql)]
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed >= self.slow_query_ms:
+                self.slow_queries.append((elapsed, sql))
+
+    def duplicates(self, threshold):
+        """``(sql, count, ms)`` for queries run at least ``threshold`` times, most frequent first."""
+        found = [(sql, count, ms) for sql, (count, ms) in self.by_sql.items() if count >= threshold]
+        return sorted(found, key=lambda item: -item[1])
+
+    def server_timing(self, total_ms, duplicates):
+        entries = [
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_ms:.1f}',
+        ]
+        if self.view_ms is not None:
+            entries.append(f'view;dur={self.view_ms:.1f}')
+        if self.render_ms is not None:
+            entries.append(f'render;dur={self.render_ms:.1f}')
+        if duplicates:
+            repeated = sum(count for _, count, _ in duplicates)
+            entries.append(f'dup;desc="{len(duplicates)} queries repeated {repeated} times"')
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serializer time of the current request, if it is being timed."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize_ms += (time.perf_counter() - started) * 1000
+
+
+class RequestTimingMiddleware:
+    """
+    Records the timings of each request; see the module docstring. Place it
+    first in ``MIDDLEWARE`` so ``total`` and ``db`` cover the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = settings.REQUEST_TIMING
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = options['HEADER']
+        self.slow_request_ms = options['SLOW_REQUEST_MS']
+        self.slow_query_ms = options['SLOW_QUERY_MS']
+        self.duplicate_queries = options['DUPLICATE_QUERIES']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings(self.slow_query_ms)
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, timings)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings(self.slow_query_ms)
+        token = _current.set(timings)
+        started = time.perf_counter()
+        # Async views run their queries in the request's thread-sensitive
+        # sync thread, so the wrappers go on that thread's connections.
+        stack = ExitStack()
+        try:
+            await sync_to_async(self.wrap_connections)(stack, timings)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    @staticmethod
+    def wrap_connections(stack, timings):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+
+    def finish(self, request, response, timings, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        if timings.view_ms is None and hasattr(request, '_view_started'):
+            timings.view_ms = (time.perf_counter() - request._view_started) * 1000
+
+        duplicates = timings.duplicates(self.duplicate_queries)
+        if self.header:
+            response['Server-Timing'] = timings.server_timing(total_ms, duplicates)
+        self.log(request, response, timings, total_ms, duplicates)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Template and DRF responses are rendered after this hook returns.
+        finished = time.perf_counter()
+        timings = _current.get()
+        if timings is not None and hasattr(request, '_view_started'):
+            timings.view_ms = (finished - request._view_started) * 1000
+
+            def rendered(response):
+                timings.render_ms = (time.perf_counter() - finished) * 1000
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, response, timings, total_ms, duplicates):
+        where = f'{request.method} {request.get_full_path()}'
+        if total_ms >= self.slow_request_ms:
+            logger.warning(
+                'Slow request %s -> %s: %.1f ms (%d queries, %.1f ms in SQL, %.1f ms serializing)',
+                where, response.status_code, total_ms, timings.queries, timings.db_ms, timings.serialize_ms,
+            )
+        for elapsed, sql in timings.slow_queries:
+            logger.warning('Slow query during %s: %.1f ms: %s', where, elapsed, sql)
+        for sql, count, elapsed in duplicates:
+            logger.warning(
+                'Repeated query during %s (possible N+1): %d times, %.1f ms total: %s',
+                where, count, elapsed, sql,
+            )